@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Chunk NDJSON'unu (Chunk JSON, ör. run_connector --changed-chunks-ndjson çıktısı) BM25 indeksine toplu yükler:
+  python legal-etl/scripts/bm25_backfill.py --chunks-path data/changed_chunks.ndjson
+
+Yükleme boyunca OpenSearch refresh_interval kapatılır, bitince geri alınır.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Iterator, List
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.core.index_bm25 import OpenSearchIndexer  # noqa: E402
+from src.core.schema import Chunk  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Backfill chunk NDJSON into the BM25 index")
+    ap.add_argument("--chunks-path", required=True, help="Her satırda bir Chunk JSON")
+    ap.add_argument("--index", default="legal_chunks_bm25")
+    ap.add_argument("--url", default=None, help="BM25_URL / OPENSEARCH_URL yerine")
+    ap.add_argument("--batch-size", type=int, default=5000, help="Bir bulk_upsert çağrısındaki chunk sayısı")
+    return ap.parse_args()
+
+
+def iter_batches(path: Path, batch_size: int) -> Iterator[List[Chunk]]:
+    batch: List[Chunk] = []
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            batch.append(Chunk.model_validate(json.loads(line)))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def main() -> None:
+    args = parse_args()
+    path = Path(args.chunks_path)
+    if not path.exists():
+        raise SystemExit(f"Chunk dosyası bulunamadı: {path}")
+    indexer = OpenSearchIndexer(url=args.url, index=args.index)
+    indexer.ensure_index()
+    indexed = failed = 0
+    with indexer.bulk_load():
+        for batch in iter_batches(path, max(1, args.batch_size)):
+            metrics = indexer.upsert(batch)
+            indexed += metrics.get("indexed", metrics.get("docs", 0))
+            failed += metrics.get("failed", 0)
+            print(f"[bm25] indexed={indexed} failed={failed}")
+    if failed:
+        raise SystemExit(f"{failed} chunk indekslenemedi")
+    print(f"Tamamlandı: {indexed} chunk -> {args.index}")
+
+
+if __name__ == "__main__":
+    main()
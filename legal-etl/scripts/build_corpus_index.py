@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+NDJSON karar dökümlerinden yerel arama indeksi (SQLite FTS5) üretir.
+
+Girdi: run_connector.py --dump-ndjson veya clean_yargitay.py çıktıları.
+Çıktı yargitay_search.py tarafından SEARCH_BACKEND=local ile kullanılır:
+
+  python legal-etl/scripts/build_corpus_index.py --input-glob "legal-etl/cleaned/*_clean.ndjson"
+  SEARCH_BACKEND=local python yargitay_search.py --question "..."
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.core.corpus_index import LocalCorpusIndex
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="NDJSON -> yerel arama indeksi")
+    ap.add_argument(
+        "--input-glob",
+        default="legal-etl/cleaned/*_clean.ndjson",
+        help="İndekslenecek NDJSON glob deseni",
+    )
+    ap.add_argument(
+        "--index",
+        default=".cache/local_corpus.sqlite",
+        help="İndeks dosyası (yargitay_search LOCAL_CORPUS_INDEX ile aynı olmalı)",
+    )
+    ap.add_argument("--optimize", action="store_true", help="Bitince FTS segmentlerini birleştir")
+    return ap.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    input_paths = sorted(Path().glob(args.input_glob))
+    if not input_paths:
+        raise SystemExit(f"Girdi bulunamadı: {args.input_glob}")
+
+    index = LocalCorpusIndex(args.index)
+    t0 = time.time()
+    for p in input_paths:
+        stats = index.add_ndjson(p)
+        print(
+            f"{p.name}: okunan={stats['read']} indekslenen={stats['indexed']} "
+            f"güncellenen={stats['replaced']} atlanan={stats['skipped']}"
+        )
+    if args.optimize:
+        index.optimize()
+    print(f"Toplam karar: {index.count()} ({time.time() - t0:.1f} sn) -> {args.index}")
+
+
+if __name__ == "__main__":
+    main()
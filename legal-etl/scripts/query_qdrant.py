@@ -2,6 +2,9 @@
 """
 Hızlı arama denemesi:
   python legal-etl/scripts/query_qdrant.py --query "ceza davası görevsizlik" --top-k 5
+
+Hibrit (dense + sparse [+ ColBERT], sunucu tarafında prefetch + RRF/DBSF füzyonu):
+  python legal-etl/scripts/query_qdrant.py --backend bge-m3 --hybrid --query "TBK 344 kira artışı"
 """
 from __future__ import annotations
 
@@ -10,11 +13,19 @@ from pathlib import Path
 from typing import List
 
 import os
+import sys
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qm
-from sentence_transformers import SentenceTransformer, CrossEncoder
 import cohere
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.core.embed import BACKENDS, get_embedder  # noqa: E402
+from src.core.index_qdrant import DENSE_VECTOR, FUSIONS, hybrid_query  # noqa: E402
+from src.core.rerank import RerankerRegistry  # noqa: E402
+
 
 def parse_args() -> argparse.Namespace:
     ap = argparse.ArgumentParser(description="Query Qdrant collection with BGE embeddings")
@@ -33,6 +44,20 @@ def parse_args() -> argparse.Namespace:
     ap.add_argument("--top-k", type=int, default=5, help="Dönecek sonuç sayısı (final)")
     ap.add_argument("--retrieval-top-k", type=int, default=30, help="Rerank öncesi Qdrant limit")
     ap.add_argument("--model", default="BAAI/bge-m3", help="Aynı embedding modeli")
+    ap.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="sentence-transformers",
+        help="Embedding backend'i (koleksiyonu dolduranla aynı olmalı)",
+    )
+    ap.add_argument(
+        "--hybrid",
+        action="store_true",
+        help="Dense + sparse isimli vektörlerle tek istekte hibrit arama (--backend bge-m3)",
+    )
+    ap.add_argument("--colbert", action="store_true", help="Füzyon adaylarını ColBERT MaxSim ile yeniden sırala")
+    ap.add_argument("--fusion", choices=FUSIONS, default="rrf", help="Hibrit füzyon yöntemi")
+    ap.add_argument("--prefetch-limit", type=int, default=100, help="Her alt sorgunun aday sayısı")
     ap.add_argument(
         "--reranker-model",
         default=None,
@@ -66,10 +91,13 @@ def main() -> None:
     if not queries:
         raise SystemExit("En az bir sorgu ver: --query veya --queries veya --queries-file")
 
-    model = SentenceTransformer(args.model, device=args.device)
+    embedder = get_embedder(args.backend, args.model, device=args.device)
     reranker = None
     if args.reranker_model and not args.use_cohere:
-        reranker = CrossEncoder(args.reranker_model, device=args.device, max_length=args.rerank_max_length)
+        # model süreç boyunca bir kez yüklenir
+        reranker = RerankerRegistry().get("local", model=args.reranker_model, device=args.device)
+        if reranker is None or not getattr(reranker, "available", False):
+            raise SystemExit(f"Reranker yüklenemedi: {args.reranker_model}")
 
     co = None
     if args.use_cohere:
@@ -85,32 +113,51 @@ def main() -> None:
             raise SystemExit("COHERE_API_KEY ortam değişkeni veya .env içinde set edilmeli.")
         co = cohere.ClientV2(api_key=api_key)
 
+    if (args.hybrid or args.colbert) and not embedder.backend.hybrid:
+        raise SystemExit("--hybrid/--colbert sparse/ColBERT çıktısı gerektirir: --backend bge-m3")
+
     client = QdrantClient(args.qdrant_url)
     limit = max(args.top_k, args.retrieval_top_k)
+    # İsimli vektörlü (hibrit) koleksiyonda dense-only sorgu "dense" vektörünü hedefler
+    using = DENSE_VECTOR if isinstance(client.get_collection(args.collection).config.params.vectors, dict) else None
 
     for q in queries:
-        qvec = model.encode([q], normalize_embeddings=True)[0].tolist()
-        search_res = client.query_points(
-            collection_name=args.collection,
-            query=qvec,
-            limit=limit,
-            with_payload=True,
-            with_vectors=False,
-        ).points
+        if args.hybrid or args.colbert:
+            encoded = embedder.embed_hybrid([q], kind="query", sparse=args.hybrid, colbert=args.colbert)[0]
+            search_res = hybrid_query(
+                client,
+                args.collection,
+                encoded,
+                limit=limit,
+                prefetch_limit=max(args.prefetch_limit, limit),
+                fusion=args.fusion,
+            )
+        else:
+            search_res = client.query_points(
+                collection_name=args.collection,
+                query=embedder.embed_query(q),
+                using=using,
+                limit=limit,
+                with_payload=True,
+                with_vectors=False,
+            ).points
 
         rerank_scores = None
         if reranker:
-            pairs = []
+            texts = []
             kept = []
             for p in search_res:
                 text = (p.payload or {}).get("text", "")
                 if not text:
                     continue
                 kept.append(p)
-                pairs.append((q, text))
-            scores = reranker.predict(pairs, batch_size=args.rerank_batch_size)
-            rerank_scores = {p.id: float(s) for p, s in zip(kept, scores)}
-            search_res = sorted(kept, key=lambda p: rerank_scores[p.id], reverse=True)
+                texts.append(text)
+            scores = reranker.score(
+                q, texts, batch_size=args.rerank_batch_size, max_length=args.rerank_max_length
+            )
+            if scores:
+                rerank_scores = {p.id: float(s) for p, s in zip(kept, scores, strict=True)}
+                search_res = sorted(kept, key=lambda p: rerank_scores[p.id], reverse=True)
         elif co:
             docs = []
             kept = []
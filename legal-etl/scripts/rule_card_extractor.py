@@ -20,7 +20,12 @@ import os
 import sys
 from qdrant_client import QdrantClient
 from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
-from sentence_transformers import SentenceTransformer
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.core.embed import BACKENDS, get_embedder  # noqa: E402
 
 
 MAP_PROMPT = """You are a legal assistant that extracts structured rules from a Turkish court decision.
@@ -49,17 +54,26 @@ def parse_args() -> argparse.Namespace:
     ap.add_argument("--collection", default="yargitay_chunks_local_v1", help="Karar chunk koleksiyonu")
     ap.add_argument("--model", default="BAAI/bge-m3", help="Embedding modeli (retrieval)")
     ap.add_argument("--device", default="cpu", help="cuda/cpu")
+    ap.add_argument("--backend", choices=BACKENDS, default="sentence-transformers", help="Embedding backend'i")
     ap.add_argument("--output", default="rule_cards.ndjson", help="Çıktı NDJSON dosyası")
     return ap.parse_args()
 
 
-def retrieve_chunks(queries: List[str], top_n: int, model_name: str, collection: str, qdrant_url: str, device: str) -> List[Dict[str, Any]]:
-    model = SentenceTransformer(model_name, device=device)
+def retrieve_chunks(
+    queries: List[str],
+    top_n: int,
+    model_name: str,
+    collection: str,
+    qdrant_url: str,
+    device: str,
+    backend: str = "sentence-transformers",
+) -> List[Dict[str, Any]]:
+    embedder = get_embedder(backend, model_name, device=device)
     client = QdrantClient(qdrant_url)
     points = []
     try:
         for q in queries:
-            qvec = model.encode([q], normalize_embeddings=True)[0].tolist()
+            qvec = embedder.embed_query(q)
             res = client.query_points(collection_name=collection, query=qvec, limit=top_n, with_payload=True, with_vectors=False).points
             points.extend(res)
     except ResponseHandlingException as exc:
@@ -150,7 +164,7 @@ def main() -> None:
     args = parse_args()
     if not args.queries:
         raise SystemExit("En az bir --queries verilmeli (örn. 'ayıp ihbar ekspertiz').")
-    chunks = retrieve_chunks(args.queries, args.top_n, args.model, args.collection, args.qdrant_url, args.device)
+    chunks = retrieve_chunks(args.queries, args.top_n, args.model, args.collection, args.qdrant_url, args.device, args.backend)
     cards = []
     for p in chunks:
         payload = p.payload or {}
@@ -11,14 +11,28 @@ Examples:
   poetry run python scripts/run_connector.py --connector yargitay --days 3 --limit 3 --live
 
 Without --live it uses bundled HTML fixtures (offline sanity).
+
+Listing streams into the queue window by window (--enqueue-batch refs per
+insert) and is checkpointed per window, so an interrupted listing resumes after
+the last finished window. With --pipeline listing runs in a background thread
+while the queue is already being drained, throttled by --max-queue-ahead.
+
+With --workers N the queue is drained by N fetch threads (one token bucket per
+upstream host, --host-rate req/s) and parse/chunk runs in --parse-procs
+processes; acks, retries and the NDJSON dump stay on the main thread.
 """
 
 import argparse
 import json
+import os
 import random
+import signal
 import sys
+import threading
 import time
 from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from pathlib import Path
 from typing import Any, Iterable, Optional
@@ -29,8 +43,18 @@ if str(ROOT) not in sys.path:
 
 from src.connectors.yargitay import YargitayConnector
 from src.connectors.emsal import EmsalConnector
-from src.core.state import StateStore
+from src.core.http import HostRateLimiter, open_rate_backend
+from src.core.listing_plan import WindowPlanner
+from src.core.state import BaseStateStore, open_state_store
 from src.core.schema import ItemRef
+from src.workers.diff_worker import (
+    UNCHANGED,
+    conditional_ref,
+    diff_document,
+    fingerprint_checksum,
+    precheck,
+    raw_content_hash,
+)
 
 
 CONNECTORS = {
@@ -38,6 +62,8 @@ CONNECTORS = {
     "emsal": EmsalConnector,
 }
 
+DEFAULT_HOST_RATE = 4.0
+
 
 def main() -> None:
     parser = argparse.ArgumentParser()
@@ -48,11 +74,33 @@ def main() -> None:
     parser.add_argument("--resume", action="store_true", help="Resume from saved state (if available).")
     parser.add_argument("--buffer-days", type=int, default=3, help="Overlap window when resuming (default: 3).")
     parser.add_argument("--max-errors", type=int, default=50, help="Abort after this many consecutive errors.")
-    parser.add_argument("--state-db", type=str, default=None, help="Custom state DB path (default: state.db).")
+    parser.add_argument(
+        "--state-db",
+        type=str,
+        default=None,
+        help="State DB: SQLite path or postgresql:// DSN (default: STATE_DB_URL or state.db).",
+    )
     parser.add_argument("--stale-after", type=int, default=180, help="Seconds before marking run as stalled.")
     parser.add_argument("--window-start", type=str, help="Override window start date (YYYY-MM-DD).")
     parser.add_argument("--window-end", type=str, help="Override window end date (YYYY-MM-DD).")
-    parser.add_argument("--window-days", type=int, default=None, help="Override window size in days (Yargitay).")
+    parser.add_argument(
+        "--window-days",
+        type=int,
+        default=None,
+        help="Listing window size in days; for Yargitay only the initial size before density history exists.",
+    )
+    parser.add_argument(
+        "--list-workers",
+        type=int,
+        default=4,
+        help="Yargitay: listing pages fetched concurrently within one window.",
+    )
+    parser.add_argument(
+        "--window-target-rows",
+        type=int,
+        default=None,
+        help="Yargitay: aim listing windows at about this many recordsTotal (default YARGITAY_WINDOW_TARGET_ROWS or 5000).",
+    )
     parser.add_argument("--show-browser", action="store_true", help="Disable headless mode to observe the browser.")
     parser.add_argument("--log-heartbeat", action="store_true", help="Print heartbeat/log lines regularly.")
     parser.add_argument("--max-attempts", type=int, default=5, help="Retry limit per item before marking failed.")
@@ -68,7 +116,98 @@ def main() -> None:
         default=None,
         help="Kararları NDJSON satırı olarak bu dosyaya append et (doc_id, meta, text).",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "Use stored document fingerprints: conditional fetch, skip parse/chunk for unchanged "
+            "documents and only dump new/changed ones."
+        ),
+    )
+    parser.add_argument(
+        "--changed-chunks-ndjson",
+        type=str,
+        default=None,
+        help="With --incremental, append only new/changed chunks (Chunk JSON) here for embedding.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Concurrent fetch workers (1 = sequential loop).",
+    )
+    parser.add_argument(
+        "--parse-procs",
+        type=int,
+        default=None,
+        help="Processes for parse/chunk with --workers (0 = parse in fetch threads; default: min(4, CPUs)).",
+    )
+    parser.add_argument(
+        "--host-rate",
+        type=float,
+        default=None,
+        help=(
+            f"Requests/sec per upstream host shared by all workers "
+            f"(default: {DEFAULT_HOST_RATE:g} with --workers or --rate-backend, off otherwise)."
+        ),
+    )
+    parser.add_argument("--host-burst", type=int, default=4, help="Token bucket size per host.")
+    parser.add_argument(
+        "--rate-backend",
+        default=os.getenv("RATE_LIMIT_URL"),
+        help="Share the per-host budget across processes: SQLite file path or redis:// URL (env RATE_LIMIT_URL).",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=int,
+        default=900,
+        help="Queue claim lease; items of a crashed worker are reclaimed after it expires.",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="List in a background thread while fetch workers already drain the queue.",
+    )
+    parser.add_argument("--enqueue-batch", type=int, default=200, help="Refs per enqueue transaction.")
+    parser.add_argument(
+        "--max-queue-ahead",
+        type=int,
+        default=2000,
+        help="With --pipeline, pause listing while this many items are waiting in the queue.",
+    )
+    parser.add_argument(
+        "--restart-listing",
+        action="store_true",
+        help="Ignore the listing checkpoint of an interrupted run and list the whole window again.",
+    )
+    parser.add_argument(
+        "--write-behind",
+        action="store_true",
+        help="Buffer state.db heartbeat/progress/queue updates and flush them in groups.",
+    )
+    parser.add_argument("--flush-every", type=int, default=50, help="Write-behind flush size (items).")
+    parser.add_argument("--flush-seconds", type=float, default=2.0, help="Write-behind flush interval.")
     args = parser.parse_args()
+    if args.workers > 1 and (args.browser_fallback or (args.connector == "emsal" and args.live)):
+        parser.error("--workers > 1 is not supported with Playwright-backed fetching")
+    if args.pipeline and args.connector == "emsal" and args.live:
+        parser.error("--pipeline is not supported with Playwright-backed listing")
+
+    host_rate = args.host_rate
+    if host_rate is None and (args.workers > 1 or args.rate_backend):
+        host_rate = DEFAULT_HOST_RATE
+    rate_limiter = (
+        HostRateLimiter(host_rate, args.host_burst, backend=open_rate_backend(args.rate_backend))
+        if host_rate and host_rate > 0
+        else None
+    )
+
+    store = open_state_store(
+        args.state_db,
+        write_behind=args.write_behind,
+        flush_every=args.flush_every,
+        flush_interval=args.flush_seconds,
+    )
 
     connector_cls = CONNECTORS[args.connector]
     if args.connector == "yargitay":
@@ -79,11 +218,26 @@ def main() -> None:
         }
         if args.window_days:
             connector_kwargs["window_days"] = args.window_days
+        planner_kwargs: dict[str, int] = {"default_days": args.window_days or 7}
+        if args.window_target_rows:
+            planner_kwargs["target_rows"] = args.window_target_rows
+        elif os.getenv("YARGITAY_WINDOW_TARGET_ROWS"):
+            planner_kwargs["target_rows"] = int(os.environ["YARGITAY_WINDOW_TARGET_ROWS"])
+        connector_kwargs["list_page_workers"] = args.list_workers
+        connector_kwargs["window_planner"] = WindowPlanner(store, connector=args.connector, **planner_kwargs)
+        if rate_limiter:
+            connector_kwargs["rate_limiter"] = rate_limiter
+        if args.workers > 1:
+            connector_kwargs["http_pool_size"] = max(8, args.workers)
+        if args.incremental:
+            # önbellekteki HTML ham içerik karşılaştırmasını her zaman "değişmedi" yapar; ağdan tazele
+            connector_kwargs["revalidate_doc_cache"] = True
         connector = connector_cls(**connector_kwargs)
     else:
         connector = connector_cls(use_live=args.live, headless=not args.show_browser)
 
-    store = StateStore(args.state_db)
+    # SIGTERM (ör. run_yargitay_batch terminate) da Ctrl-C yolundan geçsin: buffer flush + run kapanışı
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
     store.mark_stale_runs(args.connector, stale_after=args.stale_after)
 
     window_start = _parse_cli_date(args.window_start) if args.window_start else None
@@ -119,6 +273,7 @@ def main() -> None:
             "limit": args.limit,
             "live": args.live,
             "resume": bool(progress),
+            "workers": args.workers,
         },
     )
 
@@ -131,100 +286,113 @@ def main() -> None:
         dump_path = Path(args.dump_ndjson)
         dump_path.parent.mkdir(parents=True, exist_ok=True)
         dump_fp = dump_path.open("a", encoding="utf-8")
+    incremental = _Incremental(store, args.connector, args.changed_chunks_ndjson) if args.incremental else None
 
+    lister = _Lister(args, connector, store, run_id, shard_key, since, window_end)
     try:
-        refs = list(connector.list_items(since, window_end))
-        store.enqueue_items(
-            args.connector,
-            shard_key,
-            [json.loads(ref.model_dump_json()) for ref in refs],
-        )
-        print(f"[RUN {run_id}] Enqueued {len(refs)} refs for {shard_key}")
-
-        while True:
-            queued = store.checkout_next_item(args.connector, shard_key)
-            if not queued:
-                break
-            queue_id = queued.pop("_queue_id")
-            attempts = queued.pop("_attempts", 0)
-            ref = ItemRef.model_validate(queued)
-
-            if args.limit > 0 and processed >= args.limit:
-                break
-
-            store.heartbeat(run_id, stage="list", last_item_key=ref.key)
-            if args.log_heartbeat:
-                print(
-                    f"[RUN {run_id}] stage=list shard={shard_key} item={ref.key} decision_date={ref.metadata.get('decision_date')}"
-                )
-            if ref.key in recent_keys:
-                print(f"[WARN] repeated key {ref.key} detected.")
-            recent_keys.append(ref.key)
-            try:
-                raw = connector.fetch(ref)
-                doc = connector.parse(raw)
-                chunks = connector.chunk(doc)
-                processed += 1
-                decision_iso = _decision_date_iso(doc, ref)
-                store.mark_item_processed(
-                    connector=args.connector,
-                    run_id=run_id,
-                    shard_key=shard_key,
-                    item_key=ref.key,
-                    decision_date=decision_iso,
-                    doc_id=doc.doc_id,
+        if args.pipeline:
+            lister.start()
+        else:
+            lister.run()
+            lister.raise_error()
+
+        if args.workers > 1:
+            processed, consecutive_errors = _run_pool(
+                args, connector, store, run_id, shard_key, dump_fp, recent_keys, lister, incremental
+            )
+        else:
+            while True:
+                # Limit önce kontrol edilir: işlenmeyecek öğe claim edilip lease'te bırakılmaz
+                if args.limit > 0 and processed >= args.limit:
+                    break
+                listing_done = lister.done.is_set()
+                queued = store.checkout_next_item(
+                    args.connector,
+                    shard_key,
+                    lease_seconds=args.lease_seconds,
+                    max_attempts=args.max_attempts,
                 )
-                store.mark_queue_done(queue_id)
-                consecutive_errors = 0
-
-                if dump_fp:
-                    payload = {
-                        "doc_id": doc.doc_id,
-                        "title": str(doc.title),
-                        "url": str(doc.url),
-                        "decision_date": (doc.decision_date.isoformat() if doc.decision_date else None),
-                        "chamber": doc.chamber,
-                        "court": doc.court,
-                        "meta": json.loads(json.dumps(doc.meta, default=str)),
-                        "text": doc.text,
-                    }
-                    dump_fp.write(json.dumps(payload, ensure_ascii=False, default=str) + "\n")
-                    dump_fp.flush()
-
+                if not queued:
+                    if listing_done:
+                        break
+                    store.wait_for_work(args.connector, shard_key, timeout=0.5)
+                    continue
+                queue_id = queued.pop("_queue_id")
+                attempts = queued.pop("_attempts", 0)
+                ref = ItemRef.model_validate(queued)
+
+                store.heartbeat(run_id, stage="list", last_item_key=ref.key)
                 if args.log_heartbeat:
                     print(
-                        f"[RUN {run_id}] processed={processed} quality={doc.meta.get('quality_flag','ok')} last_doc={doc.doc_id}"
+                        f"[RUN {run_id}] stage=list shard={shard_key} item={ref.key} decision_date={ref.metadata.get('decision_date')}"
                     )
-                else:
-                    print(f"ref: {ref}")
-                    print(
-                        f"doc_id={doc.doc_id} title={doc.title!r} chunks={len(chunks)} checksum={doc.checksum[:10]}..."
+                if ref.key in recent_keys:
+                    print(f"[WARN] repeated key {ref.key} detected.")
+                recent_keys.append(ref.key)
+                try:
+                    fingerprint = None
+                    if incremental:
+                        ref, fingerprint = incremental.prepare(ref)
+                    raw = connector.fetch(ref)
+                    if incremental and incremental.skip(fingerprint, raw):
+                        processed += 1
+                        _mark_skipped(store, args.connector, run_id, shard_key, queue_id, ref, fingerprint)
+                        consecutive_errors = 0
+                        continue
+                    doc = connector.parse(raw)
+                    chunks = connector.chunk(doc)
+                    changed = incremental.record(ref, fingerprint, _raw_info(raw), doc, chunks) if incremental else True
+                    processed += 1
+                    decision_iso = _decision_date_iso(doc, ref)
+                    store.mark_item_processed(
+                        connector=args.connector,
+                        run_id=run_id,
+                        shard_key=shard_key,
+                        item_key=ref.key,
+                        decision_date=decision_iso,
+                        doc_id=doc.doc_id,
                     )
-                    if args.full_text:
-                        text = doc.meta.get("full_text") or "\n\n".join(chunk.content for chunk in chunks)
-                        print("- FULL TEXT START ".ljust(40, "-"))
-                        print(text)
-                        print("- FULL TEXT END ".ljust(40, "-"))
-                    for idx, chunk in enumerate(chunks):
-                        preview = chunk.content[:80].replace("\n", " ")
-                        print(f"  chunk[{idx}] tokens={chunk.token_count} preview={preview!r}")
-                    print("-" * 40)
-
-            except Exception as exc:  # noqa: BLE001
-                consecutive_errors += 1
-                store.record_error(run_id, str(exc))
-                print(f"[ERROR] Failed processing {ref.key}: {exc}")
-                delay = min(3600, int(5 * (2 ** attempts))) + int(random.uniform(1, 5))
-                store.mark_queue_retry(queue_id, str(exc), delay, args.max_attempts)
-                if consecutive_errors >= args.max_errors:
-                    raise RuntimeError(
-                        f"Aborting after {consecutive_errors} consecutive errors."
-                    ) from exc
-
+                    store.mark_queue_done(queue_id)
+                    consecutive_errors = 0
+
+                    if dump_fp and changed:
+                        _dump_doc(dump_fp, doc)
+
+                    if args.log_heartbeat:
+                        print(
+                            f"[RUN {run_id}] processed={processed} quality={doc.meta.get('quality_flag','ok')} last_doc={doc.doc_id}"
+                        )
+                    else:
+                        _print_doc(ref, doc, chunks, args.full_text)
+
+                except Exception as exc:  # noqa: BLE001
+                    consecutive_errors += 1
+                    store.record_error(run_id, str(exc))
+                    print(f"[ERROR] Failed processing {ref.key}: {exc}")
+                    store.mark_queue_retry(queue_id, str(exc), _retry_delay(attempts), args.max_attempts)
+                    if consecutive_errors >= args.max_errors:
+                        raise RuntimeError(
+                            f"Aborting after {consecutive_errors} consecutive errors."
+                        ) from exc
+                except BaseException:
+                    # Ctrl+C vb.: yarım kalan öğe lease süresini beklemeden kuyruğa döner
+                    store.release_items([queue_id])
+                    raise
+
+        lister.raise_error()
+        if incremental:
+            print(f"[RUN {run_id}] incremental: {incremental.summary()}")
         status = "completed" if consecutive_errors == 0 else "completed_with_warnings"
         store.finish_run(run_id, status=status)
         stats = store.queue_counts(args.connector, shard_key)
         print(f"[RUN {run_id}] queue summary: {stats}")
+        if getattr(connector, "proxies", None) is not None:
+            for row in connector.proxies.stats():
+                print(
+                    f"[RUN {run_id}] proxy {row['proxy']} requests={row['requests']} ok={row['successes']} "
+                    f"429={row['throttled']} 5xx={row['server_errors']} timeouts={row['timeouts']} "
+                    f"latency={row['latency_ewma'] and round(row['latency_ewma'], 3)} weight={row['weight']}"
+                )
 
     except KeyboardInterrupt:
         print("Stopping... progress saved.")
@@ -233,9 +401,425 @@ def main() -> None:
         store.finish_run(run_id, status="failed")
         raise
     finally:
+        lister.stop()
         if dump_fp:
             dump_fp.close()
+        if incremental:
+            incremental.close()
         connector.close()
+        store.close()
+
+
+# -------------------------------------------------------------------- listing
+class _Lister:
+    """
+    Streams ``connector.list_items`` into the queue, enqueueing every
+    ``--enqueue-batch`` refs. Connectors with ``plan_window`` are listed one
+    planned window at a time; others in a single call. After each window the
+    shard's listing checkpoint is advanced; a later run of the same shard
+    resumes after the last finished window unless the listing had completed
+    (then the whole window is listed again to pick up new decisions).
+    """
+
+    def __init__(self, args, connector, store: BaseStateStore, run_id: str, shard_key: str, since: date, until: date):
+        self.args = args
+        self.connector = connector
+        self.store = store
+        self.run_id = run_id
+        self.shard_key = shard_key
+        self.until = until
+        self.start_date = since
+        self.enqueued = 0
+        self.error: Exception | None = None
+        self.done = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        checkpoint = None if args.restart_listing else store.load_listing_checkpoint(args.connector, shard_key)
+        if checkpoint and not checkpoint["done"]:
+            resume_at = _parse_date(checkpoint["listed_until"]) + timedelta(days=1)
+            if resume_at > self.start_date:
+                print(f"[RUN {run_id}] listing checkpoint: resuming after {checkpoint['listed_until']}")
+                self.start_date = resume_at
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.run, name="lister", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def raise_error(self) -> None:
+        if self.error is not None:
+            raise RuntimeError(f"listing failed: {self.error}") from self.error
+
+    def run(self) -> None:
+        try:
+            cursor = self.start_date
+            while cursor <= self.until and not self._stop.is_set():
+                # pencere planlamayan connector'lar kendi sayfalamasıyla tek seferde listelenir
+                planner = getattr(self.connector, "plan_window", None)
+                win_end = planner(cursor, self.until) if planner is not None else self.until
+                batch: list[dict[str, Any]] = []
+                listed = 0
+                for ref in self.connector.list_items(cursor, win_end):
+                    batch.append(json.loads(ref.model_dump_json()))
+                    listed += 1
+                    if len(batch) >= self.args.enqueue_batch:
+                        self._enqueue(batch)
+                        batch = []
+                    if self._stop.is_set():
+                        return
+                self._enqueue(batch)
+                self.store.save_listing_checkpoint(
+                    self.args.connector, self.shard_key, win_end.isoformat(), done=win_end >= self.until
+                )
+                print(
+                    f"[RUN {self.run_id}] listed {cursor}..{win_end} refs={listed} enqueued_total={self.enqueued}"
+                )
+                cursor = win_end + timedelta(days=1)
+            if cursor > self.until:
+                print(f"[RUN {self.run_id}] Enqueued {self.enqueued} refs for {self.shard_key}")
+        except Exception as exc:  # noqa: BLE001
+            # KeyboardInterrupt/SystemExit yakalanmaz: iptal "cancelled" olarak kapanmalı
+            self.error = exc
+        finally:
+            self.done.set()
+
+    def _enqueue(self, batch: list[dict[str, Any]]) -> None:
+        if not batch:
+            return
+        if self.args.pipeline:
+            # Backpressure: kuyruk fazla öndeyse tüketicilerin yetişmesini bekle
+            while not self._stop.is_set():
+                counts = self.store.queue_counts(self.args.connector, self.shard_key)
+                if counts["PENDING"] + counts["RETRY"] < self.args.max_queue_ahead:
+                    break
+                time.sleep(1.0)
+        self.store.enqueue_items(self.args.connector, self.shard_key, batch)
+        self.enqueued += len(batch)
+        self.store.heartbeat(self.run_id, stage="list")
+
+
+def _raise_keyboard_interrupt(signum, frame) -> None:
+    raise KeyboardInterrupt
+
+
+def _retry_delay(attempts: int) -> int:
+    return min(3600, int(5 * (2 ** attempts))) + int(random.uniform(1, 5))
+
+
+def _dump_doc(dump_fp, doc) -> None:
+    payload = {
+        "doc_id": doc.doc_id,
+        "title": str(doc.title),
+        "url": str(doc.url),
+        "decision_date": (doc.decision_date.isoformat() if doc.decision_date else None),
+        "chamber": doc.chamber,
+        "court": doc.court,
+        "meta": json.loads(json.dumps(doc.meta, default=str)),
+        "text": doc.text,
+    }
+    dump_fp.write(json.dumps(payload, ensure_ascii=False, default=str) + "\n")
+    dump_fp.flush()
+
+
+def _print_doc(ref: ItemRef, doc, chunks, full_text: bool) -> None:
+    print(f"ref: {ref}")
+    print(
+        f"doc_id={doc.doc_id} title={doc.title!r} chunks={len(chunks)} checksum={doc.checksum[:10]}..."
+    )
+    if full_text:
+        text = doc.meta.get("full_text") or "\n\n".join(chunk.content for chunk in chunks)
+        print("- FULL TEXT START ".ljust(40, "-"))
+        print(text)
+        print("- FULL TEXT END ".ljust(40, "-"))
+    for idx, chunk in enumerate(chunks):
+        preview = chunk.content[:80].replace("\n", " ")
+        print(f"  chunk[{idx}] tokens={chunk.token_count} preview={preview!r}")
+    print("-" * 40)
+
+
+# ---------------------------------------------------------------- incremental
+class _Incremental:
+    """
+    Fingerprint bookkeeping for ``--incremental``: stored validators make the
+    fetch conditional, a 304 or identical raw payload skips parse/chunk, an
+    identical ``doc.checksum`` skips the dump, and only chunks whose hash
+    changed (``diff_chunks``) go to ``--changed-chunks-ndjson``.
+    """
+
+    def __init__(self, store: BaseStateStore, connector_name: str, chunks_path: str | None):
+        self.store = store
+        self.connector_name = connector_name
+        self.counts = {"new": 0, "changed": 0, "unchanged": 0, "raw_unchanged": 0, "not_modified": 0}
+        self.chunks_forwarded = 0
+        self.chunks_fp = None
+        if chunks_path:
+            Path(chunks_path).parent.mkdir(parents=True, exist_ok=True)
+            self.chunks_fp = open(chunks_path, "a", encoding="utf-8")
+
+    def prepare(self, ref: ItemRef) -> tuple[ItemRef, Optional[dict[str, Any]]]:
+        fingerprint = self.store.load_fingerprint(self.connector_name, ref.key)
+        return conditional_ref(ref, fingerprint), fingerprint
+
+    def skip(self, fingerprint: Optional[dict[str, Any]], raw) -> bool:
+        status = precheck(fingerprint, raw)
+        if status:
+            self.skipped(status)
+        return status is not None
+
+    def skipped(self, status: str) -> None:
+        self.counts[status] += 1
+
+    def record(self, ref: ItemRef, fingerprint: Optional[dict[str, Any]], raw_info, doc, chunks) -> bool:
+        """Save the new fingerprint; True when the document is new or changed."""
+        status, changed_chunks = diff_document(fingerprint, doc, chunks)
+        self.counts[status] += 1
+        raw_hash, etag, last_modified = raw_info or (None, None, None)
+        self.store.save_fingerprint(
+            self.connector_name,
+            ref.key,
+            doc.doc_id,
+            fingerprint_checksum(doc),
+            raw_hash=raw_hash,
+            etag=etag,
+            last_modified=last_modified,
+            chunk_hashes={chunk.chunk_id: chunk.content_hash for chunk in chunks},
+        )
+        if self.chunks_fp and changed_chunks:
+            for chunk in changed_chunks:
+                self.chunks_fp.write(chunk.model_dump_json() + "\n")
+            self.chunks_fp.flush()
+        self.chunks_forwarded += len(changed_chunks)
+        return status not in UNCHANGED
+
+    def summary(self) -> str:
+        counts = " ".join(f"{key}={value}" for key, value in self.counts.items())
+        return f"{counts} chunks_forwarded={self.chunks_forwarded}"
+
+    def close(self) -> None:
+        if self.chunks_fp:
+            self.chunks_fp.close()
+
+
+def _raw_info(raw) -> tuple[Optional[str], Optional[str], Optional[str]]:
+    return raw_content_hash(raw), raw.etag, raw.last_modified
+
+
+def _mark_skipped(store: BaseStateStore, connector_name: str, run_id: str, shard_key: str, queue_id: int, ref, fingerprint):
+    decision = _parse_date(ref.metadata.get("decision_date"))
+    store.mark_item_processed(
+        connector=connector_name,
+        run_id=run_id,
+        shard_key=shard_key,
+        item_key=ref.key,
+        decision_date=decision.isoformat() if decision else None,
+        doc_id=fingerprint.get("doc_id") if fingerprint else None,
+    )
+    store.mark_queue_done(queue_id)
+
+
+# ---------------------------------------------------------------- worker pool
+@dataclass
+class _Job:
+    queue_id: int
+    attempts: int
+    ref: ItemRef
+    stage: str = "fetch"
+    fingerprint: Optional[dict[str, Any]] = None
+    raw_info: Optional[tuple] = None
+    skipped: Optional[str] = None
+
+
+class _StageMeter:
+    """Completed items per stage (fetch/parse/store) since the pool started."""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.counts = {"fetch": 0, "parse": 0, "store": 0}
+        self._lock = threading.Lock()
+
+    def mark(self, stage: str) -> None:
+        with self._lock:
+            self.counts[stage] += 1
+
+    def line(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        with self._lock:
+            return " ".join(f"{stage}={count / elapsed:.2f}/s" for stage, count in self.counts.items())
+
+
+_PARSE_CONNECTOR = None
+
+
+def _init_parse_worker(connector_name: str) -> None:
+    # Süreç başına yalnızca parse/chunk için offline bir konektör örneği
+    global _PARSE_CONNECTOR
+    _PARSE_CONNECTOR = CONNECTORS[connector_name](use_live=False)
+
+
+def _parse_raw(raw):
+    doc = _PARSE_CONNECTOR.parse(raw)
+    return doc, _PARSE_CONNECTOR.chunk(doc)
+
+
+def _run_pool(
+    args,
+    connector,
+    store: BaseStateStore,
+    run_id: str,
+    shard_key: str,
+    dump_fp,
+    recent_keys,
+    lister: "_Lister",
+    incremental: Optional["_Incremental"] = None,
+) -> tuple[int, int]:
+    """
+    Drain the shard queue with ``args.workers`` fetch threads.
+
+    The main thread is the only one touching the StateStore: it claims leased
+    batches (keeping at most two items per worker in flight, renewing leases
+    while they run), forwards fetched pages to the
+    parse pool and acks/retries completions exactly like the sequential loop,
+    so resume, retry back-off and ``--max-errors`` behave the same.
+    """
+    parse_procs = args.parse_procs if args.parse_procs is not None else min(4, os.cpu_count() or 1)
+    meter = _StageMeter()
+
+    def fetch_job(job: _Job):
+        raw = connector.fetch(job.ref)
+        meter.mark("fetch")
+        if incremental is not None:
+            # Ön kontrol fetch thread'inde: değişmemişse parse havuzuna hiç gitmez
+            job.skipped = precheck(job.fingerprint, raw)
+            if job.skipped:
+                return None
+            job.raw_info = _raw_info(raw)
+        if parse_pool is not None:
+            return raw
+        doc = connector.parse(raw)
+        chunks = connector.chunk(doc)
+        meter.mark("parse")
+        return doc, chunks
+
+    fetch_pool = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="fetch")
+    parse_pool = (
+        ProcessPoolExecutor(max_workers=parse_procs, initializer=_init_parse_worker, initargs=(args.connector,))
+        if parse_procs > 0
+        else None
+    )
+    inflight: dict[Future, _Job] = {}
+    processed = 0
+    consecutive_errors = 0
+    max_inflight = args.workers * 2
+    lease_renewed = time.monotonic()
+    print(
+        f"[RUN {run_id}] pool workers={args.workers} parse_procs={parse_procs} "
+        f"host_rate={getattr(getattr(connector, 'rate_limiter', None), 'rate', 'off')}"
+    )
+    try:
+        while True:
+            listing_done = lister.done.is_set()
+            room = max_inflight - len(inflight)
+            if args.limit > 0:
+                room = min(room, args.limit - processed - len(inflight))
+            claimed = store.claim_batch(
+                args.connector,
+                shard_key,
+                room,
+                lease_seconds=args.lease_seconds,
+                max_attempts=args.max_attempts,
+            )
+            for queued in claimed:
+                job = _Job(
+                    queue_id=queued.pop("_queue_id"),
+                    attempts=queued.pop("_attempts", 0),
+                    ref=ItemRef.model_validate(queued),
+                )
+                if incremental is not None:
+                    job.ref, job.fingerprint = incremental.prepare(job.ref)
+                if job.ref.key in recent_keys:
+                    print(f"[WARN] repeated key {job.ref.key} detected.")
+                recent_keys.append(job.ref.key)
+                inflight[fetch_pool.submit(fetch_job, job)] = job
+            if claimed:
+                store.heartbeat(run_id, stage="fetch", last_item_key=job.ref.key)
+            if inflight and time.monotonic() - lease_renewed > args.lease_seconds / 3:
+                store.extend_leases([job.queue_id for job in inflight.values()], args.lease_seconds)
+                lease_renewed = time.monotonic()
+            if not inflight:
+                if listing_done or (args.limit > 0 and processed >= args.limit):
+                    break
+                store.wait_for_work(args.connector, shard_key, timeout=0.5)
+                continue
+
+            # Listeleme sürerken yeni işler için sık uyan
+            timeout = args.lease_seconds / 3 if listing_done else 1.0
+            done, _ = wait(list(inflight), timeout=timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                job = inflight.pop(fut)
+                try:
+                    result = fut.result()
+                    if job.skipped:
+                        incremental.skipped(job.skipped)
+                        _mark_skipped(store, args.connector, run_id, shard_key, job.queue_id, job.ref, job.fingerprint)
+                        processed += 1
+                        consecutive_errors = 0
+                        meter.mark("store")
+                        continue
+                    if job.stage == "fetch" and parse_pool is not None:
+                        job.stage = "parse"
+                        inflight[parse_pool.submit(_parse_raw, result)] = job
+                        continue
+                    if job.stage == "parse":
+                        meter.mark("parse")
+                    doc, chunks = result
+                    changed = (
+                        incremental.record(job.ref, job.fingerprint, job.raw_info, doc, chunks) if incremental else True
+                    )
+                    store.mark_item_processed(
+                        connector=args.connector,
+                        run_id=run_id,
+                        shard_key=shard_key,
+                        item_key=job.ref.key,
+                        decision_date=_decision_date_iso(doc, job.ref),
+                        doc_id=doc.doc_id,
+                    )
+                    store.mark_queue_done(job.queue_id)
+                except Exception as exc:  # noqa: BLE001
+                    consecutive_errors += 1
+                    store.record_error(run_id, str(exc))
+                    print(f"[ERROR] Failed processing {job.ref.key} ({job.stage}): {exc}")
+                    store.mark_queue_retry(job.queue_id, str(exc), _retry_delay(job.attempts), args.max_attempts)
+                    if consecutive_errors >= args.max_errors:
+                        raise RuntimeError(
+                            f"Aborting after {consecutive_errors} consecutive errors."
+                        ) from exc
+                    continue
+
+                processed += 1
+                consecutive_errors = 0
+                meter.mark("store")
+                if dump_fp and changed:
+                    _dump_doc(dump_fp, doc)
+                if args.log_heartbeat:
+                    print(
+                        f"[RUN {run_id}] processed={processed} inflight={len(inflight)} {meter.line()} "
+                        f"quality={doc.meta.get('quality_flag','ok')} last_doc={doc.doc_id}"
+                    )
+                else:
+                    _print_doc(job.ref, doc, chunks, args.full_text)
+    finally:
+        # İptal/abort: claim edilip bitmemiş öğeler kuyruğa geri bırakılır
+        for fut in inflight:
+            fut.cancel()
+        store.release_items([job.queue_id for job in inflight.values()])
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        if parse_pool is not None:
+            parse_pool.shutdown(wait=False, cancel_futures=True)
+    print(f"[RUN {run_id}] pool done processed={processed} {meter.line()}")
+    return processed, consecutive_errors
 
 
 def _parse_date(value: Any) -> date | None:
@@ -13,10 +13,12 @@ What it does:
   - Slices by year (last yıl end-date ile kısalır).
   - En fazla --parallel kadar pencereyi aynı anda çalıştırır.
   - Her pencereyi run_connector.py ile çalıştırır, log'u ayrı dosyaya yazar.
-  - StateStore'dan (state.db) kuyruk durumlarını okuyup yüzde olarak gösterir.
+  - Tüm alt süreçler host başına tek hız bütçesini paylaşır (--rate-backend, varsayılan .cache/rate_limits.sqlite).
+  - StateStore'dan (state.db veya --state-db postgresql://...) kuyruk durumlarını okuyup yüzde olarak gösterir.
 """
 
 import argparse
+import os
 import subprocess
 import sys
 import time
@@ -28,9 +30,10 @@ from typing import List, Optional, Tuple
 ROOT = Path(__file__).resolve().parents[1]
 RUN_CONNECTOR = ROOT / "scripts" / "run_connector.py"
 DEFAULT_LOG_DIR = ROOT / "logs"
+DEFAULT_RATE_DB = ROOT / ".cache" / "rate_limits.sqlite"
 
 sys.path.insert(0, str(ROOT))
-from src.core.state import StateStore  # noqa: E402
+from src.core.state import BaseStateStore, open_state_store  # noqa: E402
 
 
 def build_windows(start_year: int, end_year: int, last_end: Optional[date]) -> List[Tuple[date, date]]:
@@ -56,7 +59,7 @@ def window_key(ws: date, we: date) -> str:
     return f"{CONNECTOR}:{ws.isoformat()}->{we.isoformat()}"
 
 
-def monitor(store: StateStore, active: list, queued: deque, finished: list) -> str:
+def monitor(store: BaseStateStore, active: list, queued: deque, finished: list) -> str:
     lines = []
     lines.append("WINDOW                STATUS     DONE/TOTAL   %     PEND  INPR  RETRY  FAIL")
     lines.append("-" * 76)
@@ -75,7 +78,14 @@ def monitor(store: StateStore, active: list, queued: deque, finished: list) -> s
     return "\n".join(lines)
 
 
-def launch_run(ws: date, we: date, log_dir: Path) -> subprocess.Popen:
+def launch_run(
+    ws: date,
+    we: date,
+    log_dir: Path,
+    state_db: Optional[str] = None,
+    rate_backend: Optional[str] = None,
+    host_rate: Optional[float] = None,
+) -> subprocess.Popen:
     log_dir.mkdir(parents=True, exist_ok=True)
     log_file = log_dir / f"{CONNECTOR}_{ws.year}.log"
     cmd = [
@@ -90,6 +100,13 @@ def launch_run(ws: date, we: date, log_dir: Path) -> subprocess.Popen:
         we.isoformat(),
         "--log-heartbeat",
     ]
+    if state_db:
+        cmd += ["--state-db", state_db]
+    if rate_backend:
+        # Tüm pencereler host başına tek bütçeyi paylaşır
+        cmd += ["--rate-backend", rate_backend]
+    if host_rate:
+        cmd += ["--host-rate", str(host_rate)]
     return subprocess.Popen(cmd, stdout=log_file.open("w"), stderr=subprocess.STDOUT)
 
 
@@ -105,6 +122,24 @@ def main() -> None:
     parser.add_argument("--parallel", type=int, default=4, help="Aynı anda kaç pencere koşsun")
     parser.add_argument("--refresh", type=int, default=5, help="Durum yenileme saniyesi")
     parser.add_argument("--log-dir", type=str, default=str(DEFAULT_LOG_DIR))
+    parser.add_argument(
+        "--state-db",
+        type=str,
+        default=None,
+        help="SQLite yolu veya postgresql:// DSN (varsayılan: STATE_DB_URL ya da state.db)",
+    )
+    parser.add_argument(
+        "--rate-backend",
+        type=str,
+        default=os.getenv("RATE_LIMIT_URL") or str(DEFAULT_RATE_DB),
+        help="Pencereler arası ortak hız bütçesi: SQLite yolu veya redis:// URL ('' ile kapatılır)",
+    )
+    parser.add_argument(
+        "--host-rate",
+        type=float,
+        default=None,
+        help="Tüm pencerelerin toplamı için host başına istek/sn (varsayılan run_connector DEFAULT_HOST_RATE)",
+    )
     args = parser.parse_args()
 
     last_end = datetime.strptime(args.end_date, "%Y-%m-%d").date() if args.end_date else None
@@ -113,14 +148,14 @@ def main() -> None:
     active: list[Tuple[date, date]] = []
     finished: list[Tuple[date, date]] = []
     procs: dict[Tuple[date, date], subprocess.Popen] = {}
-    store = StateStore()
+    store = open_state_store(args.state_db)
 
     print(f"Launching {len(windows)} windows (parallel={args.parallel}, connector={CONNECTOR})")
     try:
         while queue or active:
             while queue and len(active) < args.parallel:
                 ws, we = queue.popleft()
-                proc = launch_run(ws, we, Path(args.log_dir))
+                proc = launch_run(ws, we, Path(args.log_dir), args.state_db, args.rate_backend, args.host_rate)
                 procs[(ws, we)] = proc
                 active.append((ws, we))
 
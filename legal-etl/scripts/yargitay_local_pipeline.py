@@ -1,5 +1,4 @@
 #!/usr/bin/env python
-# -*- coding: utf-8 -*-
 """
 Yerel Yargıtay RAG hazırlığı:
 - Chunk'lanmış NDJSON'ları okur
@@ -7,22 +6,50 @@ Yerel Yargıtay RAG hazırlığı:
 - Qdrant koleksiyonunu (int8 quantization + on-disk) oluşturup doldurur
 
 Örnek kullanım:
-python legal-etl/scripts/clean_yargitay.py --chunk-dir legal-etl/cleaned/chunks_2005 --max-chars 2200 --overlap-chars 300
-python legal-etl/scripts/yargitay_local_pipeline.py --chunks-path legal-etl/cleaned/chunks_2005/yargitay_2005_chunks.ndjson --recreate --on-disk
+python legal-etl/scripts/clean_yargitay.py --chunk-dir legal-etl/cleaned/chunks_2005 \
+    --max-chars 2200 --overlap-chars 300
+python legal-etl/scripts/yargitay_local_pipeline.py \
+    --chunks-path legal-etl/cleaned/chunks_2005/yargitay_2005_chunks.ndjson --recreate --on-disk
+
+Akış üç aşamalı ve sınırlı kuyruklarla bağlı: NDJSON okuyucu -> encoder
+(süreç içi ya da --encoder-procs kadar CPU süreci) -> asenkron yükleyici
+(--upload-parallel kadar wait=False upsert, sonda wait=True tutarlılık bariyeri).
+Kesintide checkpoint'teki son commit edilen chunk_id'den devam eder. Aynı
+(model, embed_version, content_hash) için daha önce üretilmiş vektörler
+src/core/embed_cache önbelleğinden gelir (--no-embed-cache ile kapatılır).
+--backend bge-m3 --sparse [--colbert] ile dense/sparse/ColBERT isimli vektörler
+tek geçişte yazılır (sorgu: query_qdrant.py --hybrid).
 """
 from __future__ import annotations
 
 import argparse
+import asyncio
 import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Iterable, List, Sequence, Tuple
+from typing import Any
 from uuid import NAMESPACE_URL, UUID, uuid5
 
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.http import models as qm
-from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from src.core.embed import BACKENDS, Embedder  # noqa: E402
+from src.core.embed_cache import EmbeddingCache, encode_with_cache  # noqa: E402
+from src.core.index_qdrant import named_vectors_config, to_point_vector  # noqa: E402
+from src.core.utils import hash_for_content  # noqa: E402
+
 
 def parse_args() -> argparse.Namespace:
     ap = argparse.ArgumentParser(description="Yargıtay chunk → Qdrant yerel pipeline")
@@ -39,7 +66,34 @@ def parse_args() -> argparse.Namespace:
     ap.add_argument(
         "--model",
         default="BAAI/bge-m3",
-        help="SentenceTransformer embedding modeli",
+        help="Embedding modeli (HF adı; onnx için dışa aktarılmış model dizini --onnx-path)",
+    )
+    ap.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="sentence-transformers",
+        help="Embedding backend'i; CPU'da onnx (int8) önerilir",
+    )
+    ap.add_argument(
+        "--sparse",
+        action="store_true",
+        help="BGE-M3 lexical ağırlıklarını 'sparse' isimli vektör olarak da yaz (--backend bge-m3)",
+    )
+    ap.add_argument(
+        "--colbert",
+        action="store_true",
+        help=(
+            "BGE-M3 ColBERT çoklu vektörlerini 'colbert' isimli vektör olarak da yaz "
+            "(--backend bge-m3)"
+        ),
+    )
+    ap.add_argument(
+        "--onnx-path",
+        default=None,
+        help=(
+            "model.onnx + tokenizer dizini "
+            "(varsayılan: EMBED_ONNX_DIR ya da legal-etl/.cache/onnx/<model>)"
+        ),
     )
     ap.add_argument(
         "--device",
@@ -78,20 +132,81 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Koleksiyonu yeniden oluştur (varsa siler)",
     )
+    ap.add_argument(
+        "--queue-depth",
+        type=int,
+        default=4,
+        help="Aşamalar arası kuyrukta bekleyebilecek batch sayısı",
+    )
+    ap.add_argument(
+        "--upload-parallel",
+        type=int,
+        default=4,
+        help="Aynı anda uçuşta olan upsert (wait=False) sayısı",
+    )
+    ap.add_argument(
+        "--encoder-procs",
+        type=int,
+        default=0,
+        help="CPU'da N ayrı encoder süreci (0 = süreç içi, GPU için önerilen)",
+    )
+    ap.add_argument(
+        "--checkpoint",
+        default=None,
+        help=(
+            "Son commit edilen chunk_id dosyası "
+            "(varsayılan: <chunks-path>.<collection>.ckpt.json)"
+        ),
+    )
+    ap.add_argument(
+        "--embed-version",
+        type=int,
+        default=1,
+        help="Chunk'ta embed_version yoksa önbellek anahtarında kullanılacak sürüm",
+    )
+    ap.add_argument(
+        "--embed-cache-dir",
+        default=None,
+        help=(
+            "Embedding önbellek dizini "
+            "(varsayılan: EMBED_CACHE_DIR ya da legal-etl/.cache/embeddings)"
+        ),
+    )
+    ap.add_argument(
+        "--embed-cache-dtype",
+        choices=["float16", "int8"],
+        default=None,
+        help="Önbellekte vektör tipi (varsayılan: EMBED_CACHE_DTYPE ya da float16)",
+    )
+    ap.add_argument(
+        "--no-embed-cache",
+        action="store_true",
+        help="Embedding önbelleğini kullanma, her chunk'ı yeniden encode et",
+    )
+    ap.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Checkpoint'i yok say, baştan yükle",
+    )
     return ap.parse_args()
 
 
-def iter_chunks(path: Path, limit: int | None = None) -> Iterable[Tuple[str, str, Dict]]:
+def iter_chunks(
+    path: Path, limit: int | None = None, start_line: int = 0
+) -> Iterable[tuple[int, str, str, dict]]:
     with path.open("r", encoding="utf-8") as fh:
         for idx, line in enumerate(fh, 1):
             if limit is not None and idx > limit:
                 break
+            if idx <= start_line:
+                continue
             obj = json.loads(line)
-            text = obj.get("text", "").strip()
+            # clean_yargitay "text", run_connector --changed-chunks-ndjson "content" yazar
+            text = (obj.get("text") or obj.get("content") or "").strip()
             if not text:
                 continue
             chunk_id = obj.get("chunk_id") or obj.get("doc_id") or f"chunk-{idx}"
-            yield chunk_id, text, obj
+            yield idx, chunk_id, text, obj
 
 
 def ensure_collection(
@@ -100,6 +215,8 @@ def ensure_collection(
     dim: int,
     quantize: bool,
     on_disk: bool,
+    sparse: bool = False,
+    colbert_dim: int | None = None,
 ) -> None:
     quant_cfg = None
     if quantize:
@@ -111,6 +228,23 @@ def ensure_collection(
             )
         )
 
+    hnsw_cfg = qm.HnswConfigDiff(
+        m=32,
+        ef_construct=256,
+    )
+    if sparse or colbert_dim:
+        # İsimli vektörler: dense + sparse (+ colbert), hibrit sorgu için
+        vectors, sparse_vectors = named_vectors_config(
+            dim, colbert_dim=colbert_dim, on_disk=on_disk, quantization=quant_cfg
+        )
+        client.recreate_collection(
+            collection_name=collection,
+            vectors_config=vectors,
+            sparse_vectors_config=sparse_vectors,
+            hnsw_config=hnsw_cfg,
+        )
+        return
+
     client.recreate_collection(
         collection_name=collection,
         vectors_config=qm.VectorParams(
@@ -119,38 +253,364 @@ def ensure_collection(
             on_disk=on_disk,
             quantization_config=quant_cfg,
         ),
-        hnsw_config=qm.HnswConfigDiff(
-            m=32,
-            ef_construct=256,
-        ),
+        hnsw_config=hnsw_cfg,
     )
 
 
-def upsert_batch(
-    client: QdrantClient,
-    collection: str,
-    ids: Sequence[str],
-    vectors: Sequence[Sequence[float]],
-    payloads: Sequence[Dict],
-) -> None:
-    def _as_uuid(point_id: str | int) -> str | int:
-        # Qdrant on this setup only accepts int or UUID IDs; map string IDs to stable UUID5.
-        if isinstance(point_id, int):
-            return point_id
-        try:
-            return str(UUID(str(point_id)))
-        except Exception:
-            return str(uuid5(NAMESPACE_URL, str(point_id)))
+def _as_uuid(point_id: str | int) -> str | int:
+    # Qdrant on this setup only accepts int or UUID IDs; map string IDs to stable UUID5.
+    if isinstance(point_id, int):
+        return point_id
+    try:
+        return str(UUID(str(point_id)))
+    except Exception:
+        return str(uuid5(NAMESPACE_URL, str(point_id)))
+
 
-    points = [
+def build_points(
+    ids: Sequence[str], vectors: Sequence[Any], payloads: Sequence[dict]
+) -> list[qm.PointStruct]:
+    return [
         qm.PointStruct(
             id=_as_uuid(pid),
-            vector=vec,
+            vector=to_point_vector(vec),
             payload=payload,
         )
-        for pid, vec, payload in zip(ids, vectors, payloads)
+        for pid, vec, payload in zip(ids, vectors, payloads, strict=True)
+    ]
+
+
+# --------------------------------------------------------------------------- pipeline
+_DONE = object()
+
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Kuyruk doluysa bekler; başka bir aşama durduysa (stop) bırakır ve False döner."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event) -> Any:
+    """Kuyruk boşsa bekler; stop set edilirse _DONE döner."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+@dataclass
+class Batch:
+    seq: int
+    last_line: int
+    ids: list[str]
+    texts: list[str]
+    payloads: list[dict]
+    vectors: list[Any] | None = None  # dense liste ya da {"dense", "sparse", "colbert"}
+
+
+@dataclass
+class StageMeter:
+    started: float = field(default_factory=time.monotonic)
+    counts: dict[str, int] = field(default_factory=lambda: {"read": 0, "encode": 0, "upload": 0})
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add(self, stage: str, n: int) -> None:
+        with self.lock:
+            self.counts[stage] += n
+
+    def line(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        with self.lock:
+            return " ".join(f"{k}={v} ({v / elapsed:.1f}/s)" for k, v in self.counts.items())
+
+
+class Checkpoint:
+    """Son commit edilen chunk: yalnız kesintisiz ilerleyen batch dizisinin sonu yazılır."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.state: dict[str, Any] = {}
+        self._acked: dict[int, Batch] = {}
+        self._next_seq = 0
+
+    def load(self) -> dict[str, Any]:
+        if self.path.exists():
+            self.state = json.loads(self.path.read_text(encoding="utf-8"))
+        return self.state
+
+    def ack(self, batch: Batch) -> None:
+        # Paralel upsert'ler sırasız biter; watermark yalnız ardışık seq'lerle ilerler
+        self._acked[batch.seq] = batch
+        advanced = None
+        while self._next_seq in self._acked:
+            advanced = self._acked.pop(self._next_seq)
+            self._next_seq += 1
+            self.state["count"] = self.state.get("count", 0) + len(advanced.ids)
+        if advanced is not None:
+            self.state.update(chunk_id=advanced.ids[-1], line=advanced.last_line)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps(self.state, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self.path)
+
+
+def resume_line(path: Path, state: dict[str, Any]) -> int:
+    """Checkpoint satırındaki chunk_id hâlâ aynıysa o satırdan sonrası işlenir."""
+    line_no = int(state.get("line") or 0)
+    if not line_no:
+        return 0
+    with path.open("r", encoding="utf-8") as fh:
+        for idx, line in enumerate(fh, 1):
+            if idx == line_no:
+                obj = json.loads(line)
+                chunk_id = obj.get("chunk_id") or obj.get("doc_id") or f"chunk-{idx}"
+                if chunk_id == state.get("chunk_id"):
+                    return line_no
+                break
+    raise SystemExit(
+        f"Checkpoint {state.get('chunk_id')} (satır {line_no}) chunk dosyasıyla uyuşmuyor; "
+        "--no-resume ile baştan başlayın."
+    )
+
+
+def read_stage(
+    path: Path,
+    limit: int | None,
+    start_line: int,
+    batch_size: int,
+    out_q: queue.Queue,
+    meter: StageMeter,
+    stop: threading.Event,
+) -> None:
+    seq = 0
+    batch = Batch(seq=0, last_line=start_line, ids=[], texts=[], payloads=[])
+    for line_no, chunk_id, text, payload in iter_chunks(path, limit=limit, start_line=start_line):
+        if stop.is_set():
+            return
+        batch.ids.append(chunk_id)
+        batch.texts.append(text)
+        batch.payloads.append(payload)
+        batch.last_line = line_no
+        if len(batch.ids) >= batch_size:
+            if not _put(out_q, batch, stop):
+                return
+            meter.add("read", len(batch.ids))
+            seq += 1
+            batch = Batch(seq=seq, last_line=line_no, ids=[], texts=[], payloads=[])
+    if batch.ids and _put(out_q, batch, stop):
+        meter.add("read", len(batch.ids))
+
+
+_ENCODER: Any = None
+_OUTPUTS: tuple[bool, bool] | None = None  # hibrit modda (sparse, colbert)
+
+
+def build_embedder(
+    backend: str,
+    model: str,
+    device: str,
+    batch_size: int,
+    onnx_path: str | None,
+    threads: int | None = None,
+) -> Embedder:
+    kwargs: dict[str, Any] = {"path": onnx_path, "threads": threads} if backend == "onnx" else {}
+    # önbelleği pipeline kendisi yönetir
+    return Embedder(
+        model=model,
+        backend=backend,
+        device=device,
+        max_batch_size=batch_size,
+        cache=False,
+        **kwargs,
+    )
+
+
+def encode_texts(
+    embedder: Embedder, texts: list[str], outputs: tuple[bool, bool] | None
+) -> list[Any]:
+    if outputs is None:
+        return embedder.embed_documents(texts)
+    return embedder.embed_hybrid(texts, sparse=outputs[0], colbert=outputs[1])
+
+
+def probe_dims(
+    embedder: Embedder, outputs: tuple[bool, bool] | None
+) -> tuple[int, int | None, str]:
+    """(dense boyutu, ColBERT boyutu, önbellek ad alanı)"""
+    namespace = embedder.backend.cache_namespace
+    if outputs is None or not outputs[1]:
+        return embedder.dim, None, namespace
+    item = embedder.embed_hybrid(["ping"], sparse=False, colbert=True)[0]
+    return len(item["dense"]), len(item["colbert"][0]), namespace
+
+
+def _init_encoder(
+    backend: str,
+    model_name: str,
+    batch_size: int,
+    onnx_path: str | None,
+    threads: int,
+    outputs: tuple[bool, bool] | None = None,
+) -> None:
+    global _ENCODER, _OUTPUTS
+    _OUTPUTS = outputs
+    try:
+        import torch
+
+        torch.set_num_threads(max(1, threads))
+    except Exception:  # noqa: BLE001
+        pass
+    _ENCODER = build_embedder(backend, model_name, "cpu", batch_size, onnx_path, threads)
+
+
+def _probe_dims() -> tuple[int, int | None, str]:
+    return probe_dims(_ENCODER, _OUTPUTS)
+
+
+def _encode_texts(texts: list[str]) -> tuple[list[Any], float]:
+    t0 = time.perf_counter()
+    vectors = encode_texts(_ENCODER, texts, _OUTPUTS)
+    return vectors, time.perf_counter() - t0
+
+
+def _cache_keys(cache: EmbeddingCache | None, batch: Batch, embed_version: int) -> list[bytes]:
+    if cache is None:
+        return []
+    return [
+        cache.key(
+            p.get("content_hash") or hash_for_content(t), p.get("embed_version") or embed_version
+        )
+        for t, p in zip(batch.texts, batch.payloads, strict=True)
     ]
-    client.upsert(collection_name=collection, points=points, wait=True)
+
+
+def encode_stage(
+    embedder: Embedder | None,
+    pool: ProcessPoolExecutor | None,
+    in_q: queue.Queue,
+    out_q: queue.Queue,
+    meter: StageMeter,
+    procs: int,
+    stop: threading.Event,
+    cache: EmbeddingCache | None = None,
+    embed_version: int = 1,
+    outputs: tuple[bool, bool] | None = None,
+) -> None:
+    if pool is None:
+        encode = lambda texts: encode_texts(embedder, texts, outputs)  # noqa: E731
+        while True:
+            batch = _get(in_q, stop)
+            if batch is _DONE:
+                return
+            keys = _cache_keys(cache, batch, embed_version)
+            batch.vectors = encode_with_cache(cache, keys, batch.texts, encode)
+            meter.add("encode", len(batch.ids))
+            if not _put(out_q, batch, stop):
+                return
+    # Süreç havuzu: süreç başına en fazla 2 batch uçuşta; sonuçlar gönderim sırasıyla teslim edilir.
+    # Önbellek ana süreçte: yalnız kaçan metinler havuza gider.
+    inflight: list[tuple[Any, Batch, list[bytes], list[int]]] = []
+    source_done = False
+    while inflight or not source_done:
+        while not source_done and len(inflight) < procs * 2:
+            batch = _get(in_q, stop)
+            if batch is _DONE:
+                source_done = True
+                break
+            keys = _cache_keys(cache, batch, embed_version)
+            batch.vectors = cache.get_many(keys) if cache is not None else [None] * len(batch.texts)
+            missing = [i for i, vec in enumerate(batch.vectors) if vec is None]
+            fut = pool.submit(_encode_texts, [batch.texts[i] for i in missing]) if missing else None
+            inflight.append((fut, batch, keys, missing))
+        if not inflight:
+            break
+        fut, batch, keys, missing = inflight.pop(0)
+        if fut is not None:
+            vectors, seconds = fut.result()
+            for i, vec in zip(missing, vectors, strict=True):
+                batch.vectors[i] = vec
+            if cache is not None:
+                cache.record_encode(len(missing), seconds)
+                cache.put_many([keys[i] for i in missing], vectors)
+        meter.add("encode", len(batch.ids))
+        if not _put(out_q, batch, stop):
+            return
+
+
+async def upload_stage(
+    url: str,
+    collection: str,
+    parallel: int,
+    in_q: queue.Queue,
+    checkpoint: Checkpoint,
+    meter: StageMeter,
+    progress: tqdm,
+    stop: threading.Event,
+) -> int:
+    client = AsyncQdrantClient(url)
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(max(1, parallel))
+    tasks: set[asyncio.Task] = set()
+    failures: list[BaseException] = []
+    last: Batch | None = None
+    total = 0
+
+    async def send(batch: Batch) -> None:
+        nonlocal total
+        try:
+            await client.upsert(
+                collection_name=collection,
+                points=build_points(batch.ids, batch.vectors, batch.payloads),
+                wait=False,
+            )
+        except Exception as exc:  # noqa: BLE001
+            # hata kaydedilir; checkpoint bu batch'in ötesine ilerlemez
+            failures.append(exc)
+            stop.set()
+            return
+        finally:
+            sem.release()
+        checkpoint.ack(batch)
+        total += len(batch.ids)
+        meter.add("upload", len(batch.ids))
+        progress.update(len(batch.ids))
+
+    try:
+        while not failures:
+            batch = await loop.run_in_executor(None, _get, in_q, stop)
+            if batch is _DONE:
+                break
+            await sem.acquire()
+            if failures:
+                sem.release()
+                break
+            last = batch
+            task = asyncio.create_task(send(batch))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        if failures:
+            raise RuntimeError(
+                f"{len(failures)} upload batch'i başarısız oldu: {failures[0]}"
+            ) from failures[0]
+        if last is not None:
+            # Tutarlılık bariyeri: güncellemeler sırayla uygulanır, son batch'i wait=True ile
+            # tekrar yazmak önceki tüm wait=False upsert'lerin uygulanmasını bekletir.
+            await client.upsert(
+                collection_name=collection,
+                points=build_points(last.ids, last.vectors, last.payloads),
+                wait=True,
+            )
+    finally:
+        await client.close()
+    return total
 
 
 def main() -> None:
@@ -159,9 +619,45 @@ def main() -> None:
     if not chunks_path.exists():
         raise SystemExit(f"Chunk dosyası bulunamadı: {chunks_path}")
 
-    model = SentenceTransformer(args.model, device=args.device)
-    test_vec = model.encode(["ping"], normalize_embeddings=True)
-    dim = len(test_vec[0])
+    checkpoint = Checkpoint(
+        Path(args.checkpoint)
+        if args.checkpoint
+        else chunks_path.with_name(f"{chunks_path.name}.{args.collection}.ckpt.json")
+    )
+    if args.recreate or args.no_resume:
+        checkpoint.path.unlink(missing_ok=True)
+    state = checkpoint.load()
+    start_line = resume_line(chunks_path, state)
+    if start_line:
+        print(
+            f"Checkpoint: {state.get('count', 0)} chunk yüklü, "
+            f"{state.get('chunk_id')} (satır {start_line}) sonrasından devam"
+        )
+
+    outputs = (args.sparse, args.colbert) if (args.sparse or args.colbert) else None
+    if outputs is not None and args.backend != "bge-m3":
+        raise SystemExit("--sparse/--colbert yalnız --backend bge-m3 ile kullanılabilir")
+
+    embedder = None
+    pool = None
+    if args.encoder_procs > 0:
+        # model yalnız alt süreçlerde yüklenir; boyut ilk süreçten öğrenilir
+        threads = max(1, (os.cpu_count() or 1) // args.encoder_procs)
+        pool = ProcessPoolExecutor(
+            max_workers=args.encoder_procs,
+            initializer=_init_encoder,
+            initargs=(args.backend, args.model, args.batch_size, args.onnx_path, threads, outputs),
+        )
+        dim, colbert_dim, cache_namespace = pool.submit(_probe_dims).result()
+    else:
+        embedder = build_embedder(
+            args.backend, args.model, args.device, args.batch_size, args.onnx_path
+        )
+        dim, colbert_dim, cache_namespace = probe_dims(embedder, outputs)
+    print(
+        f"Embedding: backend={args.backend} model={args.model} dim={dim}"
+        + (f" sparse={args.sparse} colbert_dim={colbert_dim}" if outputs else "")
+    )
 
     client = QdrantClient(args.qdrant_url)
     if args.recreate or not client.collection_exists(args.collection):
@@ -171,31 +667,112 @@ def main() -> None:
             dim=dim,
             quantize=not args.no_quantization,
             on_disk=args.on_disk,
+            sparse=args.sparse,
+            colbert_dim=colbert_dim,
         )
 
-    ids: List[str] = []
-    texts: List[str] = []
-    payloads: List[Dict] = []
-    total = 0
+    cache = None
+    # önbellek yalnız dense vektör tutar; hibrit çıktılar her seferinde üretilir
+    if not args.no_embed_cache and outputs is None:
+        cache = EmbeddingCache(
+            root=args.embed_cache_dir or os.getenv("EMBED_CACHE_DIR") or None,
+            model=cache_namespace,
+            dtype=args.embed_cache_dtype or os.getenv("EMBED_CACHE_DTYPE", "float16"),
+        )
+
+    meter = StageMeter()
+    stop = threading.Event()
+    read_q: queue.Queue = queue.Queue(maxsize=max(1, args.queue_depth))
+    upload_q: queue.Queue = queue.Queue(maxsize=max(1, args.queue_depth))
+    errors: list[BaseException] = []
+
+    def run_stage(fn, out_q: queue.Queue, *stage_args) -> None:
+        try:
+            fn(*stage_args)
+        except BaseException as exc:  # noqa: BLE001
+            errors.append(exc)
+            stop.set()
+        finally:
+            _put(out_q, _DONE, stop)
+
+    reader = threading.Thread(
+        target=run_stage,
+        args=(
+            read_stage,
+            read_q,
+            chunks_path,
+            args.limit,
+            start_line,
+            args.batch_size,
+            read_q,
+            meter,
+            stop,
+        ),
+        name="reader",
+        daemon=True,
+    )
+    encoder = threading.Thread(
+        target=run_stage,
+        args=(
+            encode_stage, upload_q, embedder, pool, read_q, upload_q, meter,
+            args.encoder_procs, stop, cache, args.embed_version, outputs,
+        ),
+        name="encoder",
+        daemon=True,
+    )
+    reporter_stop = threading.Event()
 
-    for chunk_id, text, payload in tqdm(iter_chunks(chunks_path, limit=args.limit), desc="embedding"):
-        ids.append(chunk_id)
-        texts.append(text)
-        payloads.append(payload)
-        if len(ids) >= args.batch_size:
-            vectors = model.encode(texts, batch_size=args.batch_size, normalize_embeddings=True).tolist()
-            upsert_batch(client, args.collection, ids, vectors, payloads)
-            total += len(ids)
-            ids.clear()
-            texts.clear()
-            payloads.clear()
-
-    if ids:
-        vectors = model.encode(texts, batch_size=args.batch_size, normalize_embeddings=True).tolist()
-        upsert_batch(client, args.collection, ids, vectors, payloads)
-        total += len(ids)
-
-    print(f"Tamamlandı: {total} chunk yüklendi -> {args.collection} ({args.qdrant_url})")
+    def report() -> None:
+        while not reporter_stop.wait(30):
+            tqdm.write(
+                f"[stages] {meter.line()} q_read={read_q.qsize()} q_upload={upload_q.qsize()}"
+            )
+
+    reporter = threading.Thread(target=report, name="reporter", daemon=True)
+    progress = tqdm(desc="upload", unit="chunk")
+    reader.start()
+    encoder.start()
+    reporter.start()
+    try:
+        total = asyncio.run(
+            upload_stage(
+                args.qdrant_url,
+                args.collection,
+                args.upload_parallel,
+                upload_q,
+                checkpoint,
+                meter,
+                progress,
+                stop,
+            )
+        )
+    finally:
+        stop.set()
+        reporter_stop.set()
+        progress.close()
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        # aşamalar stop'u en geç bir kuyruk zaman aşımında görür
+        reader.join(timeout=5)
+        encoder.join(timeout=5)
+    if errors:
+        raise errors[0]
+
+    print(f"[stages] {meter.line()}")
+    if embedder is not None:
+        print(f"[embed] {embedder.info()} {embedder.stats()}")
+    if cache is not None:
+        stats = cache.stats()
+        print(
+            f"[embed-cache] hit={stats['hits']} miss={stats['misses']} "
+            f"hit_rate={stats['hit_rate']:.1%} "
+            f"yeni={stats['writes']} kazanılan≈{stats['seconds_saved']}s ({stats['path']})"
+        )
+        cache.close()
+    print(
+        f"Tamamlandı: {total} chunk yüklendi (toplam {checkpoint.state.get('count', total)}) "
+        f"-> {args.collection} ({args.qdrant_url})"
+    )
 
 
 if __name__ == "__main__":
@@ -5,7 +5,9 @@ import os
 import random
 import time
 import unicodedata
-from datetime import date, datetime, timedelta
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime
 from typing import Iterable, List, Optional, Tuple
 
 import httpx
@@ -14,6 +16,10 @@ from selectolax.parser import HTMLParser, Node
 
 from src.core.chunking import chunk_decision
 from src.core.decision_chunker import chunk_sections, normalize_text, split_sections
+from src.core.doc_cache import DocumentCache
+from src.core.http import HostRateLimiter
+from src.core.listing_plan import WindowPlanner
+from src.core.proxy_pool import ProxyPool
 from src.core.legal import infer_topic_tags, normalize_case_number, normalize_chamber
 from src.core.schema import CanonDoc, ItemRef, RawDoc, build_decision_doc_id
 from src.core.versioning import doc_checksum
@@ -42,6 +48,7 @@ class Yargitay2Connector(BaseConnector):
 
     logger = structlog.get_logger(__name__)
     MAX_ROWS_PER_WINDOW = 25000
+    PAGE_RETRIES = 2
 
     def __init__(
         self,
@@ -52,6 +59,12 @@ class Yargitay2Connector(BaseConnector):
         timeout: float = 30.0,
         window_days: int = 7,
         use_browser_fallback: bool = False,
+        doc_cache: DocumentCache | None = None,
+        revalidate_doc_cache: bool = False,
+        rate_limiter: HostRateLimiter | None = None,
+        http_pool_size: int = 8,
+        window_planner: WindowPlanner | None = None,
+        list_page_workers: int = 4,
     ) -> None:
         self.page_size = page_size
         self.item_type_list = item_type_list or ["YARGITAYKARARI"]
@@ -73,9 +86,22 @@ class Yargitay2Connector(BaseConnector):
             "Cache-Control": "no-cache",
         }
         self.timeout = timeout
-        self.proxy_pool = _load_proxies_from_env()
-        self._proxy_cycle = itertools.cycle(self.proxy_pool) if self.proxy_pool else None
-        self.client = self._make_client()
+        # Worker havuzu tüm istemcilerde aynı host kovasını paylaşır
+        self.rate_limiter = rate_limiter
+        self.http_pool_size = max(1, http_pool_size)
+        self.list_page_workers = max(1, list_page_workers)
+        # Pencere boyu geçmiş recordsTotal yoğunluğundan seçilir; window_days yalnız başlangıç tahmini
+        self.window_planner = window_planner or WindowPlanner(
+            target_rows=int(os.getenv("YARGITAY_WINDOW_TARGET_ROWS", str(self.MAX_ROWS_PER_WINDOW // 5))),
+            default_days=window_days,
+        )
+        # Proxy başına tek havuzlu istemci; sağlık skoruna göre ağırlıklı seçim
+        self.proxies = ProxyPool(_load_proxies_from_env() or [None], self._make_client)
+        if doc_cache is None and os.getenv("DOC_CACHE_ENABLED", "true").lower() in {"1", "true", "yes", "on"}:
+            doc_cache = DocumentCache.from_env()
+        self.doc_cache = doc_cache
+        # True: belge her zaman ağdan alınır, önbellek yalnız yazılır (--incremental)
+        self.revalidate_doc_cache = revalidate_doc_cache
         self.session: PlaywrightSession | None = None
         if self.use_browser_fallback:
             self.session = PlaywrightSession(headless=self.headless, executable_path=None)
@@ -84,13 +110,18 @@ class Yargitay2Connector(BaseConnector):
         end = until or date.today()
         cursor = since
         seen_keys: set[str] = set()
+        self.window_planner.load(since, end)
 
         while cursor <= end:
             win_start = cursor
-            win_end = min(end, cursor + timedelta(days=self.window_days) - timedelta(days=1))
+            win_end = self.plan_window(cursor, end)
             yield from self._list_window(win_start, win_end, seen_keys)
             cursor = win_end + timedelta(days=1)
 
+    def plan_window(self, cursor: date, end: date) -> date:
+        """Last day of the next listing window, sized from the observed decision density."""
+        return self.window_planner.plan(cursor, end)
+
     def fetch(self, ref: ItemRef) -> RawDoc:
         doc_id = ref.metadata.get("doc_id")
         url = self.VIEW_URL.format(id=doc_id) if doc_id else ref.url
@@ -98,15 +129,20 @@ class Yargitay2Connector(BaseConnector):
         if doc_id:
             html = self._fetch_via_api(doc_id)
         if not html.strip():
-            resp = self._get_with_retry(url)
+            resp = self._get_with_retry(url, headers=_conditional_headers(ref))
+            if resp.status_code == 304:
+                return RawDoc(ref=ref, not_modified=True, etag=ref.etag)
             html = resp.text
+            etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+        else:
+            etag = last_modified = None
         html = _maybe_decode_base64_html(html)
         if self.use_browser_fallback and _looks_empty(html):
             try:
                 html = self._fetch_via_browser(url)
             except Exception as exc:  # noqa: BLE001
                 self.logger.warning("yargitay_browser_fallback_failed", url=url, error=str(exc))
-        return RawDoc(ref=ref, content_html=html)
+        return RawDoc(ref=ref, content_html=html, etag=etag, last_modified=last_modified)
 
     def parse(self, raw: RawDoc) -> CanonDoc:
         tree = HTMLParser(raw.content_html or "")
@@ -195,17 +231,26 @@ class Yargitay2Connector(BaseConnector):
 
     def close(self) -> None:
         try:
-            self.client.close()
+            self.proxies.close()
         except Exception:
             pass
 
     def _make_client(self, proxy: str | None = None) -> httpx.Client:
+        hooks = (
+            {"request": [self.rate_limiter.httpx_hook], "response": [self.rate_limiter.httpx_response_hook]}
+            if self.rate_limiter
+            else None
+        )
         return httpx.Client(
             http2=False,
-            limits=httpx.Limits(max_connections=8, max_keepalive_connections=4),
+            limits=httpx.Limits(
+                max_connections=self.http_pool_size,
+                max_keepalive_connections=max(1, self.http_pool_size // 2),
+            ),
             timeout=self.timeout,
             headers=self.base_headers,
             proxies=proxy or None,
+            event_hooks=hooks,
         )
 
     def _build_payload(self, start: date, end: date, page: int) -> dict:
@@ -240,12 +285,10 @@ class Yargitay2Connector(BaseConnector):
             yield item
 
     def _list_window(self, win_start: date, win_end: date, seen_keys: set[str]) -> Iterable[ItemRef]:
-        proxy = next(self._proxy_cycle) if self._proxy_cycle else None
-        client = self._make_client(proxy)
         window_seen: set[str] = set()
         try:
             payload = self._build_payload(win_start, win_end, page=1)
-            resp = self._post_with_retry(payload, client)
+            resp = self._post_with_retry(payload)
             blob = resp.json()
         except Exception as exc:  # noqa: BLE001
             self.logger.warning(
@@ -254,7 +297,6 @@ class Yargitay2Connector(BaseConnector):
                 window_end=win_end.isoformat(),
                 error=str(exc),
             )
-            client.close()
             return []
 
         rows, total = _extract_rows_and_total(blob)
@@ -262,7 +304,7 @@ class Yargitay2Connector(BaseConnector):
         if total and not rows:
             alt_payload = self._build_payload(win_start, win_end, page=0)
             try:
-                alt_resp = self._post_with_retry(alt_payload, client)
+                alt_resp = self._post_with_retry(alt_payload)
                 alt_blob = alt_resp.json()
                 alt_rows, alt_total = _extract_rows_and_total(alt_blob)
                 if alt_rows:
@@ -271,13 +313,20 @@ class Yargitay2Connector(BaseConnector):
             except Exception:
                 pass
 
+        if total is not None:
+            self.window_planner.observe(win_start, win_end, total)
+
         if total and total > self.MAX_ROWS_PER_WINDOW and (win_end - win_start).days > 1:
-            mid = win_start + (win_end - win_start) // 2
-            if mid > win_start:
-                yield from self._list_window(win_start, mid, seen_keys)
-                yield from self._list_window(mid + timedelta(days=1), win_end, seen_keys)
-                client.close()
-                return
+            # Sonuçlar kararTarihi ASC: son satırın gününden önceki günler sayfa 1'de eksiksiz.
+            # Onları yeniden istemeden yay, kalan aralığı yoğunluğa göre alt pencerelere böl.
+            resume_from = win_start
+            last_day = _row_date(rows[-1]) if rows else None
+            if last_day and win_start < last_day <= win_end:
+                complete = [row for row in rows if (_row_date(row) or last_day) < last_day]
+                yield from self._emit_items(complete, seen_keys, window_seen)
+                resume_from = last_day
+            yield from self._list_split(win_start, win_end, resume_from, seen_keys)
+            return
 
         # Total var ama hiç satır yoksa logla ve gerekirse böl/bitir
         if total and not rows:
@@ -288,103 +337,147 @@ class Yargitay2Connector(BaseConnector):
                     window_end=win_end.isoformat(),
                     expected=total,
                 )
-                client.close()
                 return
             mid = win_start + (win_end - win_start) // 2
             yield from self._list_window(win_start, mid, seen_keys)
             yield from self._list_window(mid + timedelta(days=1), win_end, seen_keys)
-            client.close()
             return
 
-        fetched = 0
-        for item in self._emit_items(rows, seen_keys, window_seen):
-            fetched += 1
-            yield item
+        yield from self._emit_items(rows, seen_keys, window_seen)
+        if total is None:
+            yield from self._walk_pages(win_start, win_end, rows, seen_keys, window_seen)
+            return
 
-        page = 1
-        while rows and (total is None or fetched < total):
-            page += 1
-            payload = self._build_payload(win_start, win_end, page=page)
-            try:
-                resp = self._post_with_retry(payload, client)
-                blob = resp.json()
-            except Exception as exc:  # noqa: BLE001
-                self.logger.warning(
-                    "yargitay_list_page_error",
-                    page=page,
-                    window_start=win_start.isoformat(),
-                    window_end=win_end.isoformat(),
-                    error=str(exc),
-                )
-                break
-            rows, total_next = _extract_rows_and_total(blob)
-            if total is None and total_next is not None:
-                total = total_next
-            if not rows:
-                break
-            for row_item in self._emit_items(rows, seen_keys, window_seen):
-                fetched += 1
-                yield row_item
-            if total is None and len(rows) < self.page_size:
-                break
+        # total biliniyor: 2..N sayfaları paralel çek, ASC sırayla yay
+        last_page = -(-total // self.page_size)
+        short_pages = [] if len(rows) >= self._expected_rows(1, total) else [1]
+        for page, page_rows in self._fetch_pages(win_start, win_end, range(2, last_page + 1)):
+            if page_rows is None or len(page_rows) < self._expected_rows(page, total):
+                short_pages.append(page)
+            yield from self._emit_items(page_rows or [], seen_keys, window_seen)
+
+        if len(window_seen) < total and short_pages:
+            # Yalnız eksik gelen sayfaları yeniden iste
+            self.logger.info(
+                "yargitay_refetch_pages",
+                window_start=win_start.isoformat(),
+                window_end=win_end.isoformat(),
+                pages=short_pages,
+            )
+            for _, page_rows in self._fetch_pages(win_start, win_end, short_pages):
+                yield from self._emit_items(page_rows or [], seen_keys, window_seen)
 
         observed = len(window_seen)
-        if total and observed < total:
+        if observed < total:
             self.logger.warning(
                 "yargitay_missing_rows",
                 window_start=win_start.isoformat(),
                 window_end=win_end.isoformat(),
                 expected=total,
                 fetched=observed,
+                short_pages=short_pages,
             )
-            if (win_end - win_start).days >= 1:
+            # Tüm sayfalar dolu ama satır eksik: sıralama kaymış, eksik aralık bilinmiyor -> böl
+            if not short_pages and (win_end - win_start).days >= 1:
                 mid = win_start + (win_end - win_start) // 2
                 yield from self._list_window(win_start, mid, seen_keys)
                 yield from self._list_window(mid + timedelta(days=1), win_end, seen_keys)
 
-        client.close()
+    def _walk_pages(
+        self,
+        win_start: date,
+        win_end: date,
+        rows: list[dict],
+        seen_keys: set[str],
+        window_seen: set[str],
+    ) -> Iterable[ItemRef]:
+        """recordsTotal gelmediğinde sayfa sayısı bilinmez: kısa sayfaya kadar sırayla ilerle."""
+        page = 1
+        while len(rows) >= self.page_size:
+            page += 1
+            rows = next(iter(self._fetch_pages(win_start, win_end, [page])))[1] or []
+            yield from self._emit_items(rows, seen_keys, window_seen)
+
+    def _fetch_pages(self, win_start: date, win_end: date, pages: Iterable[int]) -> Iterable[tuple[int, list[dict] | None]]:
+        """
+        Fetch ``pages`` of one window with up to ``list_page_workers`` requests in
+        flight, yielding ``(page, rows)`` in ascending page order. Every request
+        picks a proxy from the health-weighted pool and passes the host rate
+        limiter hook. A failing page is resubmitted (and so usually lands on
+        another proxy) up to ``PAGE_RETRIES`` times; after that it is yielded
+        with ``rows=None``.
+        """
+        pages = list(pages)
+        if not pages:
+            return
+        attempts: dict[int, int] = {}
+
+        def fetch(page: int) -> list[dict]:
+            resp = self._post_with_retry(self._build_payload(win_start, win_end, page))
+            return _extract_rows_and_total(resp.json())[0]
+
+        workers = max(1, min(self.list_page_workers, len(pages)))
+        pending = iter(pages)
+        results: dict[int, list[dict] | None] = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="yargitay-list") as pool:
+            futures: dict[Future, int] = {}
+            for page in itertools.islice(pending, workers * 2):
+                futures[pool.submit(fetch, page)] = page
+            for page in pages:
+                while page not in results:
+                    done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        done_page = futures.pop(fut)
+                        try:
+                            results[done_page] = fut.result()
+                        except Exception as exc:  # noqa: BLE001
+                            attempts[done_page] = attempts.get(done_page, 0) + 1
+                            if attempts[done_page] <= self.PAGE_RETRIES:
+                                futures[pool.submit(fetch, done_page)] = done_page
+                                continue
+                            self.logger.warning(
+                                "yargitay_list_page_error",
+                                page=done_page,
+                                window_start=win_start.isoformat(),
+                                window_end=win_end.isoformat(),
+                                error=str(exc),
+                            )
+                            results[done_page] = None
+                        next_page = next(pending, None)
+                        if next_page is not None:
+                            futures[pool.submit(fetch, next_page)] = next_page
+                yield page, results.pop(page)
+
+    def _expected_rows(self, page: int, total: int) -> int:
+        return max(0, min(self.page_size, total - (page - 1) * self.page_size))
+
+    def _list_split(self, win_start: date, win_end: date, resume_from: date, seen_keys: set[str]) -> Iterable[ItemRef]:
+        cursor = resume_from
+        while cursor <= win_end:
+            sub_end = self.plan_window(cursor, win_end)
+            if cursor == win_start and sub_end >= win_end:
+                # Planlayıcı küçültemedi (ör. tek günde yoğunlaşma): ikiye böl
+                sub_end = win_start + (win_end - win_start) // 2
+            yield from self._list_window(cursor, sub_end, seen_keys)
+            cursor = sub_end + timedelta(days=1)
 
     def _post_with_retry(self, payload: dict, client: httpx.Client | None = None, attempts: int = 3) -> httpx.Response:
-        for attempt in range(attempts):
-            try:
-                cli = client or self.client
-                resp = cli.post(self.SEARCH_URL, json=payload)
-                if resp.status_code == 429:
-                    ra = resp.headers.get("Retry-After")
-                    if ra:
-                        try:
-                            time.sleep(float(ra))
-                        except Exception:
-                            pass
-                    raise httpx.HTTPStatusError(
-                        f"status {resp.status_code}", request=resp.request, response=resp
-                    )
-                if resp.status_code >= 500:
-                    raise httpx.HTTPStatusError(
-                        f"status {resp.status_code}", request=resp.request, response=resp
-                    )
-                return resp
-            except Exception:
-                if attempt == attempts - 1:
-                    raise
-                delay = (1.5 ** attempt) + random.uniform(0.2, 0.6)
-                time.sleep(delay)
+        return self._request_with_retry("POST", self.SEARCH_URL, client=client, attempts=attempts, json=payload)
 
-    def _get_with_retry(self, url: str, attempts: int = 3) -> httpx.Response:
+    def _get_with_retry(self, url: str, attempts: int = 3, headers: dict | None = None) -> httpx.Response:
+        return self._request_with_retry("GET", url, attempts=attempts, headers=headers)
+
+    def _request_with_retry(
+        self, method: str, url: str, client: httpx.Client | None = None, attempts: int = 3, **kwargs
+    ) -> httpx.Response:
         for attempt in range(attempts):
             try:
-                resp = self.client.get(url)
-                if resp.status_code == 429:
-                    ra = resp.headers.get("Retry-After")
-                    if ra:
-                        try:
-                            time.sleep(float(ra))
-                        except Exception:
-                            pass
-                    raise httpx.HTTPStatusError(
-                        f"status {resp.status_code}", request=resp.request, response=resp
-                    )
-                if resp.status_code >= 500:
+                if client is not None:
+                    resp = client.request(method, url, **kwargs)
+                else:
+                    # 429/Retry-After ve ardışık hatalar proxy'yi soğumaya alır; tekrar deneme başka çıkıştan gider
+                    resp = self.proxies.request(method, url, **kwargs)
+                if resp.status_code == 429 or resp.status_code >= 500:
                     raise httpx.HTTPStatusError(
                         f"status {resp.status_code}", request=resp.request, response=resp
                     )
@@ -396,9 +489,17 @@ class Yargitay2Connector(BaseConnector):
                 time.sleep(delay)
 
     def _fetch_via_api(self, doc_id: str) -> str:
+        if self.doc_cache is not None and not self.revalidate_doc_cache:
+            try:
+                cached = self.doc_cache.get(doc_id)
+            except Exception as exc:  # noqa: BLE001
+                self.logger.warning("doc_cache_read_failed", error=str(exc), doc_id=doc_id)
+                cached = None
+            if cached is not None:
+                return cached.html
         payload = {"data": {"documentId": str(doc_id)}, "applicationName": "UyapMevzuat"}
         try:
-            resp = self.client.post(self.DOC_URL, json=payload)
+            resp = self.proxies.request("POST", self.DOC_URL, json=payload)
             if not resp.is_success:
                 self.logger.warning("api_error", status=resp.status_code, doc_id=doc_id)
                 return ""
@@ -408,6 +509,11 @@ class Yargitay2Connector(BaseConnector):
             except Exception:
                 html = resp.text
             if html and len(html.strip()) > 50:
+                if self.doc_cache is not None:
+                    try:
+                        self.doc_cache.put(doc_id, html)
+                    except Exception as exc:  # noqa: BLE001
+                        self.logger.warning("doc_cache_write_failed", error=str(exc), doc_id=doc_id)
                 return html
         except Exception as exc:  # noqa: BLE001
             self.logger.warning("api_fetch_exception", error=str(exc), doc_id=doc_id)
@@ -438,7 +544,7 @@ class Yargitay2Connector(BaseConnector):
 
     def close(self) -> None:
         try:
-            self.client.close()
+            self.proxies.close()
         except Exception:
             pass
         try:
@@ -504,6 +610,10 @@ def _item_from_row(row: dict, source: str, view_url: str) -> ItemRef | None:
     return ItemRef(key=key, url=url, metadata=metadata)
 
 
+def _row_date(row: dict) -> date | None:
+    return _parse_decision_date(_pick(row, ["kararTarihiStr", "kararTarihi", "tarih", "decisionDate"]))[0]
+
+
 def _extract_rows_and_total(blob: dict) -> tuple[list[dict], Optional[int]]:
     rows: list[dict] = []
     total = None
@@ -588,6 +698,16 @@ def _extract_body_text(tree: HTMLParser) -> str:
         return ""
 
 
+def _conditional_headers(ref: ItemRef) -> dict[str, str] | None:
+    headers: dict[str, str] = {}
+    if ref.etag:
+        headers["If-None-Match"] = ref.etag
+    if ref.last_modified:
+        modified = ref.last_modified if ref.last_modified.tzinfo else ref.last_modified.replace(tzinfo=timezone.utc)
+        headers["If-Modified-Since"] = format_datetime(modified.astimezone(timezone.utc), usegmt=True)
+    return headers or None
+
+
 def _load_proxies_from_env() -> list[str]:
     raw = os.environ.get("YARGITAY_PROXIES", "")
     if not raw.strip():
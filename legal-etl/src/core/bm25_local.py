@@ -0,0 +1,596 @@
+from __future__ import annotations
+
+import atexit
+import heapq
+import json
+import math
+import mmap
+import os
+import shutil
+import threading
+import zlib
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from .tokenize import tokenize
+
+try:  # süreçler arası yazıcı kilidi; yoksa yalnız süreç içi kilit
+    import fcntl  # type: ignore
+except Exception:  # noqa: BLE001
+    fcntl = None
+
+K1 = 1.2
+B = 0.75
+MANIFEST = "manifest.json"
+WRITE_LOCK = "write.lock"
+
+
+def _write_varint(value: int, out: bytearray) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_postings(buf, offset: int, nbytes: int) -> Iterator[tuple[int, int]]:
+    """Decode ``(doc_delta, tf)`` varint pairs into absolute ``(local_id, tf)``."""
+    pos, end, doc, first = offset, offset + nbytes, 0, True
+    while pos < end:
+        vals = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = buf[pos]
+                pos += 1
+                result |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            vals.append(result)
+        doc = vals[0] if first else doc + vals[0]
+        first = False
+        yield doc, vals[1]
+
+
+def _encode_postings(postings: Iterable[tuple[int, int]]) -> bytes:
+    out = bytearray()
+    prev = 0
+    for doc, tf in postings:
+        _write_varint(doc - prev, out)
+        _write_varint(tf, out)
+        prev = doc
+    return bytes(out)
+
+
+def _map(path: Path):
+    if not path.exists() or path.stat().st_size == 0:
+        return b""
+    with path.open("rb") as fh:
+        return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class _Segment:
+    """Immutable on-disk segment: term dictionary + delta-encoded, mmap'd postings."""
+
+    def __init__(self, directory: Path) -> None:
+        self.dir = directory
+        self.name = directory.name
+        meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+        self.doc_count: int = meta["doc_count"]
+        self.total_len: int = meta["total_len"]
+        self.terms: dict[str, list[int]] = json.loads((directory / "terms.json").read_text(encoding="utf-8"))
+        self.ids: list[str] = json.loads((directory / "ids.json").read_text(encoding="utf-8"))
+        self.local_of = {ext: i for i, ext in enumerate(self.ids)}
+        self.doc_lens = array("I")
+        self.doc_lens.frombytes((directory / "doclen.bin").read_bytes())
+        self.stored_offsets = array("Q")
+        self.stored_offsets.frombytes((directory / "stored.idx").read_bytes())
+        self.deleted: set[int] = set()
+        self.reload_deleted()
+        self._postings = _map(directory / "postings.bin")
+        self._stored = _map(directory / "stored.bin")
+
+    @staticmethod
+    def write(directory: Path, docs: list[tuple[str, list[str], dict[str, Any]]]) -> "_Segment":
+        """Write a new segment from ``(external_id, tokens, source)`` triples."""
+        tmp = directory.with_name(directory.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        inverted: dict[str, list[tuple[int, int]]] = {}
+        doc_lens = array("I")
+        offsets = array("Q", [0])
+        with (tmp / "stored.bin").open("wb") as stored:
+            for local_id, (_ext, tokens, source) in enumerate(docs):
+                tf: dict[str, int] = {}
+                for tok in tokens:
+                    tf[tok] = tf.get(tok, 0) + 1
+                for tok, cnt in tf.items():
+                    inverted.setdefault(tok, []).append((local_id, cnt))
+                doc_lens.append(len(tokens))
+                blob = zlib.compress(json.dumps(source, ensure_ascii=False, default=str).encode("utf-8"))
+                stored.write(blob)
+                offsets.append(offsets[-1] + len(blob))
+        _Segment._write_tables(tmp, inverted, [d[0] for d in docs], doc_lens, offsets)
+        tmp.rename(directory)
+        return _Segment(directory)
+
+    @staticmethod
+    def _write_tables(tmp: Path, inverted, ids, doc_lens: array, offsets: array) -> None:
+        terms: dict[str, list[int]] = {}
+        with (tmp / "postings.bin").open("wb") as fh:
+            pos = 0
+            for term in sorted(inverted):
+                data = _encode_postings(inverted[term])
+                fh.write(data)
+                terms[term] = [len(inverted[term]), pos, len(data)]
+                pos += len(data)
+        (tmp / "terms.json").write_text(json.dumps(terms, ensure_ascii=False), encoding="utf-8")
+        (tmp / "ids.json").write_text(json.dumps(ids, ensure_ascii=False), encoding="utf-8")
+        (tmp / "doclen.bin").write_bytes(doc_lens.tobytes())
+        (tmp / "stored.idx").write_bytes(offsets.tobytes())
+        meta = {"doc_count": len(ids), "total_len": int(sum(doc_lens))}
+        (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    @property
+    def live_count(self) -> int:
+        return self.doc_count - len(self.deleted)
+
+    @property
+    def live_len(self) -> int:
+        return self.total_len - sum(self.doc_lens[i] for i in self.deleted)
+
+    def postings(self, term: str) -> Iterator[tuple[int, int]]:
+        entry = self.terms.get(term)
+        if not entry:
+            return iter(())
+        return _read_postings(self._postings, entry[1], entry[2])
+
+    def df(self, term: str) -> int:
+        entry = self.terms.get(term)
+        return entry[0] if entry else 0
+
+    def source(self, local_id: int) -> dict[str, Any]:
+        start, end = self.stored_offsets[local_id], self.stored_offsets[local_id + 1]
+        return json.loads(zlib.decompress(self._stored[start:end]).decode("utf-8"))
+
+    def stored_blob(self, local_id: int) -> bytes:
+        start, end = self.stored_offsets[local_id], self.stored_offsets[local_id + 1]
+        return bytes(self._stored[start:end])
+
+    def reload_deleted(self) -> None:
+        """Pick up tombstones written by other handles."""
+        path = self.dir / "deleted.json"
+        if path.exists():
+            self.deleted = set(json.loads(path.read_text(encoding="utf-8")))
+
+    def mark_deleted(self, local_ids: Iterable[int]) -> None:
+        self.deleted.update(local_ids)
+        tmp = self.dir / "deleted.json.tmp"
+        tmp.write_text(json.dumps(sorted(self.deleted)), encoding="utf-8")
+        os.replace(tmp, self.dir / "deleted.json")
+
+
+class LocalBM25Index:
+    """
+    Embedded BM25 index with an append-only segment layout.
+
+    ``index``/``delete`` calls are buffered and written as a new immutable
+    segment on ``refresh`` (or every ``flush_docs`` documents). Replaced and
+    deleted documents are tombstoned in older segments. When the segment count
+    exceeds ``merge_factor`` the smallest segments are merged in a background
+    thread, remapping postings and dropping tombstoned documents.
+
+    Several handles (threads or processes) may share a directory: every write
+    (refresh, merge, manifest) holds an exclusive ``flock`` on ``write.lock``
+    and starts by re-reading the manifest, and readers reload the manifest
+    whenever it has been replaced, so each handle sees the others' segments
+    and tombstones.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        text_field: str = "content",
+        flush_docs: int = 5000,
+        merge_factor: int = 8,
+        background_merge: bool = True,
+    ) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.text_field = text_field
+        self.flush_docs = max(1, flush_docs)
+        self.merge_factor = max(2, merge_factor)
+        self.background_merge = background_merge
+        self._lock = threading.RLock()
+        self._write_mutex = threading.Lock()
+        self._merge_thread: threading.Thread | None = None
+        self._buffer: dict[str, dict[str, Any] | None] = {}
+        self._next_seg = 1
+        self._segments: list[_Segment] = []
+        self._stamp: tuple[int, int] | None = None
+        with self._lock:
+            self._sync()
+        self._cleanup_orphans()
+
+    # -------------------------------------------------------------- manifest
+    def _read_manifest(self) -> dict[str, Any]:
+        mpath = self.path / MANIFEST
+        if mpath.exists():
+            return json.loads(mpath.read_text(encoding="utf-8"))
+        return {"segments": [], "next": 1}
+
+    def _manifest_stamp(self) -> tuple[int, int] | None:
+        try:
+            st = (self.path / MANIFEST).stat()
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _sync(self) -> None:
+        """Reload the manifest if another handle replaced it (caller holds ``_lock``)."""
+        for _attempt in range(5):
+            stamp = self._manifest_stamp()
+            if stamp == self._stamp:
+                return
+            manifest = self._read_manifest()
+            current = {s.name: s for s in self._segments}
+            try:
+                segments = []
+                for name in manifest["segments"]:
+                    seg = current.get(name)
+                    if seg is None:
+                        seg = _Segment(self.path / name)
+                    else:
+                        seg.reload_deleted()
+                    segments.append(seg)
+            except FileNotFoundError:
+                # manifest okunduktan sonra başka bir birleştirme segmenti sildi; tekrar oku
+                continue
+            self._segments = segments
+            self._next_seg = max(self._next_seg, manifest["next"])
+            self._stamp = stamp
+            return
+        raise RuntimeError(f"BM25 manifest under {self.path} keeps changing; giving up reload")
+
+    def _write_manifest(self) -> None:
+        data = {"segments": [s.name for s in self._segments], "next": self._next_seg}
+        tmp = self.path / (MANIFEST + ".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, self.path / MANIFEST)
+        self._stamp = self._manifest_stamp()
+
+    @contextmanager
+    def _writer(self, blocking: bool = True) -> Iterator[bool]:
+        """Exclusive writer lock across threads and processes; yields False if ``blocking=False`` and busy."""
+        if not self._write_mutex.acquire(blocking):
+            yield False
+            return
+        try:
+            with (self.path / WRITE_LOCK).open("a") as fh:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                    except BlockingIOError:
+                        yield False
+                        return
+                yield True
+        finally:
+            self._write_mutex.release()
+
+    def _cleanup_orphans(self) -> None:
+        # başka bir yazıcı çalışıyorsa yarım segmentleri onundur; dokunma
+        with self._writer(blocking=False) as acquired:
+            if not acquired:
+                return
+            with self._lock:
+                self._sync()
+                live = {s.name for s in self._segments}
+            for child in self.path.iterdir():
+                if child.is_dir() and child.name not in live:
+                    shutil.rmtree(child, ignore_errors=True)
+
+    def _new_segment_dir(self) -> Path:
+        name = f"seg_{self._next_seg:06d}"
+        self._next_seg += 1
+        return self.path / name
+
+    # ----------------------------------------------------------------- write
+    def index(self, doc_id: str, source: dict[str, Any]) -> None:
+        with self._lock:
+            self._buffer[str(doc_id)] = source
+            full = len(self._buffer) >= self.flush_docs
+        if full:
+            self.refresh()
+
+    def delete(self, doc_id: str) -> None:
+        with self._lock:
+            self._buffer[str(doc_id)] = None
+
+    def refresh(self) -> None:
+        """Flush buffered writes into a new segment and make them searchable."""
+        with self._lock:
+            if not self._buffer:
+                return
+        # kilit sırası: önce yazıcı kilidi, sonra _lock
+        with self._writer(), self._lock:
+            if not self._buffer:
+                return
+            pending, self._buffer = self._buffer, {}
+            self._sync()
+            for seg in self._segments:
+                hits = [seg.local_of[ext] for ext in pending if ext in seg.local_of]
+                hits = [i for i in hits if i not in seg.deleted]
+                if hits:
+                    seg.mark_deleted(hits)
+            docs = [
+                (ext, tokenize(str(src.get(self.text_field) or ""), drop_stopwords=True), src)
+                for ext, src in pending.items()
+                if src is not None
+            ]
+            if docs:
+                self._segments.append(_Segment.write(self._new_segment_dir(), docs))
+            self._write_manifest()
+        self.maybe_merge()
+
+    # ----------------------------------------------------------------- merge
+    def maybe_merge(self) -> None:
+        with self._lock:
+            if len(self._segments) <= self.merge_factor:
+                return
+            if self._merge_thread is not None and self._merge_thread.is_alive():
+                return
+            if self.background_merge:
+                self._merge_thread = threading.Thread(
+                    target=self.merge, args=(self.merge_factor,), name="bm25-merge", daemon=True
+                )
+                self._merge_thread.start()
+                return
+        # yazıcı kilidi _lock tutulmadan alınmalı
+        self.merge(self.merge_factor)
+
+    def merge(self, count: int | None = None) -> None:
+        """
+        Merge the ``count`` smallest segments (all when None) into one. The
+        writer lock is held throughout, so refreshes wait but searches don't.
+        """
+        with self._writer():
+            self._merge_locked(count)
+
+    def _merge_locked(self, count: int | None) -> None:
+        with self._lock:
+            self._sync()
+            candidates = sorted(self._segments, key=lambda s: s.live_count)
+            victims = candidates[: count or len(candidates)]
+            if len(victims) < 2:
+                return
+            snapshot = {s.name: set(s.deleted) for s in victims}
+            target = self._new_segment_dir()
+            # numarayı hemen yayınla ki başka tutamaç aynı adı almasın
+            self._write_manifest()
+
+        remaps: dict[str, dict[int, int]] = {}
+        ids: list[str] = []
+        doc_lens = array("I")
+        offsets = array("Q", [0])
+        tmp = target.with_name(target.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        with (tmp / "stored.bin").open("wb") as stored:
+            for seg in victims:
+                remap: dict[int, int] = {}
+                for local_id, ext in enumerate(seg.ids):
+                    if local_id in snapshot[seg.name]:
+                        continue
+                    remap[local_id] = len(ids)
+                    ids.append(ext)
+                    doc_lens.append(seg.doc_lens[local_id])
+                    blob = seg.stored_blob(local_id)
+                    stored.write(blob)
+                    offsets.append(offsets[-1] + len(blob))
+                remaps[seg.name] = remap
+        inverted: dict[str, list[tuple[int, int]]] = {}
+        for seg in victims:
+            remap = remaps[seg.name]
+            for term in seg.terms:
+                plist = [(remap[d], tf) for d, tf in seg.postings(term) if d in remap]
+                if plist:
+                    inverted.setdefault(term, []).extend(plist)
+        _Segment._write_tables(tmp, inverted, ids, doc_lens, offsets)
+        tmp.rename(target)
+        merged = _Segment(target)
+
+        with self._lock:
+            self._sync()
+            # Birleştirme sırasında düşen tombstone'ları yeni segmente taşı
+            late = [
+                remaps[seg.name][d]
+                for seg in victims
+                for d in seg.deleted - snapshot[seg.name]
+                if d in remaps[seg.name]
+            ]
+            if late:
+                merged.mark_deleted(late)
+            names = {s.name for s in victims}
+            self._segments = [s for s in self._segments if s.name not in names] + [merged]
+            self._write_manifest()
+        for seg in victims:
+            shutil.rmtree(seg.dir, ignore_errors=True)
+
+    def wait_for_merges(self, timeout: float | None = None) -> None:
+        thread = self._merge_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    # ---------------------------------------------------------------- search
+    def search(self, query: str, size: int = 10, operator: str = "or") -> tuple[list[tuple[str, float, dict[str, Any]]], int]:
+        """Return ``([(doc_id, score, source)], total_hits)`` ranked by BM25."""
+        terms = list(dict.fromkeys(tokenize(query, drop_stopwords=True)))
+        with self._lock:
+            self._sync()
+            segments = list(self._segments)
+            deleted = {s.name: set(s.deleted) for s in segments}
+        if not terms or not segments:
+            return [], 0
+        n_docs = sum(s.live_count for s in segments)
+        if n_docs <= 0:
+            return [], 0
+        avgdl = max(1.0, sum(s.live_len for s in segments) / n_docs)
+        idf = {}
+        for term in terms:
+            df = sum(s.df(term) for s in segments)
+            idf[term] = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+
+        require_all = operator.lower() == "and"
+        heap: list[tuple[float, int, str, int]] = []
+        total = 0
+        for seg_idx, seg in enumerate(segments):
+            dead = deleted[seg.name]
+            scores: dict[int, float] = {}
+            matched: dict[int, int] = {}
+            for term in terms:
+                w = idf[term]
+                for local_id, tf in seg.postings(term):
+                    if local_id in dead:
+                        continue
+                    dl = seg.doc_lens[local_id]
+                    scores[local_id] = scores.get(local_id, 0.0) + w * tf * (K1 + 1) / (
+                        tf + K1 * (1 - B + B * dl / avgdl)
+                    )
+                    matched[local_id] = matched.get(local_id, 0) + 1
+            for local_id, score in scores.items():
+                if require_all and matched[local_id] < len(terms):
+                    continue
+                total += 1
+                item = (score, -seg_idx, seg.ids[local_id], local_id)
+                if len(heap) < size:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+        ranked = sorted(heap, reverse=True)
+        return [(ext, score, segments[-neg].source(local)) for score, neg, ext, local in ranked], total
+
+    def ensure_created(self) -> None:
+        """Write an (empty) manifest so the index exists on disk."""
+        with self._writer(), self._lock:
+            self._sync()
+            self._write_manifest()
+
+    def count(self) -> int:
+        with self._lock:
+            self._sync()
+            return sum(s.live_count for s in self._segments)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            self._sync()
+            return {
+                "segments": len(self._segments),
+                "docs": sum(s.live_count for s in self._segments),
+                "deleted": sum(len(s.deleted) for s in self._segments),
+                "buffered": len(self._buffer),
+            }
+
+    def close(self) -> None:
+        self.refresh()
+        self.wait_for_merges()
+
+
+class _LocalIndices:
+    def __init__(self, client: "LocalBM25Client") -> None:
+        self._client = client
+
+    def exists(self, index: str) -> bool:
+        return (self._client.root / index / MANIFEST).exists() or index in self._client._open
+
+    def create(self, index: str, body: dict[str, Any] | None = None, **_: Any) -> dict[str, Any]:
+        self._client.get_index(index).ensure_created()
+        return {"acknowledged": True, "index": index}
+
+    def refresh(self, index: str, **_: Any) -> None:
+        self._client.get_index(index).refresh()
+
+
+class LocalBM25Client:
+    """
+    The subset of the ``opensearchpy.OpenSearch`` client used by this repo,
+    backed by :class:`LocalBM25Index` directories under ``root``.
+
+    Selected with ``BM25_URL=local://path`` (``local:///abs/path`` for absolute).
+    """
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._open: dict[str, LocalBM25Index] = {}
+        self._lock = threading.Lock()
+        self.indices = _LocalIndices(self)
+        atexit.register(self.close)
+
+    @classmethod
+    def from_url(cls, url: str) -> "LocalBM25Client":
+        return cls(local_path_from_url(url))
+
+    def get_index(self, index: str) -> LocalBM25Index:
+        with self._lock:
+            if index not in self._open:
+                self._open[index] = LocalBM25Index(self.root / index)
+            return self._open[index]
+
+    def index(self, index: str, id: str, body: dict[str, Any], refresh: bool | str = False, **_: Any) -> dict[str, Any]:
+        idx = self.get_index(index)
+        idx.index(id, body)
+        if refresh:
+            idx.refresh()
+        return {"_index": index, "_id": id, "result": "created"}
+
+    def delete(self, index: str, id: str, **_: Any) -> dict[str, Any]:
+        self.get_index(index).delete(id)
+        return {"_index": index, "_id": id, "result": "deleted"}
+
+    def search(self, index: str, body: dict[str, Any], **_: Any) -> dict[str, Any]:
+        query, operator = _extract_match(body.get("query") or {})
+        size = int(body.get("size", 10))
+        idx = self.get_index(index)
+        hits, total = idx.search(query, size=size, operator=operator)
+        return {
+            "hits": {
+                "total": {"value": total, "relation": "eq"},
+                "max_score": hits[0][1] if hits else None,
+                "hits": [
+                    {"_index": index, "_id": ext, "_score": score, "_source": source}
+                    for ext, score, source in hits
+                ],
+            }
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            indexes = list(self._open.values())
+        for idx in indexes:
+            idx.close()
+
+
+def _extract_match(query: dict[str, Any]) -> tuple[str, str]:
+    """Pull text/operator out of ``match`` / ``multi_match`` / ``query_string`` bodies."""
+    if "match" in query:
+        (_field, spec), = query["match"].items()
+        if isinstance(spec, dict):
+            return str(spec.get("query", "")), str(spec.get("operator", "or"))
+        return str(spec), "or"
+    for key in ("multi_match", "query_string", "simple_query_string"):
+        if key in query:
+            spec = query[key]
+            return str(spec.get("query", "")), str(spec.get("operator", spec.get("default_operator", "or")))
+    raise ValueError(f"Unsupported query for local BM25: {list(query)}")
+
+
+def is_local_url(url: str | None) -> bool:
+    return bool(url) and str(url).startswith("local://")
+
+
+def local_path_from_url(url: str) -> Path:
+    if not is_local_url(url):
+        raise ValueError(f"not a local:// BM25 url: {url}")
+    return Path(url[len("local://"):] or ".")
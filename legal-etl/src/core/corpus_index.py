@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from .tokenize import fold_lower
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / ".cache" / "local_corpus.sqlite"
+
+# Bedesten phrase sözdizimi: +"zorunlu ifade", -"hariç", "opsiyonel" veya çıplak kelime
+_CLAUSE_RE = re.compile(r'([+-]?)"([^"]+)"|([+-]?)([^\s"]+)')
+_FTS_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Bedesten orderByList alanları -> docs sütunları
+_ORDER_FIELDS = {"kararTarihi": "d.decision_date", "documentId": "d.document_id"}
+DEFAULT_ORDER = [{"field": "kararTarihi", "order": "DESC"}, {"field": "documentId", "order": "DESC"}]
+OZET_CHARS = 500
+
+
+def _fts_phrase(text: str) -> Optional[str]:
+    tokens = _FTS_TOKEN_RE.findall(fold_lower(text))
+    if not tokens:
+        return None
+    return '"' + " ".join(tokens) + '"'
+
+
+def phrase_to_fts(phrase: str) -> Optional[str]:
+    """
+    Translate a Bedesten ``phrase`` into an FTS5 MATCH expression.
+
+    ``+"a b"`` clauses are required (AND), ``-"c"`` clauses are excluded (NOT)
+    and unprefixed clauses are OR-ed; they only filter when there is no
+    required clause, mirroring how the portal treats them as optional.
+    """
+    required: list[str] = []
+    optional: list[str] = []
+    excluded: list[str] = []
+    for m in _CLAUSE_RE.finditer(phrase or ""):
+        sign = m.group(1) if m.group(2) is not None else m.group(3)
+        expr = _fts_phrase(m.group(2) if m.group(2) is not None else m.group(4))
+        if not expr:
+            continue
+        if sign == "+":
+            required.append(expr)
+        elif sign == "-":
+            excluded.append(expr)
+        else:
+            optional.append(expr)
+    if required:
+        positive = " AND ".join(required)
+    elif optional:
+        positive = " OR ".join(optional)
+    else:
+        return None
+    if excluded:
+        return f"({positive}) NOT ({' OR '.join(excluded)})"
+    return positive
+
+
+def _iso_day(value: Any) -> Optional[str]:
+    """'2024-05-21T00:00:00.000Z', '2024-05-21' veya '21.05.2024' -> '2024-05-21'."""
+    if not value:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()[:10]
+    text = str(value).strip()
+    if re.match(r"^\d{4}-\d{2}-\d{2}", text):
+        return text[:10]
+    m = re.match(r"^(\d{1,2})[./](\d{1,2})[./](\d{4})", text)
+    if m:
+        return f"{m.group(3)}-{int(m.group(2)):02d}-{int(m.group(1)):02d}"
+    return None
+
+
+def order_clause(order_by: Optional[list[dict[str, Any]]]) -> str:
+    """Bedesten ``orderByList`` -> SQL ``ORDER BY`` body; empty means ``DEFAULT_ORDER``."""
+    parts = []
+    for entry in order_by or DEFAULT_ORDER:
+        column = _ORDER_FIELDS.get(entry.get("field"))
+        if column is None:
+            raise ValueError(
+                f"unsupported orderByList field: {entry.get('field')!r} "
+                f"(choose from {', '.join(_ORDER_FIELDS)})"
+            )
+        direction = str(entry.get("order") or "ASC").upper()
+        if direction not in ("ASC", "DESC"):
+            raise ValueError(f"unsupported orderByList order: {entry.get('order')!r}")
+        parts.append(f"{column} {direction}")
+    return ", ".join(parts)
+
+
+def _item_type_of(record: dict[str, Any]) -> str:
+    meta = record.get("meta") or {}
+    explicit = meta.get("item_type") or record.get("item_type")
+    if explicit:
+        return str(explicit).upper()
+    court = (record.get("court") or "").lower()
+    if "bölge" in court or "bolge" in court or "istinaf" in court:
+        return "ISTINAFHUKUK"
+    return "YARGITAYKARARI"
+
+
+class LocalCorpusIndex:
+    """
+    On-disk inverted index (SQLite FTS5) over connector NDJSON dumps.
+
+    Built from ``run_connector.py --dump-ndjson`` / ``clean_yargitay.py`` output
+    and queried with Bedesten ``searchDocuments`` semantics: same ``phrase``
+    syntax, ``itemTypeList`` filter, ``kararTarihiStart``/``End`` window and
+    ``orderByList`` over ``kararTarihi``/``documentId`` (default
+    ``kararTarihi DESC, documentId DESC``). Rows are returned in the Bedesten
+    row shape so callers can treat both sources alike; ``ozet`` is the first
+    ``OZET_CHARS`` characters of the decision text.
+    """
+
+    def __init__(self, path: str | Path | None = None) -> None:
+        self.path = Path(path or DEFAULT_PATH)
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA mmap_size=268435456;")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS docs (
+                    id INTEGER PRIMARY KEY,
+                    document_id TEXT NOT NULL UNIQUE,
+                    item_type TEXT NOT NULL,
+                    decision_date TEXT,
+                    chamber TEXT,
+                    e_no TEXT,
+                    k_no TEXT,
+                    title TEXT,
+                    url TEXT,
+                    text TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_docs_order ON docs(decision_date DESC, document_id DESC)"
+            )
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(body, content='', tokenize='unicode61')"
+            )
+            self._conn = conn
+        return self._conn
+
+    # ------------------------------------------------------------------ build
+    def add_records(self, records: Iterable[dict[str, Any]]) -> dict[str, int]:
+        """Insert or replace NDJSON records (keyed by Bedesten documentId)."""
+        stats = {"read": 0, "indexed": 0, "replaced": 0, "skipped": 0}
+        with self._lock:
+            conn = self._connect()
+            for rec in records:
+                stats["read"] += 1
+                text = rec.get("text") or ""
+                if rec.get("chunk_id") or not text.strip():
+                    stats["skipped"] += 1
+                    continue
+                meta = rec.get("meta") or {}
+                document_id = str(meta.get("bedesten_id") or rec.get("doc_id") or "")
+                if not document_id:
+                    stats["skipped"] += 1
+                    continue
+                old = conn.execute(
+                    "SELECT id, text FROM docs WHERE document_id = ?", (document_id,)
+                ).fetchone()
+                if old is not None:
+                    # contentless FTS5: silmek için eski gövde yeniden verilir
+                    conn.execute(
+                        "INSERT INTO docs_fts(docs_fts, rowid, body) VALUES('delete', ?, ?)",
+                        (old["id"], fold_lower(old["text"])),
+                    )
+                    conn.execute("DELETE FROM docs WHERE id = ?", (old["id"],))
+                    stats["replaced"] += 1
+                cur = conn.execute(
+                    """
+                    INSERT INTO docs (document_id, item_type, decision_date, chamber, e_no, k_no, title, url, text)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        document_id,
+                        _item_type_of(rec),
+                        _iso_day(rec.get("decision_date") or meta.get("decision_date_text")),
+                        rec.get("chamber"),
+                        meta.get("e_no"),
+                        meta.get("k_no"),
+                        rec.get("title"),
+                        rec.get("url"),
+                        text,
+                    ),
+                )
+                conn.execute(
+                    "INSERT INTO docs_fts(rowid, body) VALUES (?, ?)",
+                    (cur.lastrowid, fold_lower(text)),
+                )
+                stats["indexed"] += 1
+            conn.commit()
+        return stats
+
+    def add_ndjson(self, path: str | Path) -> dict[str, int]:
+        def _records():
+            with Path(path).open("r", encoding="utf-8") as fh:
+                for line in fh:
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+
+        return self.add_records(_records())
+
+    def optimize(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT INTO docs_fts(docs_fts) VALUES('optimize')")
+            conn.commit()
+
+    # ----------------------------------------------------------------- search
+    def search(
+        self,
+        phrase: str,
+        item_types: Optional[list[str]] = None,
+        date_start: Any = None,
+        date_end: Any = None,
+        page: int = 1,
+        page_size: int = 100,
+        order_by: Optional[list[dict[str, Any]]] = None,
+    ) -> tuple[list[dict[str, Any]], int]:
+        """Return (Bedesten-shaped rows, recordsTotal) for one result page."""
+        order = order_clause(order_by)
+        match = phrase_to_fts(phrase)
+        if match is None:
+            return [], 0
+        where = ["d.id IN (SELECT rowid FROM docs_fts WHERE docs_fts MATCH ?)"]
+        params: list[Any] = [match]
+        if item_types:
+            where.append(f"d.item_type IN ({','.join('?' * len(item_types))})")
+            params.extend(t.upper() for t in item_types)
+        start, end = _iso_day(date_start), _iso_day(date_end)
+        if start:
+            where.append("d.decision_date >= ?")
+            params.append(start)
+        if end:
+            where.append("d.decision_date <= ?")
+            params.append(end)
+        clause = " AND ".join(where)
+        offset = max(0, int(page) - 1) * page_size
+        with self._lock:
+            conn = self._connect()
+            total = conn.execute(f"SELECT COUNT(*) FROM docs d WHERE {clause}", params).fetchone()[0]
+            rows = conn.execute(
+                f"""
+                SELECT d.document_id, d.item_type, d.decision_date, d.chamber, d.e_no, d.k_no, d.title,
+                       substr(d.text, 1, ?) AS ozet
+                  FROM docs d
+                 WHERE {clause}
+                 ORDER BY {order}
+                 LIMIT ? OFFSET ?
+                """,
+                [OZET_CHARS, *params, page_size, offset],
+            ).fetchall()
+        return [self._to_bedesten_row(r) for r in rows], total
+
+    @staticmethod
+    def _to_bedesten_row(row: sqlite3.Row) -> dict[str, Any]:
+        iso = row["decision_date"]
+        date_str = f"{iso[8:10]}.{iso[5:7]}.{iso[0:4]}" if iso else None
+        return {
+            "documentId": row["document_id"],
+            "itemType": {"name": row["item_type"]},
+            "daireAdi": row["chamber"],
+            "esasNo": row["e_no"],
+            "kararNo": row["k_no"],
+            "kararTarihi": iso,
+            "kararTarihiStr": date_str,
+            "ozet": row["ozet"],
+        }
+
+    def get_text(self, document_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT text FROM docs WHERE document_id = ?", (str(document_id),)
+            ).fetchone()
+        return row["text"] if row else None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+try:  # zstd daha hızlı/küçük; yoksa gzip
+    import zstandard  # type: ignore
+except Exception:  # noqa: BLE001
+    zstandard = None
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / ".cache" / "documents.sqlite"
+
+
+@dataclass
+class CachedDocument:
+    doc_id: str
+    html: str
+    text: Optional[str]
+    fetched_at: float
+
+
+class DocumentCache:
+    """
+    Content-addressed local store for Bedesten getDocumentContent responses.
+
+    Decisions are immutable once published, so raw HTML and normalized text are
+    kept compressed (zstd, falling back to gzip) in a ``blobs`` table keyed by
+    sha256, and ``docs`` maps ``documentId`` to those hashes. ``ttl_seconds=None``
+    means entries never expire. When the stored blob size exceeds ``max_bytes``
+    the least recently used documents are dropped together with orphaned blobs.
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        ttl_seconds: float | None = None,
+        max_bytes: int = 2 * 1024**3,
+        codec: str | None = None,
+    ) -> None:
+        self.path = Path(path or DEFAULT_PATH)
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self.max_bytes = max(1024**2, int(max_bytes))
+        self.codec = codec or ("zstd" if zstandard is not None else "gzip")
+        if self.codec == "zstd" and zstandard is None:
+            raise RuntimeError("zstd codec requested but 'zstandard' is not installed")
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._counters = {"hits": 0, "misses": 0, "expired": 0, "writes": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls, path: str | Path | None = None) -> "DocumentCache":
+        """DOC_CACHE_PATH / DOC_CACHE_TTL_SEC (0 = no expiry) / DOC_CACHE_MAX_MB."""
+        return cls(
+            path=os.getenv("DOC_CACHE_PATH") or path,
+            ttl_seconds=float(os.getenv("DOC_CACHE_TTL_SEC", "0")),
+            max_bytes=int(float(os.getenv("DOC_CACHE_MAX_MB", "2048")) * 1024**2),
+            codec=os.getenv("DOC_CACHE_CODEC") or None,
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    size INTEGER NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS docs (
+                    doc_id TEXT PRIMARY KEY,
+                    html_hash TEXT NOT NULL,
+                    text_hash TEXT,
+                    fetched_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_lru ON docs(last_used)")
+            self._bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def _compress(self, text: str) -> bytes:
+        raw = text.encode("utf-8")
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=6).compress(raw)
+        return gzip.compress(raw, compresslevel=6)
+
+    @staticmethod
+    def _decompress(codec: str, data: bytes) -> str:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("cache entry is zstd-compressed but 'zstandard' is not installed")
+            return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+        return gzip.decompress(data).decode("utf-8")
+
+    def _put_blob(self, conn: sqlite3.Connection, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone():
+            return digest
+        data = self._compress(text)
+        conn.execute(
+            "INSERT INTO blobs (hash, codec, data, size) VALUES (?, ?, ?, ?)",
+            (digest, self.codec, data, len(data)),
+        )
+        self._bytes += len(data)
+        return digest
+
+    def _load_blob(self, conn: sqlite3.Connection, digest: str | None) -> Optional[str]:
+        if not digest:
+            return None
+        row = conn.execute("SELECT codec, data FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        return self._decompress(row[0], row[1]) if row else None
+
+    def get(self, doc_id: str) -> Optional[CachedDocument]:
+        """Return the cached document, or None on miss/expiry."""
+        key = str(doc_id)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT html_hash, text_hash, fetched_at FROM docs WHERE doc_id = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+            html_hash, text_hash, fetched_at = row
+            now = time.time()
+            if self.ttl_seconds is not None and now - fetched_at > self.ttl_seconds:
+                self._counters["expired"] += 1
+                self._counters["misses"] += 1
+                return None
+            html = self._load_blob(conn, html_hash)
+            if html is None:
+                self._counters["misses"] += 1
+                return None
+            text = self._load_blob(conn, text_hash)
+            conn.execute("UPDATE docs SET last_used = ? WHERE doc_id = ?", (now, key))
+            conn.commit()
+            self._counters["hits"] += 1
+            return CachedDocument(doc_id=key, html=html, text=text, fetched_at=fetched_at)
+
+    def put(self, doc_id: str, html: str, text: str | None = None) -> None:
+        """Store raw HTML and (optionally) its normalized text for ``doc_id``."""
+        if not html:
+            return
+        key = str(doc_id)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            html_hash = self._put_blob(conn, html)
+            text_hash = self._put_blob(conn, text) if text else None
+            conn.execute(
+                """
+                INSERT INTO docs (doc_id, html_hash, text_hash, fetched_at, last_used)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(doc_id) DO UPDATE SET
+                    html_hash = excluded.html_hash,
+                    text_hash = COALESCE(excluded.text_hash,
+                                         CASE WHEN docs.html_hash = excluded.html_hash THEN docs.text_hash END),
+                    fetched_at = excluded.fetched_at,
+                    last_used = excluded.last_used
+                """,
+                (key, html_hash, text_hash, now, now),
+            )
+            self._counters["writes"] += 1
+            if self._bytes > self.max_bytes:
+                self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        target = int(self.max_bytes * 0.9)
+        while self._bytes > target:
+            victims = conn.execute("SELECT doc_id FROM docs ORDER BY last_used LIMIT 200").fetchall()
+            if not victims:
+                break
+            conn.executemany("DELETE FROM docs WHERE doc_id = ?", victims)
+            conn.execute(
+                """
+                DELETE FROM blobs
+                 WHERE hash NOT IN (SELECT html_hash FROM docs)
+                   AND hash NOT IN (SELECT text_hash FROM docs WHERE text_hash IS NOT NULL)
+                """
+            )
+            self._counters["evictions"] += len(victims)
+            self._bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / total, 4) if total else 0.0,
+                "bytes": self._bytes,
+                "codec": self.codec,
+                "path": str(self.path),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
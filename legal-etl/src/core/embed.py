@@ -1,32 +1,515 @@
 from __future__ import annotations
 
+import math
 import os
-from typing import Iterable, Sequence
+import re
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
 
-import cohere
 import structlog
 
+from .embed_cache import EmbeddingCache
+from .embed_remote import EmbedBatchError, RemoteEmbedExecutor
 from .schema import Chunk
-from .utils import chunked
+from .utils import approx_tokens
 
 logger = structlog.get_logger()
 
+BACKENDS = ("cohere", "sentence-transformers", "onnx", "bge-m3")
+DEFAULT_MODELS = {
+    "cohere": "embed-multilingual-v3.0",
+    "sentence-transformers": "BAAI/bge-m3",
+    "onnx": "BAAI/bge-m3",
+    "bge-m3": "BAAI/bge-m3",
+}
+DEFAULT_ONNX_DIR = Path(__file__).resolve().parents[2] / ".cache" / "onnx"
 
-class Embedder:
-    def __init__(self, api_key: str | None = None, model: str = "embed-multilingual-v3.0") -> None:
+
+def _l2_normalize(vectors: Sequence[Sequence[float]]) -> list[list[float]]:
+    out = []
+    for vec in vectors:
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        out.append([v / norm for v in vec])
+    return out
+
+
+def normalize_backend(backend: str | None) -> str:
+    name = (backend or os.getenv("EMBED_BACKEND") or "cohere").lower()
+    if name in {"st", "sentence_transformers", "local"}:
+        name = "sentence-transformers"
+    if name not in BACKENDS:
+        raise ValueError(f"unknown embedding backend: {name} (choose from {', '.join(BACKENDS)})")
+    return name
+
+
+class EmbeddingBackend:
+    """One resident model; ``encode`` gets one already-sized batch."""
+
+    name = "base"
+    remote = False  # uzak API: RemoteEmbedExecutor ile eşzamanlı, limitli, yeniden denemeli
+    hybrid = False  # dense'in yanında sparse/ColBERT çıktısı da üretebilir
+    max_batch_size = 64
+    max_batch_tokens = 16_384  # padded: batch boyu x en uzun metin
+
+    def __init__(self, model: str) -> None:
+        self.model = model
+        self.dim: int | None = None
+
+    @property
+    def cache_namespace(self) -> str:
+        """Everything that changes the vectors (backend, model, precision, truncation); keys the embedding cache."""
+        return f"{self.name}:{self.model}"
+
+    def encode(self, texts: list[str], kind: str) -> list[list[float]]:
+        """``kind`` is ``"document"`` or ``"query"``; vectors come back L2-normalized."""
+        raise NotImplementedError
+
+    def count_tokens(self, text: str) -> int:
+        # kelime sayısı alt-kelime token'larını küçük tahmin eder; sıralama/boyutlama için yeterli
+        return approx_tokens(text) * 3 // 2 + 2
+
+
+class CohereBackend(EmbeddingBackend):
+    name = "cohere"
+    remote = True
+    max_batch_size = 96  # Cohere embed çağrısı başına metin sınırı
+    max_batch_tokens = 100_000
+
+    def __init__(self, model: str, api_key: str | None = None) -> None:
+        import cohere
+
+        super().__init__(model)
         key = api_key or os.environ.get("COHERE_API_KEY")
         if not key:
             raise ValueError("COHERE_API_KEY missing")
         self.client = cohere.ClientV2(key)
+
+    def encode(self, texts: list[str], kind: str) -> list[list[float]]:
+        resp = self.client.embed(
+            model=self.model,
+            texts=texts,
+            input_type="search_query" if kind == "query" else "search_document",
+            embedding_types=["float"],
+        )
+        embeddings = resp.embeddings
+        vectors = getattr(embeddings, "float_", None) or getattr(embeddings, "float", None) or embeddings
+        return _l2_normalize(vectors)
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    name = "sentence-transformers"
+
+    def __init__(self, model: str, device: str | None = None) -> None:
+        from sentence_transformers import SentenceTransformer
+
+        super().__init__(model)
+        self.st = SentenceTransformer(model, device=device)
+        self.dim = self.st.get_sentence_embedding_dimension()
+        self.tokenizer = getattr(self.st, "tokenizer", None)
+
+    @property
+    def cache_namespace(self) -> str:
+        return f"{self.name}:{self.model}:len{self.st.max_seq_length}"
+
+    def encode(self, texts: list[str], kind: str) -> list[list[float]]:
+        return self.st.encode(texts, batch_size=len(texts), normalize_embeddings=True).tolist()
+
+
+class BGEM3Backend(EmbeddingBackend):
+    """
+    BGE-M3 through FlagEmbedding: dense, sparse (lexical weights) and ColBERT
+    multi-vectors come out of one forward pass. Sparse entries are
+    ``{"indices": [token_id, ...], "values": [weight, ...]}``.
+    """
+
+    name = "bge-m3"
+    hybrid = True
+    max_batch_size = 32
+    max_batch_tokens = 8192
+
+    def __init__(self, model: str, device: str | None = None, use_fp16: bool | None = None, max_length: int = 8192) -> None:
+        from FlagEmbedding import BGEM3FlagModel
+
+        super().__init__(model)
+        use_fp16 = bool(device and device.startswith("cuda")) if use_fp16 is None else use_fp16
+        try:
+            self.m3 = BGEM3FlagModel(model, use_fp16=use_fp16, device=device)
+        except TypeError:  # FlagEmbedding >= 1.3 cihazı "devices" ile alır
+            self.m3 = BGEM3FlagModel(model, use_fp16=use_fp16, devices=device)
+        self.max_length = max_length
+        self.use_fp16 = use_fp16
+
+    @property
+    def cache_namespace(self) -> str:
+        return f"{self.name}:{self.model}:{'fp16' if self.use_fp16 else 'fp32'}:len{self.max_length}"
+
+    def encode(self, texts: list[str], kind: str) -> list[list[float]]:
+        return [item["dense"] for item in self.encode_hybrid(texts, kind, sparse=False)]
+
+    def encode_hybrid(self, texts: list[str], kind: str, sparse: bool = True, colbert: bool = False) -> list[dict[str, Any]]:
+        out = self.m3.encode(
+            texts,
+            batch_size=len(texts),
+            max_length=self.max_length,
+            return_dense=True,
+            return_sparse=sparse,
+            return_colbert_vecs=colbert,
+        )
+        dense = out["dense_vecs"].tolist()
+        if self.dim is None and dense:
+            self.dim = len(dense[0])
+        items: list[dict[str, Any]] = []
+        for i, vec in enumerate(dense):
+            item: dict[str, Any] = {"dense": vec}
+            if sparse:
+                weights = out["lexical_weights"][i]
+                item["sparse"] = {"indices": [int(k) for k in weights], "values": [float(v) for v in weights.values()]}
+            if colbert:
+                item["colbert"] = out["colbert_vecs"][i].tolist()
+            items.append(item)
+        return items
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    ONNX Runtime on CPU with a dynamically int8-quantized graph.
+
+    ``path`` holds an exported ``model.onnx`` (for example from
+    ``optimum-cli export onnx --model BAAI/bge-m3 <path>``) plus the tokenizer
+    files; ``model_quantized.onnx`` is produced next to it on first use.
+    Pooling is CLS for BGE models and mean pooling otherwise.
+    """
+
+    name = "onnx"
+    max_batch_size = 32
+    max_batch_tokens = 8192
+
+    def __init__(
+        self,
+        model: str,
+        path: str | Path | None = None,
+        quantize: bool = True,
+        threads: int | None = None,
+        pooling: str | None = None,
+        max_length: int = 512,
+    ) -> None:
+        import numpy as np
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        super().__init__(model)
+        self._np = np
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model).strip("_")
+        root = Path(path or os.getenv("EMBED_ONNX_DIR") or DEFAULT_ONNX_DIR / slug)
+        onnx_file = self._resolve(root, quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(str(root) if (root / "tokenizer.json").exists() else model)
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = threads or int(os.getenv("EMBED_ONNX_THREADS", "0"))
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(onnx_file), opts, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        self.pooling = pooling or ("cls" if "bge" in model.lower() else "mean")
+        self.max_length = max_length
+        self.onnx_file = onnx_file
+
+    @property
+    def cache_namespace(self) -> str:
+        precision = "int8" if self.onnx_file.name == "model_quantized.onnx" else "fp32"
+        return f"{self.name}:{self.model}:{precision}:{self.pooling}:len{self.max_length}"
+
+    @staticmethod
+    def _resolve(root: Path, quantize: bool) -> Path:
+        plain = root / "model.onnx"
+        quantized = root / "model_quantized.onnx"
+        if quantize and quantized.exists():
+            return quantized
+        if not plain.exists():
+            raise FileNotFoundError(f"{plain} yok; önce 'optimum-cli export onnx --model <model> {root}' ile dışa aktarın")
+        if not quantize:
+            return plain
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info("embed.onnx_quantize", source=str(plain), target=str(quantized))
+        quantize_dynamic(str(plain), str(quantized), weight_type=QuantType.QInt8)
+        return quantized
+
+    def count_tokens(self, text: str) -> int:
+        # hızlı tokenizer ile gerçek uzunluk; kesme sınırına göre kırpılır
+        return min(len(self.tokenizer(text, add_special_tokens=True)["input_ids"]), self.max_length)
+
+    def encode(self, texts: list[str], kind: str) -> list[list[float]]:
+        np = self._np
+        enc = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self._inputs}
+        hidden = self.session.run(None, feeds)[0]
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = enc["attention_mask"][..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        if self.dim is None:
+            self.dim = int(pooled.shape[1])
+        return pooled.tolist()
+
+
+class EmbedMetrics:
+    def __init__(self, window: int = 512) -> None:
+        self.calls = 0
+        self.texts = 0
+        self.tokens = 0
+        self.seconds = 0.0
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, texts: int, tokens: int, seconds: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.texts += texts
+            self.tokens += tokens
+            self.seconds += seconds
+            self._latencies.append(seconds)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            lat = sorted(self._latencies)
+            pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000, 1) if lat else 0.0  # noqa: E731
+            return {
+                "calls": self.calls,
+                "texts": self.texts,
+                "tokens": self.tokens,
+                "seconds": round(self.seconds, 3),
+                "texts_per_s": round(self.texts / self.seconds, 1) if self.seconds else 0.0,
+                "tokens_per_s": round(self.tokens / self.seconds, 1) if self.seconds else 0.0,
+                "batch_ms_p50": pick(0.5),
+                "batch_ms_p95": pick(0.95),
+            }
+
+
+class Embedder:
+    """
+    Single entry point for document and query embeddings.
+
+    ``backend`` is ``cohere``, ``sentence-transformers``, ``onnx`` or
+    ``bge-m3`` (default ``EMBED_BACKEND``, else ``cohere``) or a ready
+    ``EmbeddingBackend``; ``model`` defaults to ``EMBED_MODEL`` or the
+    backend's default. Texts are sorted by token length and packed into
+    batches bounded by ``max_batch_size`` and padded ``max_batch_tokens``, so
+    short texts are not padded to the longest one in the corpus. Use
+    ``get_embedder`` to share one resident model per process.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        model: str | None = None,
+        backend: str | EmbeddingBackend | None = None,
+        device: str | None = None,
+        cache: EmbeddingCache | bool | None = None,
+        max_batch_size: int | None = None,
+        max_batch_tokens: int | None = None,
+        **backend_kwargs: Any,
+    ) -> None:
+        t0 = time.perf_counter()
+        if isinstance(backend, EmbeddingBackend):
+            self.backend: EmbeddingBackend = backend
+            name, model = backend.name, backend.model
+        else:
+            name = normalize_backend(backend)
+            model = model or os.getenv("EMBED_MODEL") or DEFAULT_MODELS[name]
+            if name == "cohere":
+                self.backend = CohereBackend(model, api_key=api_key)
+            elif name == "sentence-transformers":
+                self.backend = SentenceTransformerBackend(model, device=device or os.getenv("EMBED_DEVICE"))
+            elif name == "bge-m3":
+                self.backend = BGEM3Backend(model, device=device or os.getenv("EMBED_DEVICE"), **backend_kwargs)
+            else:
+                self.backend = OnnxBackend(model, **backend_kwargs)
         self.model = model
+        self.max_batch_size = max_batch_size or self.backend.max_batch_size
+        self.max_batch_tokens = max_batch_tokens or self.backend.max_batch_tokens
+        self.metrics = EmbedMetrics()
+        self.executor = (
+            RemoteEmbedExecutor.from_env(
+                self.backend.count_tokens,
+                max_batch_size=self.max_batch_size,
+                max_batch_tokens=self.max_batch_tokens,
+                key=f"{name}:{model}",
+                on_call=self.metrics.record,
+            )
+            if self.backend.remote
+            else None
+        )
+        cost = float(os.getenv("EMBED_COST_PER_1K_TOKENS", "0.0001")) if name == "cohere" else 0.0
+        # Cohere fiyatı (USD / 1K token) yalnız "cost_saved" raporu için; cache=False önbelleği kapatır.
+        # Önbellek backend + hassasiyet + kesme uzunluğuna göre ayrılır (onnx int8/512 != bge-m3 fp16/8192).
+        self.cache = (
+            None
+            if cache is False
+            else cache or EmbeddingCache.from_env(self.backend.cache_namespace, cost_per_1k_tokens=cost)
+        )
+        logger.info("embed.loaded", backend=name, model=model, seconds=round(time.perf_counter() - t0, 2))
+
+    @property
+    def dim(self) -> int:
+        if self.backend.dim is None:
+            self.backend.dim = len(self.embed_query("ping"))
+        return self.backend.dim
+
+    @property
+    def normalized(self) -> bool:
+        return True
+
+    def info(self) -> dict[str, Any]:
+        return {"backend": self.backend.name, "model": self.model, "dim": self.dim, "normalized": self.normalized}
+
+    def stats(self) -> dict[str, Any]:
+        stats = self.metrics.snapshot()
+        if self.executor is not None:
+            stats.update(self.executor.stats())
+        return stats
+
+    def _batches(self, texts: Sequence[str], max_batch_size: int) -> list[list[tuple[int, int]]]:
+        sized = sorted(((self.backend.count_tokens(t), i) for i, t in enumerate(texts)), reverse=True)
+        batches: list[list[tuple[int, int]]] = []
+        current: list[tuple[int, int]] = []
+        for tokens, idx in sized:
+            # uzun metinler önce geldiği için ilk eleman batch'in dolgu boyunu belirler
+            if current and (len(current) >= max_batch_size or (len(current) + 1) * current[0][0] > self.max_batch_tokens):
+                batches.append(current)
+                current = []
+            current.append((tokens, idx))
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed(
+        self,
+        texts: Sequence[str],
+        kind: str = "document",
+        max_batch_size: int | None = None,
+        on_batch: Callable[[list[int], list[list[float]]], None] | None = None,
+    ) -> list[list[float]]:
+        """Vectors for ``texts`` in order; ``on_batch(indices, vectors)`` fires as each batch finishes."""
+        if self.executor is not None:
+            out = self.executor.run(
+                texts, lambda batch: self.backend.encode(batch, kind), on_batch=on_batch, max_batch_size=max_batch_size
+            )
+            if out and self.backend.dim is None:
+                self.backend.dim = len(out[0])
+            return out
+        out: list[list[float] | None] = [None] * len(texts)
+        for batch in self._batches(texts, max_batch_size or self.max_batch_size):
+            t0 = time.perf_counter()
+            vectors = [list(v) for v in self.backend.encode([texts[i] for _, i in batch], kind)]
+            self.metrics.record(len(batch), sum(tok for tok, _ in batch), time.perf_counter() - t0)
+            for (_, idx), vec in zip(batch, vectors, strict=True):
+                out[idx] = vec
+            if on_batch is not None:
+                on_batch([idx for _, idx in batch], vectors)
+        if out and self.backend.dim is None:
+            self.backend.dim = len(out[0])
+        return out  # type: ignore[return-value]
+
+    def embed_hybrid(
+        self,
+        texts: Sequence[str],
+        kind: str = "document",
+        sparse: bool = True,
+        colbert: bool = False,
+        max_batch_size: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """Named representations per text (``dense`` plus ``sparse``/``colbert``); needs a hybrid backend."""
+        if not self.backend.hybrid:
+            raise ValueError(f"{self.backend.name} backend only produces dense vectors; use backend='bge-m3'")
+        out: list[dict[str, Any] | None] = [None] * len(texts)
+        for batch in self._batches(texts, max_batch_size or self.max_batch_size):
+            t0 = time.perf_counter()
+            items = self.backend.encode_hybrid([texts[i] for _, i in batch], kind, sparse=sparse, colbert=colbert)
+            self.metrics.record(len(batch), sum(tok for tok, _ in batch), time.perf_counter() - t0)
+            for (_, idx), item in zip(batch, items, strict=True):
+                out[idx] = item
+        return out  # type: ignore[return-value]
+
+    def embed_documents(self, texts: Sequence[str], max_batch_size: int | None = None) -> list[list[float]]:
+        return self.embed(texts, "document", max_batch_size=max_batch_size)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed([text], "query")[0]
+
+    def embed_chunks(
+        self,
+        chunks: Sequence[Chunk],
+        batch_size: int | None = None,
+        on_batch: Callable[[list[tuple[Chunk, list[float]]]], None] | None = None,
+    ) -> list[tuple[Chunk, list[float]]]:
+        """
+        Embed ``chunks`` (cache hits first), handing each finished batch to
+        ``on_batch`` so callers can persist it before later batches run. If
+        some chunks fail, ``EmbedBatchError`` is raised after every other
+        batch was delivered and cached.
+        """
+        if not chunks:
+            return []
+        results: list[tuple[Chunk, list[float]] | None] = [None] * len(chunks)
+
+        def deliver(indices: list[int], vectors: list[list[float]]) -> None:
+            pairs = [(chunks[i], vec) for i, vec in zip(indices, vectors, strict=True)]
+            for i, pair in zip(indices, pairs, strict=True):
+                results[i] = pair
+            if on_batch is not None:
+                on_batch(pairs)
+
+        missing = list(range(len(chunks)))
+        keys: list[bytes] = []
+        if self.cache is not None:
+            keys = [self.cache.key(c.content_hash, c.payload.get("embed_version", 1)) for c in chunks]
+            cached = self.cache.get_many(keys, tokens=[c.token_count for c in chunks])
+            hits = [i for i, vec in enumerate(cached) if vec is not None]
+            if hits:
+                deliver(hits, [cached[i] for i in hits])
+            missing = [i for i, vec in enumerate(cached) if vec is None]
+
+        if missing:
+            seconds_before, texts_before = self.metrics.seconds, self.metrics.texts
+
+            def fresh(local: list[int], vectors: list[list[float]]) -> None:
+                indices = [missing[j] for j in local]
+                if self.cache is not None:
+                    self.cache.put_many([keys[i] for i in indices], vectors)
+                deliver(indices, vectors)
+
+            try:
+                self.embed([chunks[i].content for i in missing], "document", max_batch_size=batch_size, on_batch=fresh)
+            except EmbedBatchError as exc:
+                # hata indeksleri eksikler alt kümesine göre; chunk indekslerine çevir
+                vectors: list[Optional[list[float]]] = [pair[1] if pair is not None else None for pair in results]
+                raise EmbedBatchError({missing[j]: err for j, err in exc.failed.items()}, vectors) from exc
+            finally:
+                if self.cache is not None:
+                    self.cache.record_encode(self.metrics.texts - texts_before, self.metrics.seconds - seconds_before)
+                logger.info("embed.chunks", size=len(chunks), **self.stats())
+                if self.cache is not None:
+                    logger.info("embed.cache", **self.cache.stats())
+        return [pair for pair in results if pair is not None]
+
+
+_EMBEDDERS: dict[tuple, Embedder] = {}
+_EMBEDDERS_LOCK = threading.Lock()
+
 
-    def embed_chunks(self, chunks: Sequence[Chunk], batch_size: int = 48) -> list[tuple[Chunk, list[float]]]:
-        results: list[tuple[Chunk, list[float]]] = []
-        for batch in chunked(chunks, batch_size):
-            texts = [c.content for c in batch]
-            resp = self.client.embed(model=self.model, input=texts)
-            embeddings = resp.embeddings
-            for chunk, vec in zip(batch, embeddings, strict=True):
-                results.append((chunk, vec))
-            logger.info("embed.batch", size=len(batch))
-        return results
+def get_embedder(backend: str | None = None, model: str | None = None, device: str | None = None, **kwargs: Any) -> Embedder:
+    """Process-wide ``Embedder`` per (backend, model, device) so the model stays loaded."""
+    name = normalize_backend(backend)
+    model = model or os.getenv("EMBED_MODEL") or DEFAULT_MODELS[name]
+    key = (name, model, device, tuple(sorted(kwargs.items())))
+    with _EMBEDDERS_LOCK:
+        embedder = _EMBEDDERS.get(key)
+        if embedder is None:
+            embedder = _EMBEDDERS[key] = Embedder(model=model, backend=name, device=device, **kwargs)
+        return embedder
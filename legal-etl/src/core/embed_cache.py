@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
+
+try:  # süreçler arası append kilidi; yoksa yalnız süreç içi kilit
+    import fcntl  # type: ignore
+except Exception:  # noqa: BLE001
+    fcntl = None
+
+DEFAULT_DIR = Path(__file__).resolve().parents[2] / ".cache" / "embeddings"
+DTYPES = ("float16", "int8")
+KEY_BYTES = 20  # sha1 digest
+
+
+class EmbeddingCache:
+    """
+    Append-only embedding store keyed by ``(model, embed_version, content_hash)``,
+    where ``model`` is the embedder's ``cache_namespace`` (backend, model,
+    precision and truncation length), so differently produced vectors never mix.
+
+    Vectors of one model live in a single ``.vec`` file of fixed-size records
+    (float16, or int8 with a per-vector float32 scale) that is read through
+    ``mmap``; the parallel ``.idx`` file holds the sha1 key of each record in
+    slot order and is loaded into a dict on open. Appends take an exclusive
+    ``flock`` and pick up records written by other processes first, so several
+    embedders can share a directory. A torn append (vectors written, keys not)
+    is truncated away by the next writer.
+    """
+
+    def __init__(
+        self,
+        root: str | Path | None = None,
+        model: str = "default",
+        dtype: str = "float16",
+        cost_per_1k_tokens: float = 0.0,
+    ) -> None:
+        if dtype not in DTYPES:
+            raise ValueError(f"unsupported embedding cache dtype: {dtype}")
+        self.root = Path(root or DEFAULT_DIR)
+        self.model = model
+        self.dtype = dtype
+        self.cost_per_1k_tokens = cost_per_1k_tokens
+        stem = re.sub(r"[^A-Za-z0-9._-]+", "_", model).strip("_") or "model"
+        self.vec_path = self.root / f"{stem}.{dtype}.vec"
+        self.idx_path = self.root / f"{stem}.{dtype}.idx"
+        self.meta_path = self.root / f"{stem}.{dtype}.json"
+        self.dim: Optional[int] = None
+        self._index: dict[bytes, int] = {}
+        self._slots = 0
+        self._mm: Optional[mmap.mmap] = None
+        self._vec_fh = None
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0}
+        self._tokens_saved = 0
+        self._encoded = 0
+        self._encode_seconds = 0.0
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self.meta_path.exists():
+            meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+            if meta.get("model") != model:
+                raise ValueError(f"embedding cache {self.meta_path} belongs to {meta.get('model')!r}, not {model!r}")
+            self.dim = int(meta["dim"])
+            self._refresh()
+
+    @classmethod
+    def from_env(cls, model: str, cost_per_1k_tokens: float = 0.0) -> Optional["EmbeddingCache"]:
+        """EMBED_CACHE_ENABLED / EMBED_CACHE_DIR / EMBED_CACHE_DTYPE (float16|int8)."""
+        if os.getenv("EMBED_CACHE_ENABLED", "true").lower() not in {"1", "true", "yes", "on"}:
+            return None
+        return cls(
+            root=os.getenv("EMBED_CACHE_DIR") or None,
+            model=model,
+            dtype=os.getenv("EMBED_CACHE_DTYPE", "float16"),
+            cost_per_1k_tokens=cost_per_1k_tokens,
+        )
+
+    def key(self, content_hash: str, embed_version: int | str = 1) -> bytes:
+        return hashlib.sha1(f"{self.model}\x1f{embed_version}\x1f{content_hash}".encode("utf-8")).digest()
+
+    @property
+    def record_size(self) -> int:
+        assert self.dim is not None
+        return self.dim * 2 if self.dtype == "float16" else 4 + self.dim
+
+    # ------------------------------------------------------------------ storage
+    def _refresh(self) -> None:
+        """Index records appended since the last look (by us or other processes)."""
+        if self.dim is None or not (self.idx_path.exists() and self.vec_path.exists()):
+            return
+        complete = min(self.idx_path.stat().st_size // KEY_BYTES, self.vec_path.stat().st_size // self.record_size)
+        if complete <= self._slots:
+            return
+        with self.idx_path.open("rb") as fh:
+            fh.seek(self._slots * KEY_BYTES)
+            data = fh.read((complete - self._slots) * KEY_BYTES)
+        for i in range(0, len(data), KEY_BYTES):
+            self._index[data[i : i + KEY_BYTES]] = self._slots + i // KEY_BYTES
+        self._slots = complete
+
+    def _view(self, slot: int) -> mmap.mmap:
+        needed = (slot + 1) * self.record_size
+        if self._mm is None or len(self._mm) < needed:
+            if self._mm is not None:
+                self._mm.close()
+            if self._vec_fh is None:
+                self._vec_fh = self.vec_path.open("rb")
+            self._mm = mmap.mmap(self._vec_fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm
+
+    def _encode(self, vector: Sequence[float]) -> bytes:
+        values = [float(v) for v in vector]
+        if len(values) != self.dim:
+            raise ValueError(f"vector dim {len(values)} != cache dim {self.dim}")
+        if self.dtype == "float16":
+            return struct.pack(f"<{self.dim}e", *values)
+        scale = (max(abs(v) for v in values) / 127.0) or 1.0
+        quantized = [max(-127, min(127, round(v / scale))) for v in values]
+        return struct.pack("<f", scale) + struct.pack(f"<{self.dim}b", *quantized)
+
+    def _decode(self, slot: int) -> list[float]:
+        view = self._view(slot)
+        offset = slot * self.record_size
+        if self.dtype == "float16":
+            return list(struct.unpack_from(f"<{self.dim}e", view, offset))
+        (scale,) = struct.unpack_from("<f", view, offset)
+        return [v * scale for v in struct.unpack_from(f"<{self.dim}b", view, offset + 4)]
+
+    # --------------------------------------------------------------------- API
+    def get_many(self, keys: Sequence[bytes], tokens: Sequence[int] | None = None) -> list[Optional[list[float]]]:
+        """Cached vectors for ``keys`` (``None`` on miss); ``tokens`` feeds the cost-saved counter."""
+        with self._lock:
+            if self.dim is not None and any(k not in self._index for k in keys):
+                self._refresh()
+            out: list[Optional[list[float]]] = []
+            for i, key in enumerate(keys):
+                slot = self._index.get(key)
+                if slot is None:
+                    self._counters["misses"] += 1
+                    out.append(None)
+                    continue
+                self._counters["hits"] += 1
+                if tokens is not None:
+                    self._tokens_saved += int(tokens[i] or 0)
+                out.append(self._decode(slot))
+            return out
+
+    def put_many(self, keys: Sequence[bytes], vectors: Sequence[Sequence[float]]) -> None:
+        if not keys:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(vectors[0])
+                tmp = self.meta_path.with_suffix(".json.tmp")
+                tmp.write_text(json.dumps({"model": self.model, "dtype": self.dtype, "dim": self.dim}), encoding="utf-8")
+                tmp.replace(self.meta_path)
+            with self.vec_path.open("ab") as vec_fh, self.idx_path.open("ab") as idx_fh:
+                if fcntl is not None:
+                    fcntl.flock(idx_fh.fileno(), fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    # yarım kalmış append'i (vektör yazılmış, anahtar yazılmamış) at
+                    vec_fh.truncate(self._slots * self.record_size)
+                    idx_fh.truncate(self._slots * KEY_BYTES)
+                    fresh: dict[bytes, bytes] = {}
+                    for key, vector in zip(keys, vectors, strict=True):
+                        if key not in self._index and key not in fresh:
+                            fresh[key] = self._encode(vector)
+                    if not fresh:
+                        return
+                    vec_fh.write(b"".join(fresh.values()))
+                    vec_fh.flush()
+                    idx_fh.write(b"".join(fresh.keys()))
+                    idx_fh.flush()
+                    for offset, key in enumerate(fresh):
+                        self._index[key] = self._slots + offset
+                    self._slots += len(fresh)
+                    self._counters["writes"] += len(fresh)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(idx_fh.fileno(), fcntl.LOCK_UN)
+
+    def record_encode(self, count: int, seconds: float) -> None:
+        """Feed actual encoder timings so hits can be priced in seconds saved."""
+        with self._lock:
+            self._encoded += count
+            self._encode_seconds += seconds
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            per_vector = self._encode_seconds / self._encoded if self._encoded else 0.0
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": self._slots,
+                "bytes": self._slots * self.record_size if self.dim else 0,
+                "dtype": self.dtype,
+                "seconds_saved": round(self._counters["hits"] * per_vector, 2),
+                "tokens_saved": self._tokens_saved,
+                "cost_saved": round(self._tokens_saved / 1000 * self.cost_per_1k_tokens, 4),
+                "path": str(self.vec_path),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+            if self._vec_fh is not None:
+                self._vec_fh.close()
+                self._vec_fh = None
+
+
+def encode_with_cache(
+    cache: Optional[EmbeddingCache],
+    keys: Sequence[bytes],
+    texts: Sequence[str],
+    encode: Callable[[list[str]], Sequence[Sequence[float]]],
+    tokens: Sequence[int] | None = None,
+) -> list[list[float]]:
+    """
+    Vectors for ``texts`` in order: cache hits are served from ``cache`` and
+    only the (deduplicated) misses go through ``encode``, then get stored.
+    """
+    if cache is None:
+        return [list(v) for v in encode(list(texts))]
+    vectors = cache.get_many(keys, tokens=tokens)
+    missing: dict[bytes, list[int]] = {}
+    for i, vec in enumerate(vectors):
+        if vec is None:
+            missing.setdefault(keys[i], []).append(i)
+    if missing:
+        order = list(missing)
+        t0 = time.perf_counter()
+        encoded = encode([texts[missing[k][0]] for k in order])
+        cache.record_encode(len(order), time.perf_counter() - t0)
+        encoded = [list(v) for v in encoded]
+        cache.put_many(order, encoded)
+        for key, vec in zip(order, encoded, strict=True):
+            for i in missing[key]:
+                vectors[i] = vec
+    return vectors  # type: ignore[return-value]
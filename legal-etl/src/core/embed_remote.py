@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import heapq
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional, Sequence
+
+import httpx
+import structlog
+
+from .http import RateLimiter
+from .ratelimit import open_rate_backend, parse_retry_after
+
+logger = structlog.get_logger()
+
+RETRY_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+FATAL_STATUSES = {401, 402, 403, 404}
+SIZE_STATUSES = {413}
+# 400/422 yalnız mesaj istek boyutunu işaret ediyorsa bölünür
+SIZE_ERROR = re.compile(r"too (many|long|large)|token limit|max(imum)?[ _]?(tokens|length|batch)|context length", re.I)
+
+Encode = Callable[[list[str]], Sequence[Sequence[float]]]
+
+
+class EmbedBatchError(RuntimeError):
+    """Some texts could not be embedded; ``vectors`` holds what did succeed."""
+
+    def __init__(self, failed: dict[int, str], vectors: list[Optional[list[float]]]) -> None:
+        first = next(iter(failed.values()), "")
+        super().__init__(f"{len(failed)} text(s) failed to embed: {first}")
+        self.failed = failed
+        self.vectors = vectors
+
+
+def _status(exc: BaseException) -> int | None:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(exc: BaseException) -> float | None:
+    headers = getattr(exc, "headers", None) or getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return parse_retry_after(headers.get("retry-after") or headers.get("Retry-After"))
+    except AttributeError:
+        return None
+
+
+def classify(exc: BaseException) -> str:
+    """
+    ``retry`` (throttling/transient), ``split`` (request too large: halve it),
+    ``fatal`` (auth/billing: stop the run) or ``fail`` (anything else: the
+    batch fails on its own).
+    """
+    status = _status(exc)
+    if status is None:
+        if isinstance(exc, (httpx.TransportError, TimeoutError, ConnectionError)) or "timeout" in type(exc).__name__.lower():
+            return "retry"
+        return "fail"
+    if status in RETRY_STATUSES:
+        return "retry"
+    if status in FATAL_STATUSES:
+        return "fatal"
+    if status in SIZE_STATUSES or (status in {400, 422} and SIZE_ERROR.search(str(exc))):
+        return "split"
+    return "fail"
+
+
+class RemoteEmbedExecutor:
+    """
+    Runs remote embedding batches concurrently within provider limits.
+
+    Texts are packed longest-first into batches of at most ``max_batch_size``
+    texts and ``max_batch_tokens`` tokens, and up to ``concurrency`` batches are
+    in flight. Requests and tokens draw from two token buckets
+    (``requests_per_minute`` / ``tokens_per_minute``, shareable across
+    processes through ``RATE_LIMIT_URL``). A 429/5xx/timeout is retried with
+    full-jitter exponential backoff, honouring ``Retry-After``. A batch rejected
+    as too large (413 or a token-limit error) is split in half and retried, so
+    one oversized text only fails itself; the token ceiling then shrinks for
+    the rest of that ``run`` call. Other rejections fail the batch as a whole.
+    ``on_batch`` is called in the caller's thread as each batch completes, so
+    progress survives later failures, which are raised together at the end as
+    :class:`EmbedBatchError`.
+    """
+
+    def __init__(
+        self,
+        count_tokens: Callable[[str], int],
+        max_batch_size: int = 96,
+        max_batch_tokens: int = 100_000,
+        concurrency: int = 4,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        rate_backend: Any = None,
+        key: str = "embed",
+        on_call: Callable[[int, int, float], None] | None = None,
+    ) -> None:
+        self.count_tokens = count_tokens
+        self.concurrency = max(1, concurrency)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_tokens = max(1, max_batch_tokens)
+        if tokens_per_minute:
+            # eşzamanlı batch'lerin toplamı bir dakikalık token bütçesini aşmasın
+            self.max_batch_tokens = max(1, min(self.max_batch_tokens, int(tokens_per_minute // self.concurrency)))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_call = on_call
+        self.requests = (
+            RateLimiter(requests_per_minute / 60.0, capacity=self.concurrency, backend=rate_backend, key=f"{key}:requests")
+            if requests_per_minute
+            else None
+        )
+        self.tokens = (
+            RateLimiter(tokens_per_minute / 60.0, capacity=self.max_batch_tokens, backend=rate_backend, key=f"{key}:tokens")
+            if tokens_per_minute
+            else None
+        )
+        self._counters = {"batches": 0, "retries": 0, "splits": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, count_tokens: Callable[[str], int], prefix: str = "EMBED", **kwargs: Any) -> "RemoteEmbedExecutor":
+        """``{prefix}_CONCURRENCY`` / ``_RPM`` / ``_TPM`` / ``_MAX_RETRIES``; ``RATE_LIMIT_URL`` shares budgets."""
+
+        def num(name: str) -> float | None:
+            raw = os.getenv(f"{prefix}_{name}")
+            return float(raw) if raw else None
+
+        kwargs.setdefault("concurrency", int(num("CONCURRENCY") or 4))
+        kwargs.setdefault("requests_per_minute", num("RPM"))
+        kwargs.setdefault("tokens_per_minute", num("TPM"))
+        kwargs.setdefault("max_retries", int(num("MAX_RETRIES") or 5))
+        if kwargs["requests_per_minute"] or kwargs["tokens_per_minute"]:
+            kwargs.setdefault("rate_backend", open_rate_backend(os.getenv("RATE_LIMIT_URL")))
+        return cls(count_tokens, **kwargs)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {**self._counters, "max_batch_tokens": self.max_batch_tokens}
+
+    def _bump(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    def _delay(self, attempt: int, retry_after: float | None) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        return max(delay, retry_after or 0.0)
+
+    def _call(self, encode: Encode, texts: list[str], tokens: int) -> list[list[float]]:
+        if self.requests is not None:
+            self.requests.acquire()
+        if self.tokens is not None:
+            self.tokens.acquire(cost=tokens)
+        t0 = time.perf_counter()
+        try:
+            vectors = [list(v) for v in encode(texts)]
+        except Exception as exc:
+            status = _status(exc)
+            if status is not None and self.requests is not None:
+                retry_after = _retry_after(exc)
+                self.requests.observe(status, str(retry_after) if retry_after else None)
+            raise
+        if len(vectors) != len(texts):
+            raise RuntimeError(f"provider returned {len(vectors)} vectors for {len(texts)} texts")
+        if self.on_call is not None:
+            self.on_call(len(texts), tokens, time.perf_counter() - t0)
+        return vectors
+
+    def run(
+        self,
+        texts: Sequence[str],
+        encode: Encode,
+        on_batch: Callable[[list[int], list[list[float]]], None] | None = None,
+        max_batch_size: int | None = None,
+    ) -> list[list[float]]:
+        batch_limit = max(1, min(max_batch_size or self.max_batch_size, self.max_batch_size))
+        token_limit = self.max_batch_tokens  # bölünmelerde yalnız bu çağrı için küçülür
+        sizes = [max(1, self.count_tokens(t)) for t in texts]
+        planned = deque(sorted(range(len(texts)), key=lambda i: -sizes[i]))
+        explicit: deque[tuple[list[int], int]] = deque()  # bölünmüş batch'ler önce
+        retries: list[tuple[float, int, list[int], int]] = []  # (hazır olma anı, sıra, batch, deneme)
+        vectors: list[Optional[list[float]]] = [None] * len(texts)
+        failed: dict[int, str] = {}
+        fatal: BaseException | None = None
+        seq = 0
+
+        def next_batch() -> tuple[list[int], int] | None:
+            if retries and retries[0][0] <= time.monotonic():
+                _, _, idxs, attempt = heapq.heappop(retries)
+                return idxs, attempt
+            if explicit:
+                return explicit.popleft()
+            if not planned:
+                return None
+            batch = [planned.popleft()]
+            total = sizes[batch[0]]
+            while planned and len(batch) < batch_limit and total + sizes[planned[0]] <= token_limit:
+                total += sizes[planned[0]]
+                batch.append(planned.popleft())
+            return batch, 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as pool:
+            inflight: dict[Future, tuple[list[int], int]] = {}
+            while True:
+                while fatal is None and len(inflight) < self.concurrency:
+                    job = next_batch()
+                    if job is None:
+                        break
+                    idxs, attempt = job
+                    batch_tokens = sum(sizes[i] for i in idxs)
+                    inflight[pool.submit(self._call, encode, [texts[i] for i in idxs], batch_tokens)] = (idxs, attempt)
+                if not inflight:
+                    if fatal is None and retries:
+                        time.sleep(max(0.0, retries[0][0] - time.monotonic()))
+                        continue
+                    break
+                timeout = max(0.0, retries[0][0] - time.monotonic()) if retries else None
+                done, _ = wait(list(inflight), timeout=timeout, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    idxs, attempt = inflight.pop(fut)
+                    try:
+                        batch_vectors = fut.result()
+                    except Exception as exc:  # noqa: BLE001
+                        kind = classify(exc)
+                        if kind == "retry" and attempt < self.max_retries:
+                            self._bump("retries")
+                            seq += 1
+                            delay = self._delay(attempt, _retry_after(exc))
+                            heapq.heappush(retries, (time.monotonic() + delay, seq, idxs, attempt + 1))
+                            logger.warning("embed.retry", size=len(idxs), attempt=attempt + 1, delay=round(delay, 2), error=str(exc)[:200])
+                        elif kind == "split" and len(idxs) > 1:
+                            self._bump("splits")
+                            token_limit = max(1, min(token_limit, sum(sizes[i] for i in idxs) // 2))
+                            half = len(idxs) // 2
+                            explicit.appendleft((idxs[half:], 0))
+                            explicit.appendleft((idxs[:half], 0))
+                            logger.warning("embed.split", size=len(idxs), error=str(exc)[:200])
+                        else:
+                            if kind == "fatal":
+                                fatal = exc
+                            self._bump("failed", len(idxs))
+                            for i in idxs:
+                                failed[i] = f"{type(exc).__name__}: {exc}"[:500]
+                            logger.error("embed.batch_failed", size=len(idxs), kind=kind, error=str(exc)[:200])
+                        continue
+                    self._bump("batches")
+                    for i, vec in zip(idxs, batch_vectors, strict=True):
+                        vectors[i] = vec
+                    if on_batch is not None:
+                        on_batch(idxs, batch_vectors)
+
+        if fatal is not None:
+            for i, vec in enumerate(vectors):
+                if vec is None and i not in failed:
+                    failed[i] = f"not attempted after fatal error: {fatal}"[:500]
+        if failed:
+            raise EmbedBatchError(failed, vectors)
+        return vectors  # type: ignore[return-value]
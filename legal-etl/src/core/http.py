@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import asyncio
+import threading
 import time
 from dataclasses import dataclass
 from typing import Any, Callable
+from urllib.parse import urlsplit
 
 import httpx
+import structlog
 from tenacity import RetryError, retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
 
+from .ratelimit import LocalBucketBackend, open_rate_backend, parse_retry_after  # noqa: F401
+
+logger = structlog.get_logger()
+
 DEFAULT_UA = (
     "legal-etl/0.1 (+https://example.local; contact: data@legal-etl.local) "
     "python-httpx"
@@ -14,24 +22,131 @@ DEFAULT_UA = (
 
 
 class RateLimiter:
-    """Token bucket limiter for polite crawling."""
+    """
+    Token bucket limiter for polite crawling.
+
+    Safe to share between threads; ``acquire_async`` is the asyncio variant.
+    The bucket state lives in ``backend`` (per process by default, or a shared
+    SQLite/Redis backend from :func:`open_rate_backend` so several processes
+    split one budget). ``observe`` lowers the effective rate by ``backoff`` on
+    429/503 and pauses the bucket for ``Retry-After``; the rate then recovers
+    by ``recovery`` (fraction of ``rate``) per second.
+    """
+
+    THROTTLE_STATUSES = {429, 503}
 
-    def __init__(self, rate: float = 1.0, capacity: int = 2):
+    def __init__(
+        self,
+        rate: float = 1.0,
+        capacity: int = 2,
+        backend: Any = None,
+        key: str = "default",
+        backoff: float = 0.5,
+        recovery: float = 0.01,
+        min_scale: float = 0.1,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.backend = backend or LocalBucketBackend()
+        self.key = key
+        self.backoff = backoff
+        self.recovery = recovery
+        self.min_scale = min_scale
+
+    def _refill(self, state: tuple[float, float, float] | None, now: float) -> tuple[float, float, float]:
+        if state is None:
+            return float(self.capacity), now, 1.0
+        tokens, updated_at, scale = state
+        elapsed = max(0.0, now - updated_at)
+        scale = min(1.0, scale + self.recovery * elapsed)
+        tokens = min(float(self.capacity), tokens + elapsed * self.rate * scale)
+        return tokens, max(now, updated_at), scale
+
+    def _take(self, state, now: float, cost: float = 1.0):
+        # Jeton rezerve edilir (negatife inebilir), bekleme kilit/transaction dışında yapılır;
+        # böylece aynı kovayı paylaşanlar sırayla ve eşit aralıkla geçer.
+        tokens, updated_at, scale = self._refill(state, now)
+        tokens -= cost
+        wait = max(0.0, updated_at - now)
+        if tokens < 0:
+            wait += -tokens / (self.rate * scale)
+        return (tokens, updated_at, scale), wait
+
+    def _penalize(self, retry_after: float | None):
+        def apply(state, now: float):
+            tokens, updated_at, scale = self._refill(state, now)
+            scale = max(self.min_scale, scale * self.backoff)
+            if retry_after:
+                # updated_at ileri alınır: o ana kadar jeton dolmaz, bekleyenler sıraya girer
+                updated_at = max(updated_at, now + retry_after)
+            return (min(tokens, 0.0), updated_at, scale), scale
+
+        return apply
+
+    def acquire(self, cost: float = 1.0) -> None:
+        """Reserve ``cost`` tokens (e.g. a batch's LLM tokens) and sleep until they are due."""
+        wait = self.backend.update(self.key, lambda state, now: self._take(state, now, cost))
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, cost: float = 1.0) -> None:
+        take = lambda state, now: self._take(state, now, cost)  # noqa: E731
+        if isinstance(self.backend, LocalBucketBackend):
+            wait = self.backend.update(self.key, take)
+        else:
+            wait = await asyncio.to_thread(self.backend.update, self.key, take)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def penalize(self, retry_after: float | None = None) -> float:
+        """Slow the bucket down after throttling; returns the new rate multiplier."""
+        return self.backend.update(self.key, self._penalize(retry_after))
+
+    def observe(self, status_code: int, retry_after: str | None = None) -> None:
+        if status_code in self.THROTTLE_STATUSES:
+            scale = self.penalize(parse_retry_after(retry_after))
+            logger.warning("rate_limit.throttled", key=self.key, status=status_code, rate=round(self.rate * scale, 3))
+
+
+class HostRateLimiter:
+    """One token bucket per upstream host, optionally shared across processes via ``backend``."""
+
+    def __init__(self, rate: float = 1.0, capacity: int = 2, backend: Any = None):
         self.rate = rate
         self.capacity = capacity
-        self.tokens = capacity
-        self.updated_at = time.monotonic()
+        self.backend = backend or LocalBucketBackend()
+        self._buckets: dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> RateLimiter:
+        key = (urlsplit(host).hostname or host) if "://" in host else host
+        with self._lock:
+            limiter = self._buckets.get(key)
+            if limiter is None:
+                limiter = self._buckets[key] = RateLimiter(self.rate, self.capacity, backend=self.backend, key=key)
+            return limiter
+
+    def acquire(self, host: str) -> None:
+        """Block until a request to ``host`` (hostname or URL) is allowed."""
+        self.bucket(host).acquire()
+
+    async def acquire_async(self, host: str) -> None:
+        await self.bucket(host).acquire_async()
+
+    def httpx_hook(self, request: httpx.Request) -> None:
+        """``event_hooks={"request": [...]}`` adapter for httpx clients."""
+        self.acquire(request.url.host)
+
+    def httpx_response_hook(self, response: httpx.Response) -> None:
+        """``event_hooks={"response": [...]}``: back off the host on 429/503."""
+        self.bucket(response.request.url.host).observe(response.status_code, response.headers.get("Retry-After"))
+
+    async def httpx_async_hook(self, request: httpx.Request) -> None:
+        """Request hook for ``httpx.AsyncClient``."""
+        await self.acquire_async(request.url.host)
 
-    def acquire(self) -> None:
-        now = time.monotonic()
-        elapsed = now - self.updated_at
-        self.updated_at = now
-        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
-        if self.tokens < 1:
-            sleep_for = (1 - self.tokens) / self.rate
-            time.sleep(sleep_for)
-            self.tokens = 0
-        self.tokens -= 1
+    async def httpx_async_response_hook(self, response: httpx.Response) -> None:
+        self.httpx_response_hook(response)
 
 
 class HttpError(Exception):
@@ -81,6 +196,7 @@ class HttpClient:
             raise HttpError(str(exc)) from exc
 
         if self._should_retry_status(resp.status_code):
+            self.rate_limiter.observe(resp.status_code, resp.headers.get("Retry-After"))
             raise HttpError(f"retryable status {resp.status_code}")
         return HttpResponse(
             status_code=resp.status_code,
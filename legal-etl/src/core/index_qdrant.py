@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import os
-from typing import Iterable, Sequence
+from typing import Any, Iterable, Sequence
 
 import structlog
 from qdrant_client import QdrantClient
@@ -11,6 +11,108 @@ from .schema import Chunk
 
 logger = structlog.get_logger()
 
+# BGE-M3 hibrit koleksiyonlarında isimli vektörler
+DENSE_VECTOR = "dense"
+SPARSE_VECTOR = "sparse"
+COLBERT_VECTOR = "colbert"
+FUSIONS = ("rrf", "dbsf")
+
+
+def named_vectors_config(
+    dim: int,
+    colbert_dim: int | None = None,
+    on_disk: bool = False,
+    quantization: qm.QuantizationConfig | None = None,
+) -> tuple[dict[str, qm.VectorParams], dict[str, qm.SparseVectorParams]]:
+    """
+    ``vectors_config`` / ``sparse_vectors_config`` for a dense + sparse
+    (+ optional ColBERT) collection. The ColBERT vector is only used to rerank
+    prefetched candidates, so its HNSW graph is disabled (``m=0``) and it is
+    kept on disk.
+    """
+    vectors = {
+        DENSE_VECTOR: qm.VectorParams(
+            size=dim,
+            distance=qm.Distance.COSINE,
+            on_disk=on_disk,
+            quantization_config=quantization,
+        )
+    }
+    if colbert_dim:
+        vectors[COLBERT_VECTOR] = qm.VectorParams(
+            size=colbert_dim,
+            distance=qm.Distance.COSINE,
+            on_disk=True,
+            multivector_config=qm.MultiVectorConfig(comparator=qm.MultiVectorComparator.MAX_SIM),
+            hnsw_config=qm.HnswConfigDiff(m=0),
+        )
+    sparse = {SPARSE_VECTOR: qm.SparseVectorParams(index=qm.SparseIndexParams(on_disk=on_disk))}
+    return vectors, sparse
+
+
+def to_point_vector(vector: Sequence[float] | dict[str, Any]) -> list[float] | dict[str, Any]:
+    """Plain dense list, or ``{"dense", "sparse", "colbert"}`` from ``Embedder.embed_hybrid``."""
+    if not isinstance(vector, dict):
+        return list(vector)
+    out: dict[str, Any] = {}
+    for name, value in vector.items():
+        if value is None:
+            continue
+        if name == SPARSE_VECTOR and isinstance(value, dict):
+            out[name] = qm.SparseVector(indices=list(value["indices"]), values=list(value["values"]))
+        else:
+            out[name] = value
+    return out
+
+
+def hybrid_query(
+    client: QdrantClient,
+    collection: str,
+    encoded: dict[str, Any],
+    limit: int = 10,
+    prefetch_limit: int = 100,
+    fusion: str = "rrf",
+    query_filter: qm.Filter | None = None,
+    with_payload: bool | Sequence[str] = True,
+) -> list[qm.ScoredPoint]:
+    """
+    One round trip: dense and sparse candidates are prefetched server-side and
+    fused with RRF or DBSF; when ``encoded`` has a ``colbert`` multi-vector the
+    fused candidates are reranked with MaxSim on it.
+    """
+    if fusion not in FUSIONS:
+        raise ValueError(f"unknown fusion: {fusion} (choose from {', '.join(FUSIONS)})")
+    prefetch = [qm.Prefetch(query=encoded[DENSE_VECTOR], using=DENSE_VECTOR, limit=prefetch_limit, filter=query_filter)]
+    if encoded.get(SPARSE_VECTOR):
+        sparse = encoded[SPARSE_VECTOR]
+        prefetch.append(
+            qm.Prefetch(
+                query=qm.SparseVector(indices=list(sparse["indices"]), values=list(sparse["values"])),
+                using=SPARSE_VECTOR,
+                limit=prefetch_limit,
+                filter=query_filter,
+            )
+        )
+    fused = qm.FusionQuery(fusion=qm.Fusion.RRF if fusion == "rrf" else qm.Fusion.DBSF)
+    if encoded.get(COLBERT_VECTOR):
+        return client.query_points(
+            collection_name=collection,
+            prefetch=[qm.Prefetch(prefetch=prefetch, query=fused, limit=prefetch_limit)],
+            query=encoded[COLBERT_VECTOR],
+            using=COLBERT_VECTOR,
+            limit=limit,
+            with_payload=with_payload,
+            with_vectors=False,
+        ).points
+    return client.query_points(
+        collection_name=collection,
+        prefetch=prefetch,
+        query=fused,
+        limit=limit,
+        with_payload=with_payload,
+        with_vectors=False,
+    ).points
+
 
 class QdrantIndexer:
     def __init__(self, url: str | None = None, collection: str = "legal_chunks_v1") -> None:
@@ -18,25 +120,45 @@ class QdrantIndexer:
         self.collection = collection
         self.client = QdrantClient(self.url)
 
-    def ensure_collection(self, vector_size: int = 1024) -> None:
+    def ensure_collection(self, vector_size: int = 1024, sparse: bool = False, colbert_size: int | None = None) -> None:
+        """Single unnamed dense vector, or named dense/sparse(/colbert) vectors when ``sparse``/``colbert_size`` is set."""
         if self.client.collection_exists(self.collection):
             return
-        self.client.recreate_collection(
-            collection_name=self.collection,
-            vectors_config=qm.VectorParams(size=vector_size, distance=qm.Distance.COSINE),
+        if sparse or colbert_size:
+            vectors, sparse_vectors = named_vectors_config(vector_size, colbert_dim=colbert_size)
+            self.client.create_collection(
+                collection_name=self.collection,
+                vectors_config=vectors,
+                sparse_vectors_config=sparse_vectors,
+            )
+        else:
+            self.client.create_collection(
+                collection_name=self.collection,
+                vectors_config=qm.VectorParams(size=vector_size, distance=qm.Distance.COSINE),
+            )
+        logger.info(
+            "qdrant.collection_created",
+            collection=self.collection,
+            vector_size=vector_size,
+            sparse=sparse,
+            colbert_size=colbert_size,
         )
-        logger.info("qdrant.collection_created", collection=self.collection, vector_size=vector_size)
 
-    def upsert(self, chunk_vectors: Sequence[tuple[Chunk, Sequence[float]]]) -> None:
+    def upsert(self, chunk_vectors: Sequence[tuple[Chunk, Sequence[float] | dict[str, Any]]]) -> None:
         if not chunk_vectors:
             return
-        self.ensure_collection(len(chunk_vectors[0][1]))
+        first = chunk_vectors[0][1]
+        if isinstance(first, dict):
+            colbert = first.get(COLBERT_VECTOR)
+            self.ensure_collection(len(first[DENSE_VECTOR]), sparse=True, colbert_size=len(colbert[0]) if colbert else None)
+        else:
+            self.ensure_collection(len(first))
         points = []
         for chunk, vector in chunk_vectors:
             points.append(
                 qm.PointStruct(
                     id=chunk.chunk_id,
-                    vector=vector,
+                    vector=to_point_vector(vector),
                     payload={
                         **chunk.payload,
                         "chunk_id": chunk.chunk_id,
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Optional
+
+import structlog
+
+if TYPE_CHECKING:
+    from .state import BaseStateStore
+
+logger = structlog.get_logger()
+
+
+class WindowPlanner:
+    """
+    Sizes listing windows from observed ``recordsTotal`` densities.
+
+    Every page-1 response is recorded as ``(window_start, window_end, total)``
+    (persisted through the state store when one is given). The density of a day
+    is taken from the narrowest observation covering it; the next window is
+    grown day by day until its estimated total reaches ``target_rows``. Days
+    without history use the most recently observed density, and with no
+    history at all the planner falls back to ``default_days``.
+    """
+
+    def __init__(
+        self,
+        store: "BaseStateStore | None" = None,
+        connector: str = "yargitay",
+        target_rows: int = 5000,
+        default_days: int = 7,
+        min_days: int = 1,
+        max_days: int = 92,
+    ) -> None:
+        self.store = store
+        self.connector = connector
+        self.target_rows = max(1, target_rows)
+        self.default_days = max(1, default_days)
+        self.min_days = max(1, min_days)
+        self.max_days = max(self.min_days, max_days)
+        # gün -> (gözlem aralığı gün sayısı, karar/gün); en dar gözlem kazanır
+        self._daily: dict[date, tuple[int, float]] = {}
+        self._recent: Optional[float] = None
+        self._loaded: set[tuple[date, date]] = set()
+
+    def load(self, start: date, end: date) -> None:
+        """Pull stored observations overlapping ``start..end`` into memory."""
+        if self.store is None or (start, end) in self._loaded:
+            return
+        self._loaded.add((start, end))
+        try:
+            rows = self.store.load_listing_totals(self.connector, start.isoformat(), end.isoformat())
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("listing_plan.load_failed", error=str(exc))
+            return
+        for row in rows:
+            self._apply(date.fromisoformat(row["window_start"]), date.fromisoformat(row["window_end"]), row["records_total"])
+        if rows:
+            logger.info("listing_plan.loaded", observations=len(rows), start=start.isoformat(), end=end.isoformat())
+
+    def observe(self, win_start: date, win_end: date, total: int) -> None:
+        self._apply(win_start, win_end, total)
+        if self.store is None:
+            return
+        try:
+            self.store.record_listing_total(self.connector, win_start.isoformat(), win_end.isoformat(), total)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("listing_plan.record_failed", error=str(exc))
+
+    def density(self, day: date) -> Optional[float]:
+        known = self._daily.get(day)
+        return known[1] if known else self._recent
+
+    def plan(self, cursor: date, end: date) -> date:
+        """Last day of the window starting at ``cursor`` (never past ``end``)."""
+        if not self._daily and self._recent is None:
+            return min(end, cursor + timedelta(days=self.default_days - 1))
+        estimated = 0.0
+        days = 0
+        day = cursor
+        while day <= end and days < self.max_days:
+            step = self.density(day) or 0.0
+            if days >= self.min_days and estimated + step > self.target_rows:
+                break
+            estimated += step
+            days += 1
+            day += timedelta(days=1)
+        return min(end, cursor + timedelta(days=max(days, 1) - 1))
+
+    def _apply(self, win_start: date, win_end: date, total: int) -> None:
+        span = (win_end - win_start).days + 1
+        if span <= 0 or total is None:
+            return
+        per_day = total / span
+        self._recent = per_day
+        day = win_start
+        while day <= win_end:
+            known = self._daily.get(day)
+            if known is None or span <= known[0]:
+                self._daily[day] = (span, per_day)
+            day += timedelta(days=1)
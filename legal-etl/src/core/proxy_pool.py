@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import structlog
+
+logger = structlog.get_logger()
+
+DIRECT = "direct"
+DEFAULT_PROBE_URL = "https://httpbin.org/ip"
+# Proxy'nin kendisi engellenmiş/yetkisiz: 403 (IP yasağı), 407 (proxy auth)
+BLOCKED_STATUSES = frozenset({403, 407})
+
+
+@dataclass
+class ProxyHealth:
+    proxy: str
+    requests: int = 0
+    successes: int = 0
+    throttled: int = 0  # 429
+    blocked: int = 0  # 403/407
+    server_errors: int = 0  # 5xx
+    timeouts: int = 0
+    errors: int = 0  # bağlantı/proxy hataları
+    latency_ewma: Optional[float] = None
+    failure_ewma: float = 0.0
+    consecutive_failures: int = 0
+    strikes: int = 0
+    cooldown_until: float = 0.0
+
+    def weight(self) -> float:
+        # Sağlıklı ve hızlı proxy'ler daha sık seçilir
+        health = (1.0 - self.failure_ewma) ** 2
+        latency = self.latency_ewma if self.latency_ewma is not None else 0.5
+        return max(health, 0.01) / max(latency, 0.05)
+
+
+def proxy_label(proxy: Optional[str]) -> str:
+    """``host:port`` without credentials, for logs and stats."""
+    if not proxy:
+        return DIRECT
+    parts = urlsplit(proxy)
+    return f"{parts.hostname}:{parts.port}" if parts.port else (parts.hostname or proxy)
+
+
+class ProxyPool:
+    """
+    One pooled ``httpx.Client`` per proxy with rolling health.
+
+    ``acquire()`` picks a proxy by weight (low failure EWMA, low latency EWMA)
+    among those not cooling down; ``report()`` feeds back the outcome of each
+    request. A 429 (honouring ``Retry-After``), a 403/407 or ``failure_threshold``
+    consecutive failures (5xx, timeouts, connection errors) puts the proxy in
+    cooldown, doubling per strike up to ``max_cooldown``; a success clears the
+    strikes. If every proxy is cooling down, ``acquire`` waits for the first to
+    come back. ``None`` in ``proxies`` stands for a direct connection.
+    """
+
+    def __init__(
+        self,
+        proxies: list[Optional[str]],
+        client_factory: Callable[[Optional[str]], httpx.Client],
+        alpha: float = 0.2,
+        failure_threshold: int = 3,
+        cooldown: float = 10.0,
+        max_cooldown: float = 600.0,
+    ) -> None:
+        self.proxies = list(dict.fromkeys(proxies)) or [None]
+        self.client_factory = client_factory
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._clients: dict[Optional[str], httpx.Client] = {}
+        self._health = {proxy: ProxyHealth(proxy_label(proxy)) for proxy in self.proxies}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.proxies)
+
+    def client(self, proxy: Optional[str]) -> httpx.Client:
+        with self._lock:
+            cli = self._clients.get(proxy)
+            if cli is None:
+                cli = self._clients[proxy] = self.client_factory(proxy)
+            return cli
+
+    def acquire(self) -> tuple[Optional[str], httpx.Client]:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                ready = [p for p in self.proxies if self._health[p].cooldown_until <= now]
+                if ready:
+                    weights = [self._health[p].weight() for p in ready]
+                    proxy = random.choices(ready, weights=weights, k=1)[0]
+                    break
+                wait_for = min(self._health[p].cooldown_until for p in self.proxies) - now
+            time.sleep(max(0.0, wait_for))
+        return proxy, self.client(proxy)
+
+    def report(
+        self,
+        proxy: Optional[str],
+        status: int | None,
+        latency: float,
+        timeout: bool = False,
+        retry_after: str | None = None,
+    ) -> None:
+        with self._lock:
+            health = self._health.get(proxy)
+            if health is None:
+                return
+            health.requests += 1
+            blocked = status in BLOCKED_STATUSES
+            failed = timeout or status is None or status == 429 or blocked or status >= 500
+            if timeout:
+                health.timeouts += 1
+            elif status is None:
+                health.errors += 1
+            elif status == 429:
+                health.throttled += 1
+            elif blocked:
+                health.blocked += 1
+            elif status >= 500:
+                health.server_errors += 1
+            else:
+                health.successes += 1
+                health.latency_ewma = (
+                    latency if health.latency_ewma is None else (1 - self.alpha) * health.latency_ewma + self.alpha * latency
+                )
+            health.failure_ewma = (1 - self.alpha) * health.failure_ewma + self.alpha * (1.0 if failed else 0.0)
+            if not failed:
+                health.consecutive_failures = 0
+                health.strikes = 0
+                return
+            health.consecutive_failures += 1
+            if status == 429 or blocked or health.consecutive_failures >= self.failure_threshold:
+                health.strikes += 1
+                pause = min(self.max_cooldown, self.cooldown * 2 ** (health.strikes - 1))
+                if retry_after:
+                    try:
+                        pause = max(pause, float(retry_after))
+                    except ValueError:
+                        pass
+                health.cooldown_until = time.monotonic() + pause
+                health.consecutive_failures = 0
+                logger.warning("proxy_pool.cooldown", proxy=health.proxy, status=status, seconds=round(pause, 1))
+
+    def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Send one request through a selected proxy and record the outcome."""
+        proxy, client = self.acquire()
+        t0 = time.monotonic()
+        try:
+            resp = client.request(method, url, **kwargs)
+        except httpx.TimeoutException:
+            self.report(proxy, None, time.monotonic() - t0, timeout=True)
+            raise
+        except Exception:
+            self.report(proxy, None, time.monotonic() - t0)
+            raise
+        self.report(proxy, resp.status_code, time.monotonic() - t0, retry_after=resp.headers.get("Retry-After"))
+        return resp
+
+    def stats(self) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            rows = []
+            for health in self._health.values():
+                row = asdict(health)
+                row["cooldown_left"] = round(max(0.0, health.cooldown_until - now), 1)
+                row["weight"] = round(health.weight(), 3)
+                del row["cooldown_until"]
+                rows.append(row)
+        return rows
+
+    def probe(self, url: str = DEFAULT_PROBE_URL, method: str = "GET", **kwargs: Any) -> list[dict[str, Any]]:
+        """Hit ``url`` once through every proxy (ignoring cooldown) and record the results."""
+        results = []
+        for proxy in self.proxies:
+            t0 = time.monotonic()
+            entry: dict[str, Any] = {"proxy": self._health[proxy].proxy}
+            try:
+                resp = self.client(proxy).request(method, url, **kwargs)
+                latency = time.monotonic() - t0
+                self.report(proxy, resp.status_code, latency, retry_after=resp.headers.get("Retry-After"))
+                entry.update(ok=resp.is_success, status=resp.status_code, latency=round(latency, 3), body=resp.text[:200])
+            except Exception as exc:  # noqa: BLE001
+                latency = time.monotonic() - t0
+                self.report(proxy, None, latency, timeout=isinstance(exc, httpx.TimeoutException))
+                entry.update(ok=False, status=None, latency=round(latency, 3), error=str(exc))
+            results.append(entry)
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for cli in clients:
+            try:
+                cli.close()
+            except Exception:
+                pass
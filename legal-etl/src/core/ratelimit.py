@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+try:  # ortak bütçe için opsiyonel; yoksa SQLite/yerel backend kullanılır
+    import redis  # type: ignore
+except Exception:  # noqa: BLE001
+    redis = None
+
+# (tokens, updated_at, scale): updated_at duvar saati; gelecekteyse kova o ana kadar duraklatılmış demektir
+BucketState = tuple[float, float, float]
+BucketFn = Callable[[Optional[BucketState], float], tuple[BucketState, Any]]
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds from a ``Retry-After`` header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LocalBucketBackend:
+    """In-process bucket state (one budget per process)."""
+
+    def __init__(self) -> None:
+        self._state: dict[str, BucketState] = {}
+        self._lock = threading.Lock()
+
+    def update(self, key: str, fn: BucketFn) -> Any:
+        with self._lock:
+            state, result = fn(self._state.get(key), time.time())
+            self._state[key] = state
+            return result
+
+
+class SqliteBucketBackend:
+    """
+    Bucket state in a SQLite file so every process on the box draws from the
+    same per-host budget. Each update is one ``BEGIN IMMEDIATE`` transaction,
+    which serializes concurrent reservations through SQLite's write lock.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    scale REAL NOT NULL
+                )
+                """
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def update(self, key: str, fn: BucketFn) -> Any:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at, scale FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            state, result = fn(tuple(row) if row else None, time.time())
+            conn.execute(
+                """
+                INSERT INTO rate_buckets (key, tokens, updated_at, scale) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    tokens = excluded.tokens, updated_at = excluded.updated_at, scale = excluded.scale
+                """,
+                (key, *state),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+
+class RedisBucketBackend:
+    """Bucket state in Redis hashes, updated with WATCH/MULTI optimistic transactions."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:", ttl: int = 3600) -> None:
+        if redis is None:
+            raise RuntimeError("redis package is required for redis:// rate limit backends")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def update(self, key: str, fn: BucketFn) -> Any:
+        name = self.prefix + key
+        result: list[Any] = []
+
+        def txn(pipe) -> None:
+            raw = pipe.hmget(name, "tokens", "updated_at", "scale")
+            state = None if raw[0] is None else tuple(float(v) for v in raw)
+            new_state, value = fn(state, time.time())
+            pipe.multi()
+            pipe.hset(name, mapping=dict(zip(("tokens", "updated_at", "scale"), new_state, strict=True)))
+            pipe.expire(name, self.ttl)
+            result[:] = [value]
+
+        self.client.transaction(txn, name)
+        return result[0]
+
+
+def open_rate_backend(url: str | Path | None = None):
+    """``None`` -> per-process, ``redis://...`` -> Redis, anything else -> SQLite file path."""
+    if url is None or str(url).strip() == "":
+        return LocalBucketBackend()
+    url = str(url)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBucketBackend(url)
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///") :]
+    return SqliteBucketBackend(url)
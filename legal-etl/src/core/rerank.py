@@ -0,0 +1,414 @@
+from __future__ import annotations
+
+import importlib.util
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+import structlog
+
+logger = structlog.get_logger()
+
+_TRUTHY = {"1", "true", "yes", "on"}
+
+# none|local|cohere|parallel|auto
+RERANK_PROVIDER = os.environ.get("RERANK_PROVIDER", "local").lower()
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "BAAI/bge-reranker-v2-m3")
+RERANK_TRUST_REMOTE_CODE = os.environ.get("RERANK_TRUST_REMOTE_CODE", "true").lower() in _TRUTHY
+COHERE_RERANK_MODEL = os.environ.get("COHERE_RERANK_MODEL", "rerank-v3.5")
+RERANK_DEVICE = os.environ.get("RERANK_DEVICE")  # None -> cuda varsa cuda, yoksa cpu
+RERANK_MAX_RESIDENT = int(os.environ.get("RERANK_MAX_RESIDENT", "2"))
+# Yüklenemeyen modelin yeniden denenmesi için bekleme (sn)
+RERANK_RETRY_SEC = float(os.environ.get("RERANK_RETRY_SEC", "300"))
+# Cross-encoder mikro-batch'leme: çift başına token sınırı, batch token bütçesi, batch üst sınırı
+RERANK_MAX_LENGTH = int(os.environ.get("RERANK_MAX_LENGTH", "512"))
+RERANK_TOKEN_BUDGET = int(os.environ.get("RERANK_TOKEN_BUDGET", "8192"))
+RERANK_MAX_BATCH = int(os.environ.get("RERANK_MAX_BATCH", "32"))
+
+Scored = list[tuple[int, float | None]]
+
+
+class BaseReranker:
+    def rerank(self, query: str, docs: list[str], top_n: int) -> list[int]:
+        raise NotImplementedError
+
+    def rerank_scored(self, query: str, docs: list[str], top_n: int) -> Scored:
+        """(index, skor) listesi döndürür; skor üretmeyen sağlayıcılarda skor None olur."""
+        return [(idx, None) for idx in self.rerank(query, docs, top_n)]
+
+
+class CrossEncoderScoringEngine:
+    """
+    Cross-encoder için uzunluk-gruplu, token bütçeli skorlama motoru.
+
+    Çiftler önce padding'siz tokenize edilip uzunluğa göre sıralanır, sonra
+    (batch boyu x en uzun çift) <= token_budget olacak şekilde mikro-batch'lere
+    paketlenir. Böylece kısa özetler 512 token'a kadar şişirilmez ve 50 tam
+    metin tek bir dev tensöre sığdırılmaya çalışılmaz. Skorlar orijinal
+    sıraya göre birebir döner.
+    """
+
+    LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(
+        self,
+        tokenizer,
+        model,
+        torch_mod,
+        device: str,
+        max_length: int = RERANK_MAX_LENGTH,
+        token_budget: int = RERANK_TOKEN_BUDGET,
+        max_batch: int = RERANK_MAX_BATCH,
+    ):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.torch = torch_mod
+        self.device = device
+        self.max_length = max_length
+        self.token_budget = max(token_budget, max_length)
+        self.max_batch = max(1, max_batch)
+        self._lock = threading.Lock()
+        self._histogram: dict[str, int] = {}
+        self._counters: dict[str, Any] = {
+            "batches": 0, "pairs": 0, "tokens": 0, "padded_tokens": 0, "total_ms": 0.0,
+        }
+
+    def _pack(
+        self, order: list[int], lengths: list[int], max_batch: int, token_budget: int
+    ) -> list[list[int]]:
+        batches: list[list[int]] = []
+        current: list[int] = []
+        for idx in order:
+            # order artan uzunlukta olduğundan batch'in en uzunu hep son eklenen
+            size = len(current) + 1
+            if current and (size > max_batch or size * lengths[idx] > token_budget):
+                batches.append(current)
+                current = []
+            current.append(idx)
+        if current:
+            batches.append(current)
+        return batches
+
+    def iter_scores(
+        self,
+        query: str,
+        docs: list[str],
+        max_length: int | None = None,
+        max_batch: int | None = None,
+    ):
+        """Mikro-batch'leri sırayla skorlar; her batch için (index, skor) çiftlerini yield eder."""
+        if not docs:
+            return
+        max_length = max_length or self.max_length
+        token_budget = max(self.token_budget, max_length)
+        encoded = self.tokenizer([query] * len(docs), docs, truncation=True, max_length=max_length)
+        keys = list(encoded.keys())
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+        order = sorted(range(len(docs)), key=lambda i: lengths[i])
+        for batch in self._pack(order, lengths, max_batch or self.max_batch, token_budget):
+            features = [{k: encoded[k][i] for k in keys} for i in batch]
+            inputs = self.tokenizer.pad(features, padding=True, return_tensors="pt")
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            t0 = time.perf_counter()
+            with self.torch.inference_mode():
+                logits = self.model(**inputs).logits.view(-1).tolist()
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            tokens = sum(lengths[i] for i in batch)
+            self._record(len(batch), tokens, len(batch) * lengths[batch[-1]], elapsed_ms)
+            yield list(zip(batch, (float(x) for x in logits), strict=True))
+
+    def score(
+        self,
+        query: str,
+        docs: list[str],
+        max_length: int | None = None,
+        max_batch: int | None = None,
+    ) -> list[float]:
+        scores: list[float] = [0.0] * len(docs)
+        for pairs in self.iter_scores(query, docs, max_length=max_length, max_batch=max_batch):
+            for idx, value in pairs:
+                scores[idx] = value
+        return scores
+
+    def _record(self, pairs: int, tokens: int, padded: int, elapsed_ms: float) -> None:
+        buckets = self.LATENCY_BUCKETS_MS
+        label = next((f"<={b}ms" for b in buckets if elapsed_ms <= b), f">{buckets[-1]}ms")
+        with self._lock:
+            self._histogram[label] = self._histogram.get(label, 0) + 1
+            self._counters["batches"] += 1
+            self._counters["pairs"] += pairs
+            self._counters["tokens"] += tokens
+            self._counters["padded_tokens"] += padded
+            self._counters["total_ms"] += elapsed_ms
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            padded = self._counters["padded_tokens"]
+            efficiency = round(self._counters["tokens"] / padded, 4) if padded else 0.0
+            return {
+                **self._counters,
+                "total_ms": round(self._counters["total_ms"], 1),
+                "padding_efficiency": efficiency,
+                "latency_histogram": dict(self._histogram),
+            }
+
+
+class LocalHFReranker(BaseReranker):
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        device: str | None = None,
+        trust_remote_code: bool | None = None,
+    ):
+        self.model_name = model_name
+        self.device = device or ("cuda" if _has_cuda() else "cpu")
+        if trust_remote_code is None:
+            trust_remote_code = RERANK_TRUST_REMOTE_CODE
+        self.trust_remote_code = trust_remote_code
+        self.available = False
+        self.engine: CrossEncoderScoringEngine | None = None
+        if not all(importlib.util.find_spec(name) for name in ("torch", "transformers")):
+            logger.warning("rerank.local_unavailable", reason="transformers/torch not installed")
+            return
+        try:
+            import torch  # type: ignore
+            from transformers import (  # type: ignore
+                AutoModelForSequenceClassification,
+                AutoTokenizer,
+            )
+
+            self.tokenizer = AutoTokenizer.from_pretrained(
+                self.model_name, trust_remote_code=trust_remote_code
+            )
+            self.model = AutoModelForSequenceClassification.from_pretrained(
+                self.model_name, trust_remote_code=trust_remote_code
+            )
+            self.model.to(self.device)
+            self.model.eval()
+            self.torch = torch
+            self.engine = CrossEncoderScoringEngine(
+                self.tokenizer, self.model, torch, self.device
+            )
+            self.available = True
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("rerank.local_load_failed", model=self.model_name, error=str(exc))
+
+    def score(
+        self,
+        query: str,
+        docs: list[str],
+        batch_size: int | None = None,
+        max_length: int = RERANK_MAX_LENGTH,
+    ) -> list[float]:
+        """Her doküman için cross-encoder skorunu (logit) döndürür; hata olursa boş liste."""
+        if not self.available or not docs or self.engine is None:
+            return []
+        try:
+            return self.engine.score(query, docs, max_length=max_length, max_batch=batch_size)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("rerank.local_failed", model=self.model_name, error=str(exc))
+            return []
+
+    def rerank_scored(self, query: str, docs: list[str], top_n: int) -> Scored:
+        scores = self.score(query, docs)
+        if not scores:
+            return []
+        order = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)
+        return [(i, scores[i]) for i in order[:top_n]]
+
+    def rerank(self, query: str, docs: list[str], top_n: int) -> list[int]:
+        return [idx for idx, _ in self.rerank_scored(query, docs, top_n)]
+
+
+def _has_cuda() -> bool:
+    try:
+        import torch  # type: ignore
+        return torch.cuda.is_available()
+    except Exception:
+        return False
+
+
+class CohereReranker(BaseReranker):
+    def __init__(self, api_key: str | None = None, model: str = COHERE_RERANK_MODEL):
+        api_key = api_key or os.environ.get("COHERE_API_KEY")
+        self.api_key = api_key
+        self.model = model
+        try:
+            import cohere  # type: ignore
+            self.client = cohere.ClientV2(api_key=api_key) if api_key else None
+        except Exception:
+            self.client = None
+
+    def rerank_scored(self, query: str, docs: list[str], top_n: int) -> Scored:
+        if not self.client or not self.api_key:
+            return []
+        try:
+            res = self.client.rerank(model=self.model, query=query, documents=docs, top_n=top_n)
+            return [(r.index, float(r.relevance_score)) for r in res.results]
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("rerank.cohere_failed", error=str(exc))
+            return []
+
+    def rerank(self, query: str, docs: list[str], top_n: int) -> list[int]:
+        return [idx for idx, _ in self.rerank_scored(query, docs, top_n)]
+
+
+class ParallelReranker(BaseReranker):
+    def __init__(self, api_key: str | None = None):
+        self.api_key = api_key or os.environ.get("PARALLEL_API_KEY")
+
+    def rerank(self, query: str, docs: list[str], top_n: int) -> list[int]:
+        # Placeholder: Parallel.ai entegrasyonu için API istemcisi burada eklenebilir.
+        return []
+
+
+class RerankerRegistry:
+    """
+    Süreç boyunca yaşayan reranker havuzu; (provider, model, device) anahtarlı.
+
+    Model ilk istekte yüklenir (lazy), RERANK_MAX_RESIDENT sınırını aşınca en
+    eski kullanılan model bellekten atılır (LRU). Yüklenemeyen model havuza
+    alınmaz; ``retry_after`` saniye boyunca aynı (kullanılamaz) örnek döner,
+    sonra yükleme yeniden denenir. Yükleme kilit dışında yapılır; aynı modeli
+    isteyen diğer thread'ler yüklemenin bitmesini bekler. Yükleme süresi ve hit/miss sayaçları
+    stats() ile okunur.
+    """
+
+    def __init__(
+        self, max_resident: int = RERANK_MAX_RESIDENT, retry_after: float = RERANK_RETRY_SEC
+    ):
+        self.max_resident = max(1, max_resident)
+        self.retry_after = max(0.0, retry_after)
+        self._models: OrderedDict[tuple[str, str, str], BaseReranker] = OrderedDict()
+        self._failed: dict[tuple[str, str, str], tuple[float, BaseReranker]] = {}
+        self._lock = threading.Lock()
+        self._counters: dict[str, Any] = {
+            "hits": 0, "misses": 0, "loads": 0, "failed_loads": 0, "evictions": 0, "load_sec": 0.0,
+        }
+        self._load_times: dict[str, float] = {}
+        self._loading: dict[tuple[str, str, str], threading.Event] = {}
+
+    @staticmethod
+    def _resolve_key(provider: str, model: str | None, device: str | None) -> tuple[str, str, str]:
+        provider = (provider or "").lower()
+        if provider == "local":
+            if not device or device == "auto":
+                device = RERANK_DEVICE or ("cuda" if _has_cuda() else "cpu")
+            return provider, model or RERANK_MODEL, device
+        if provider == "cohere":
+            return provider, model or COHERE_RERANK_MODEL, "remote"
+        return provider, model or "", "remote"
+
+    @staticmethod
+    def _build(key: tuple[str, str, str]) -> BaseReranker | None:
+        provider, model, device = key
+        if provider == "local":
+            return LocalHFReranker(model_name=model, device=device)
+        if provider == "cohere":
+            return CohereReranker(model=model)
+        if provider == "parallel":
+            return ParallelReranker()
+        return None
+
+    def get(
+        self, provider: str, model: str | None = None, device: str | None = None
+    ) -> BaseReranker | None:
+        key = self._resolve_key(provider, model, device)
+        while True:
+            with self._lock:
+                cached = self._models.get(key)
+                if cached is not None:
+                    self._models.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return cached
+                failed = self._failed.get(key)
+                if failed is not None and time.monotonic() - failed[0] < self.retry_after:
+                    return failed[1]
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    self._counters["misses"] += 1
+                    break
+            # Aynı model başka bir thread'de yükleniyor; bitince havuzdan okunur
+            loading.wait()
+        # Yükleme kilit dışında: soğuk model diğer modellerin cache hit'lerini bekletmez
+        try:
+            t0 = time.time()
+            instance = self._build(key)
+            elapsed = time.time() - t0
+            if instance is None:
+                return None
+            with self._lock:
+                return self._admit(key, instance, elapsed)
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            loading.set()
+
+    def _admit(
+        self, key: tuple[str, str, str], instance: BaseReranker, elapsed: float
+    ) -> BaseReranker:
+        """Yüklenen örneği havuza (veya başarısızsa ``_failed``'a) yazar; ``_lock`` altında."""
+        self._counters["loads"] += 1
+        self._counters["load_sec"] += elapsed
+        self._load_times["/".join(key)] = round(elapsed, 3)
+        if getattr(instance, "available", True) is False:
+            # kalıcı olarak önbelleğe alma: retry_after sonra yeniden denenir
+            self._counters["failed_loads"] += 1
+            self._failed[key] = (time.monotonic(), instance)
+            logger.warning("rerank.load_failed", key="/".join(key), retry_after=self.retry_after)
+            return instance
+        self._failed.pop(key, None)
+        logger.info("rerank.loaded", key="/".join(key), seconds=round(elapsed, 1))
+        self._models[key] = instance
+        while len(self._models) > self.max_resident:
+            old_key, _ = self._models.popitem(last=False)
+            self._counters["evictions"] += 1
+            logger.info("rerank.evicted", key="/".join(old_key))
+        return instance
+
+    def pick(self, provider: str | None = None) -> BaseReranker | None:
+        """RERANK_PROVIDER seçimi; ``auto`` sırasıyla local, cohere, parallel dener."""
+        choice = (provider or RERANK_PROVIDER).lower()
+        if choice in {"local", "cohere", "parallel"}:
+            return self.get(choice)
+        if choice == "auto":
+            for name in ("local", "cohere", "parallel"):
+                candidate = self.get(name)
+                if getattr(candidate, "available", True) is False:
+                    continue
+                return candidate
+        return None
+
+    def warmup(
+        self, provider: str | None = None, model: str | None = None, device: str | None = None
+    ) -> BaseReranker | None:
+        """Başlangıçta modeli önceden yükler; ilk soruda bekleme olmaz."""
+        provider = provider or RERANK_PROVIDER
+        if provider in {"none", "auto"}:
+            return self.pick(provider)
+        return self.get(provider, model=model, device=device)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+            self._failed.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self._counters["hits"] + self._counters["misses"]
+            engines = {
+                "/".join(k): m.engine.stats()
+                for k, m in self._models.items()
+                if getattr(m, "engine", None) is not None
+            }
+            return {
+                **self._counters,
+                "load_sec": round(self._counters["load_sec"], 3),
+                "hit_rate": round(self._counters["hits"] / total, 4) if total else 0.0,
+                "resident": ["/".join(k) for k in self._models.keys()],
+                "load_times": dict(self._load_times),
+                "engines": engines,
+            }
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import structlog
+
+from .tokenize import ascii_fold
+
+logger = structlog.get_logger()
+
+DEFAULT_PATH = Path(__file__).resolve().parents[2] / ".cache" / "rerank_scores.sqlite"
+
+
+class RerankScoreCache:
+    """
+    Persistent rerank score cache (SQLite).
+
+    Keyed by (reranker id, normalized query hash, passage sha1). Eval loops
+    rerank the same summaries/passages for the same questions over and over,
+    so only the passages missing from the cache go to the model. Once the row
+    count exceeds ``max_rows`` the least recently used rows are dropped down
+    to 90% of it.
+    """
+
+    def __init__(self, path: str | Path | None = None, max_rows: int = 500_000) -> None:
+        self.path = Path(path or DEFAULT_PATH)
+        self.max_rows = max(1000, int(max_rows))
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._rows = 0
+        self._counters: dict[str, int] = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rerank_scores (
+                    model TEXT NOT NULL,
+                    query_hash TEXT NOT NULL,
+                    passage_hash TEXT NOT NULL,
+                    score REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, query_hash, passage_hash)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_rerank_scores_lru ON rerank_scores(last_used)"
+            )
+            self._rows = conn.execute("SELECT COUNT(*) FROM rerank_scores").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        # Önce katlanır: "İ".lower() birleşik nokta bırakır ("i̇")
+        return " ".join(ascii_fold(query or "").lower().split())
+
+    @staticmethod
+    def _sha1(text: str) -> str:
+        return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, query: str, passages: list[str]) -> dict[int, float]:
+        """Scores of the cached passages as ``{index: score}``."""
+        if not passages:
+            return {}
+        qh = self._sha1(self.normalize_query(query))
+        hashes = [self._sha1(p) for p in passages]
+        found: dict[str, float] = {}
+        with self._lock:
+            try:
+                conn = self._connect()
+                uniq = list(dict.fromkeys(hashes))
+                for start in range(0, len(uniq), 500):
+                    part = uniq[start : start + 500]
+                    marks = ",".join("?" * len(part))
+                    rows = conn.execute(
+                        "SELECT passage_hash, score FROM rerank_scores "
+                        f"WHERE model = ? AND query_hash = ? AND passage_hash IN ({marks})",
+                        [model, qh, *part],
+                    ).fetchall()
+                    found.update({ph: sc for ph, sc in rows})
+                if found:
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE rerank_scores SET last_used = ? "
+                        "WHERE model = ? AND query_hash = ? AND passage_hash = ?",
+                        [(now, model, qh, ph) for ph in found],
+                    )
+                    conn.commit()
+            except sqlite3.Error as exc:
+                logger.warning("rerank_cache.read_failed", error=str(exc))
+                found = {}
+            hits = {idx: found[h] for idx, h in enumerate(hashes) if h in found}
+            self._counters["hits"] += len(hits)
+            self._counters["misses"] += len(passages) - len(hits)
+        return hits
+
+    def put_many(self, model: str, query: str, items: list[tuple[str, float]]) -> None:
+        if not items:
+            return
+        qh = self._sha1(self.normalize_query(query))
+        now = time.time()
+        rows = [(model, qh, self._sha1(text), float(score), now) for text, score in items]
+        with self._lock:
+            try:
+                conn = self._connect()
+                # Sayaç yalnızca gerçekten eklenen satırları sayar; var olanlar yerinde güncellenir
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT OR IGNORE INTO rerank_scores "
+                    "(model, query_hash, passage_hash, score, last_used) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                inserted = conn.total_changes - before
+                if inserted < len(rows):
+                    conn.executemany(
+                        "UPDATE rerank_scores SET score = ?, last_used = ? "
+                        "WHERE model = ? AND query_hash = ? AND passage_hash = ?",
+                        [(score, used, m, q, ph) for m, q, ph, score, used in rows],
+                    )
+                self._rows += inserted
+                self._counters["writes"] += len(rows)
+                if self._rows > self.max_rows:
+                    self._evict(conn)
+                conn.commit()
+            except sqlite3.Error as exc:
+                logger.warning("rerank_cache.write_failed", error=str(exc))
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        self._rows = conn.execute("SELECT COUNT(*) FROM rerank_scores").fetchone()[0]
+        excess = self._rows - int(self.max_rows * 0.9)
+        if excess <= 0:
+            return
+        conn.execute(
+            "DELETE FROM rerank_scores WHERE (model, query_hash, passage_hash) IN ("
+            "SELECT model, query_hash, passage_hash FROM rerank_scores ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._rows -= excess
+        self._counters["evictions"] += excess
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / total, 4) if total else 0.0,
+                "rows": self._rows,
+            }
+
+    def stats_since(self, before: dict[str, Any]) -> dict[str, Any]:
+        """Counters accumulated since ``before`` (one pipeline run)."""
+        now = self.stats()
+        delta = {k: now[k] - before.get(k, 0) for k in ("hits", "misses", "writes", "evictions")}
+        total = delta["hits"] + delta["misses"]
+        delta["hit_rate"] = round(delta["hits"] / total, 4) if total else 0.0
+        delta["rows"] = now["rows"]
+        return delta
+
+
+def rerank_with_cache(
+    cache: RerankScoreCache,
+    model: str,
+    score: Callable[[str, list[str]], list[float]],
+    query: str,
+    texts: list[str],
+    top_n: int,
+) -> list[tuple[int, float]]:
+    """
+    Top ``top_n`` ``(index, score)`` pairs for ``texts``: cached scores are
+    reused and ``score(query, misses)`` is called only for the misses. An empty
+    result from ``score`` (model failure) returns ``[]`` so callers can fall back.
+    """
+    scores = cache.get_many(model, query, texts)
+    miss_idx = [i for i in range(len(texts)) if i not in scores]
+    if miss_idx:
+        fresh = score(query, [texts[i] for i in miss_idx])
+        if not fresh:
+            return []
+        scores.update(zip(miss_idx, fresh, strict=True))
+        cache.put_many(model, query, [(texts[i], scores[i]) for i in miss_idx])
+    order = sorted(range(len(texts)), key=lambda i: scores[i], reverse=True)[:top_n]
+    return [(i, scores[i]) for i in order]
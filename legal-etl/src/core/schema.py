@@ -27,6 +27,10 @@ class RawDoc(BaseModel):
     content_html: str | None = None
     content_pdf: bytes | None = None
     fetched_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # Koşullu istek yanıtı: validator'lar ve 304 bilgisi
+    etag: str | None = None
+    last_modified: str | None = None
+    not_modified: bool = False
 
 
 class CanonDoc(BaseModel):
@@ -1,33 +1,480 @@
 from __future__ import annotations
 
+import atexit
 import json
+import os
+import socket
 import sqlite3
+import threading
+import time
 import uuid
+from abc import ABC, abstractmethod
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Optional
 
+import structlog
+
+logger = structlog.get_logger()
+
 DEFAULT_DB = Path(__file__).resolve().parents[2] / "state.db"
+DEFAULT_LEASE_SECONDS = 900
+DEFAULT_MAX_ATTEMPTS = 5
+QUEUE_STATUSES = ("PENDING", "IN_PROGRESS", "RETRY", "DONE", "FAILED")
 
+# Sahibi çökmüş (lease'i dolmuş) öğe; yeniden alınması bir deneme sayılır
+_EXPIRED_CLAUSE = """
+    (status = 'IN_PROGRESS' AND COALESCE(lease_expires_at, datetime(updated_at, :lease)) <= CURRENT_TIMESTAMP)
+"""
+_DUE_CLAUSE = f"""
+    status = 'PENDING'
+    OR (status = 'RETRY' AND (next_attempt_at IS NULL OR datetime(next_attempt_at) <= CURRENT_TIMESTAMP))
+    OR {_EXPIRED_CLAUSE}
+"""
 
-class StateStore:
-    """Lightweight SQLite-based run/progress tracker."""
 
-    def __init__(self, db_path: str | Path | None = None) -> None:
-        self.db_path = Path(db_path or DEFAULT_DB)
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+def is_postgres_url(target: str | Path | None) -> bool:
+    return str(target or "").startswith(("postgres://", "postgresql://"))
+
+
+def open_state_store(target: str | Path | None = None, **kwargs: Any) -> "BaseStateStore":
+    """
+    ``postgresql://...`` -> PostgresStateStore, anything else -> SQLite file path.
+
+    ``target`` defaults to the STATE_DB_URL environment variable, then ``state.db``.
+    """
+    target = target or os.getenv("STATE_DB_URL") or None
+    if is_postgres_url(target):
+        from .state_pg import PostgresStateStore
+
+        return PostgresStateStore(str(target), **kwargs)
+    return StateStore(target, **kwargs)
+
+
+class BaseStateStore(ABC):
+    """
+    Run/progress/queue bookkeeping shared by the SQLite and Postgres backends.
+
+    Subclasses provide the connection (one persistent connection per thread)
+    and the SQL. This base class owns the write-behind buffer: with
+    ``write_behind=True`` heartbeats, progress, error counts and queue
+    acks/retries are kept in memory and written in one transaction every
+    ``flush_every`` items or ``flush_interval`` seconds (and on ``flush()``,
+    ``close()``, ``finish_run()`` or interpreter exit). Buffered queue
+    transitions are applied together with the progress they belong to; if the
+    process dies before a flush, those items keep their lease and are
+    reclaimed, so work is redone rather than lost.
+    """
+
+    def __init__(
+        self,
+        worker_id: str | None = None,
+        write_behind: bool = False,
+        flush_every: int = 50,
+        flush_interval: float = 2.0,
+    ) -> None:
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        # Thread başına kalıcı bağlantı; her çağrıda connect/close yapılmaz
+        self._local = threading.local()
+        self._conns: list[Any] = []
+        self._conns_lock = threading.Lock()
+        self.write_behind = write_behind
+        self.flush_every = max(1, int(flush_every))
+        self.flush_interval = float(flush_interval)
+        self._pending_lock = threading.RLock()
+        self._reset_pending()
+        self._last_flush = time.monotonic()
         self._ensure_schema()
+        if write_behind:
+            atexit.register(self._flush_at_exit)
+
+    # ------------------------------------------------------------ connection
+    @abstractmethod
+    def _open_connection(self) -> Any:
+        """Open a new backend connection for the calling thread."""
+
+    def _connection(self) -> Any:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
 
     @contextmanager
     def _connect(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self._connection()
         try:
             yield conn
             conn.commit()
-        finally:
-            conn.close()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def close(self) -> None:
+        self.flush()
+        with self._conns_lock:
+            for conn in self._conns:
+                try:
+                    conn.close()
+                except Exception:  # noqa: BLE001
+                    pass
+            self._conns.clear()
+        self._local = threading.local()
+
+    @abstractmethod
+    def _ensure_schema(self) -> None: ...
+
+    # ------------------------------------------------------------ write-behind
+    def _reset_pending(self) -> None:
+        self._pending_runs: dict[str, dict[str, Any]] = {}
+        self._pending_progress: dict[str, tuple] = {}
+        self._pending_done: list[int] = []
+        self._pending_retry: list[tuple] = []
+        self._pending_fingerprints: dict[tuple[str, str], tuple] = {}
+        self._pending_items = 0
+
+    def _pending_run(self, run_id: str) -> dict[str, Any]:
+        run = self._pending_runs.get(run_id)
+        if run is None:
+            run = self._pending_runs[run_id] = {"processed": 0, "errors": 0, "stage": None, "last_item_key": None}
+        return run
+
+    def _maybe_flush(self) -> None:
+        if (
+            self._pending_items >= self.flush_every
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered updates in a single transaction (no-op when nothing is pending)."""
+        with self._pending_lock:
+            if not (
+                self._pending_runs
+                or self._pending_progress
+                or self._pending_done
+                or self._pending_retry
+                or self._pending_fingerprints
+            ):
+                self._last_flush = time.monotonic()
+                return
+            with self._connect() as conn:
+                for connector, progress in self._pending_progress.items():
+                    self._write_progress(conn, connector, *progress)
+                for run_id, run in self._pending_runs.items():
+                    self._write_run(conn, run_id, **run)
+                self._apply_ack(conn, self._pending_done)
+                self._apply_retry(conn, self._pending_retry)
+                if self._pending_fingerprints:
+                    self._write_fingerprints(conn, list(self._pending_fingerprints.values()))
+            self._reset_pending()
+            self._last_flush = time.monotonic()
+
+    def _flush_at_exit(self) -> None:
+        try:
+            self.flush()
+        except Exception:  # noqa: BLE001
+            # Süreç kapanırken yükseltmenin anlamı yok; kaybolan güncellemeler görünür kalsın
+            logger.exception("state.flush_at_exit_failed", pending_items=self._pending_items)
+
+    # ----------------------------------------------------------------- runs
+    @abstractmethod
+    def start_run(
+        self,
+        connector: str,
+        window_start: datetime,
+        window_end: datetime,
+        params: dict[str, Any],
+    ) -> str: ...
+
+    @abstractmethod
+    def mark_stale_runs(self, connector: str, stale_after: int = 120) -> None: ...
+
+    def heartbeat(
+        self,
+        run_id: str,
+        stage: str,
+        last_item_key: str | None = None,
+    ) -> None:
+        if self.write_behind:
+            with self._pending_lock:
+                run = self._pending_run(run_id)
+                run["stage"] = stage
+                run["last_item_key"] = last_item_key or run["last_item_key"]
+            self._maybe_flush()
+            return
+        with self._connect() as conn:
+            self._write_run(conn, run_id, stage=stage, last_item_key=last_item_key)
+
+    def mark_item_processed(
+        self,
+        connector: str,
+        run_id: str,
+        shard_key: str,
+        item_key: str,
+        decision_date: str | None,
+        doc_id: str | None,
+        inc_count: int = 1,
+    ) -> None:
+        if self.write_behind:
+            with self._pending_lock:
+                self._pending_progress[connector] = (shard_key, decision_date, doc_id, item_key)
+                run = self._pending_run(run_id)
+                run["processed"] += inc_count
+                run["stage"] = "processing"
+                run["last_item_key"] = item_key
+                self._pending_items += 1
+            self._maybe_flush()
+            return
+        with self._connect() as conn:
+            self._write_progress(conn, connector, shard_key, decision_date, doc_id, item_key)
+            self._write_run(conn, run_id, processed=inc_count, stage="processing", last_item_key=item_key)
+
+    def record_error(self, run_id: str, note: str | None = None) -> None:
+        if self.write_behind:
+            with self._pending_lock:
+                self._pending_run(run_id)["errors"] += 1
+            self._maybe_flush()
+            return
+        with self._connect() as conn:
+            self._write_run(conn, run_id, errors=1)
+
+    @abstractmethod
+    def _write_run(
+        self,
+        conn: Any,
+        run_id: str,
+        processed: int = 0,
+        errors: int = 0,
+        stage: str | None = None,
+        last_item_key: str | None = None,
+    ) -> None:
+        """Add counters, set stage/last key (when given) and touch last_heartbeat."""
+
+    @abstractmethod
+    def _write_progress(
+        self,
+        conn: Any,
+        connector: str,
+        shard_key: str,
+        decision_date: str | None,
+        doc_id: str | None,
+        item_key: str,
+    ) -> None: ...
+
+    @abstractmethod
+    def finish_run(self, run_id: str, status: str = "completed") -> None: ...
+
+    @abstractmethod
+    def load_progress(self, connector: str) -> dict[str, Any] | None: ...
+
+    @abstractmethod
+    def save_listing_checkpoint(self, connector: str, shard_key: str, listed_until: str, done: bool) -> None:
+        """Record that the shard's listing is complete up to ``listed_until`` (ISO date)."""
+
+    @abstractmethod
+    def load_listing_checkpoint(self, connector: str, shard_key: str) -> dict[str, Any] | None:
+        """``{"listed_until": ISO date, "done": bool}`` or None."""
+
+    @abstractmethod
+    def record_listing_total(self, connector: str, window_start: str, window_end: str, records_total: int) -> None:
+        """Remember the ``recordsTotal`` a listing window reported (ISO dates)."""
+
+    @abstractmethod
+    def load_listing_totals(self, connector: str, start: str, end: str) -> list[dict[str, Any]]:
+        """Recorded windows overlapping ``start..end`` as ``window_start/window_end/records_total`` dicts."""
+
+    # ---------------------------------------------------------- fingerprints
+    def save_fingerprint(
+        self,
+        connector: str,
+        item_key: str,
+        doc_id: str,
+        checksum: str,
+        raw_hash: str | None = None,
+        etag: str | None = None,
+        last_modified: str | None = None,
+        chunk_hashes: dict[str, str] | None = None,
+    ) -> None:
+        """Remember what was ingested for ``doc_id`` so re-runs can skip unchanged documents."""
+        row = (doc_id, connector, item_key, etag, last_modified, raw_hash, checksum, json.dumps(chunk_hashes or {}))
+        if self.write_behind:
+            with self._pending_lock:
+                self._pending_fingerprints[(connector, item_key)] = row
+                self._pending_items += 1
+            self._maybe_flush()
+            return
+        with self._connect() as conn:
+            self._write_fingerprints(conn, [row])
+
+    def load_fingerprint(self, connector: str, item_key: str) -> dict[str, Any] | None:
+        """Latest fingerprint for a listed item (buffered writes included), or None."""
+        with self._pending_lock:
+            row = self._pending_fingerprints.get((connector, item_key))
+        if row is not None:
+            keys = ("doc_id", "connector", "item_key", "etag", "last_modified", "raw_hash", "checksum", "chunk_hashes")
+            found = dict(zip(keys, row, strict=True))
+        else:
+            found = self._read_fingerprint(connector, item_key)
+            if found is None:
+                return None
+        if isinstance(found.get("chunk_hashes"), str):
+            found["chunk_hashes"] = json.loads(found["chunk_hashes"] or "{}")
+        return found
+
+    @abstractmethod
+    def _write_fingerprints(self, conn: Any, rows: list[tuple]) -> None:
+        """Upsert ``(doc_id, connector, item_key, etag, last_modified, raw_hash, checksum, chunk_hashes_json)`` rows."""
+
+    @abstractmethod
+    def _read_fingerprint(self, connector: str, item_key: str) -> dict[str, Any] | None: ...
+
+    # ---------------------------------------------------------------- queue
+    @abstractmethod
+    def enqueue_items(self, connector: str, window_key: str, refs: list[dict[str, Any]]) -> None: ...
+
+    def checkout_next_item(
+        self,
+        connector: str,
+        window_key: str,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> dict[str, Any] | None:
+        items = self.claim_batch(
+            connector, window_key, 1, lease_seconds=lease_seconds, max_attempts=max_attempts
+        )
+        return items[0] if items else None
+
+    @abstractmethod
+    def claim_batch(
+        self,
+        connector: str,
+        window_key: str,
+        n: int,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        worker_id: str | None = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> list[dict[str, Any]]:
+        """
+        Atomically claim up to ``n`` due items under a lease: PENDING rows,
+        RETRY rows whose back-off elapsed and IN_PROGRESS rows whose lease
+        expired (crashed owner). Reclaiming an expired lease counts as an
+        attempt, and an item that would reach ``max_attempts`` that way is
+        marked FAILED instead, so a document that kills its worker cannot loop
+        forever. Payloads carry ``_queue_id`` and ``_attempts``.
+        """
+
+    @abstractmethod
+    def extend_leases(
+        self,
+        item_ids: list[int],
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        worker_id: str | None = None,
+    ) -> int:
+        """Push out the lease of items still owned by ``worker_id``; returns rows renewed."""
+
+    @abstractmethod
+    def release_items(self, item_ids: list[int]) -> None:
+        """Put claimed-but-unfinished items back to PENDING (attempts unchanged)."""
+
+    def ack_batch(self, item_ids: list[int]) -> None:
+        """Mark items DONE and drop their leases in one transaction."""
+        if not item_ids:
+            return
+        with self._connect() as conn:
+            self._apply_ack(conn, item_ids)
+
+    def retry_batch(self, failures: list[tuple[int, str, int]], max_attempts: int) -> None:
+        """
+        Record ``(item_id, error, delay_seconds)`` failures in one transaction:
+        attempts+1, RETRY after the delay, or FAILED once ``max_attempts`` is hit.
+        """
+        if not failures:
+            return
+        with self._connect() as conn:
+            self._apply_retry(conn, [self._retry_row(*failure, max_attempts) for failure in failures])
+
+    def _retry_row(self, item_id: int, error: str, delay_seconds: int, max_attempts: int) -> tuple:
+        next_attempt = datetime.utcnow() + timedelta(seconds=delay_seconds)
+        return (max_attempts, self._timestamp(next_attempt), error[:500], item_id)
+
+    @staticmethod
+    def _timestamp(value: datetime) -> Any:
+        """Naive UTC datetime -> backend parameter."""
+        return value.isoformat()
+
+    @abstractmethod
+    def _apply_ack(self, conn: Any, item_ids: list[int]) -> None: ...
+
+    @abstractmethod
+    def _apply_retry(self, conn: Any, rows: list[tuple]) -> None:
+        """``rows`` are ``(max_attempts, next_attempt_at, error, item_id)``."""
+
+    def mark_queue_done(self, item_id: int) -> None:
+        if self.write_behind:
+            with self._pending_lock:
+                self._pending_done.append(item_id)
+                self._pending_items += 1
+            self._maybe_flush()
+            return
+        self.ack_batch([item_id])
+
+    def mark_queue_retry(self, item_id: int, error: str, delay_seconds: int, max_attempts: int) -> None:
+        if self.write_behind:
+            with self._pending_lock:
+                self._pending_retry.append(self._retry_row(item_id, error, delay_seconds, max_attempts))
+                self._pending_items += 1
+            self._maybe_flush()
+            return
+        self.retry_batch([(item_id, error, delay_seconds)], max_attempts)
+
+    @abstractmethod
+    def queue_counts(self, connector: str, window_key: str) -> dict[str, int]: ...
+
+    def wait_for_work(self, connector: str, window_key: str, timeout: float) -> bool:
+        """
+        Block until new work may be available for the shard or ``timeout``
+        elapses. Backends without push notifications simply sleep and return
+        False; callers re-poll ``claim_batch`` either way.
+        """
+        time.sleep(max(0.0, timeout))
+        return False
+
+    @staticmethod
+    def _count_map(stats: dict[str, int]) -> dict[str, int]:
+        return {status: stats.get(status, 0) for status in QUEUE_STATUSES}
+
+
+class StateStore(BaseStateStore):
+    """Lightweight SQLite-based run/progress tracker."""
+
+    def __init__(
+        self,
+        db_path: str | Path | None = None,
+        worker_id: str | None = None,
+        write_behind: bool = False,
+        flush_every: int = 50,
+        flush_interval: float = 2.0,
+    ) -> None:
+        self.db_path = Path(db_path or DEFAULT_DB)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(
+            worker_id=worker_id,
+            write_behind=write_behind,
+            flush_every=flush_every,
+            flush_interval=flush_interval,
+        )
+
+    def _open_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA busy_timeout=30000;")
+        if self.write_behind:
+            conn.execute("PRAGMA synchronous=NORMAL;")
+        return conn
 
     def _ensure_schema(self) -> None:
         with self._connect() as conn:
@@ -63,6 +510,75 @@ class StateStore:
                 )
                 """
             )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingest_queue (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    connector TEXT NOT NULL,
+                    window_key TEXT NOT NULL,
+                    item_key TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'PENDING',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TEXT,
+                    last_error TEXT,
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    lease_owner TEXT,
+                    lease_expires_at TEXT,
+                    UNIQUE(connector, window_key, item_key)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_ingest_queue_lookup ON ingest_queue(connector, window_key, status)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS listing_checkpoints (
+                    connector TEXT NOT NULL,
+                    shard_key TEXT NOT NULL,
+                    listed_until TEXT NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (connector, shard_key)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS listing_density (
+                    connector TEXT NOT NULL,
+                    window_start TEXT NOT NULL,
+                    window_end TEXT NOT NULL,
+                    records_total INTEGER NOT NULL,
+                    observed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (connector, window_start, window_end)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS doc_fingerprints (
+                    doc_id TEXT PRIMARY KEY,
+                    connector TEXT NOT NULL,
+                    item_key TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    raw_hash TEXT,
+                    checksum TEXT NOT NULL,
+                    chunk_hashes TEXT NOT NULL DEFAULT '{}',
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_doc_fingerprints_item ON doc_fingerprints(connector, item_key)"
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(ingest_queue)")}
+            for column in ("lease_owner", "lease_expires_at"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE ingest_queue ADD COLUMN {column} TEXT")
 
     def start_run(
         self,
@@ -87,27 +603,6 @@ class StateStore:
                     json.dumps(params),
                 ),
             )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS ingest_queue (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    connector TEXT NOT NULL,
-                    window_key TEXT NOT NULL,
-                    item_key TEXT NOT NULL,
-                    payload TEXT NOT NULL,
-                    status TEXT NOT NULL DEFAULT 'PENDING',
-                    attempts INTEGER NOT NULL DEFAULT 0,
-                    next_attempt_at TEXT,
-                    last_error TEXT,
-                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(connector, window_key, item_key)
-                )
-                """
-            )
-            conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_ingest_queue_lookup ON ingest_queue(connector, window_key, status)"
-            )
         return run_id
 
     def mark_stale_runs(self, connector: str, stale_after: int = 120) -> None:
@@ -127,74 +622,54 @@ class StateStore:
                 (connector, threshold.isoformat()),
             )
 
-    def heartbeat(
+    def _write_run(
         self,
+        conn: sqlite3.Connection,
         run_id: str,
-        stage: str,
+        processed: int = 0,
+        errors: int = 0,
+        stage: str | None = None,
         last_item_key: str | None = None,
     ) -> None:
-        with self._connect() as conn:
-            conn.execute(
-                """
-                UPDATE ingest_runs
-                   SET last_heartbeat = CURRENT_TIMESTAMP,
-                       stage = ?,
-                       last_item_key = COALESCE(?, last_item_key)
-                 WHERE run_id = ?
-                """,
-                (stage, last_item_key, run_id),
-            )
+        conn.execute(
+            """
+            UPDATE ingest_runs
+               SET processed_count = processed_count + ?,
+                   error_count = error_count + ?,
+                   stage = COALESCE(?, stage),
+                   last_item_key = COALESCE(?, last_item_key),
+                   last_heartbeat = CURRENT_TIMESTAMP
+             WHERE run_id = ?
+            """,
+            (processed, errors, stage, last_item_key, run_id),
+        )
 
-    def mark_item_processed(
+    def _write_progress(
         self,
+        conn: sqlite3.Connection,
         connector: str,
-        run_id: str,
         shard_key: str,
-        item_key: str,
         decision_date: str | None,
         doc_id: str | None,
-        inc_count: int = 1,
+        item_key: str,
     ) -> None:
-        with self._connect() as conn:
-            conn.execute(
-                """
-                INSERT INTO connector_progress
-                    (connector, shard_key, last_decision_date, last_doc_id, last_item_key, updated_at)
-                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                ON CONFLICT(connector) DO UPDATE SET
-                    shard_key = excluded.shard_key,
-                    last_decision_date = excluded.last_decision_date,
-                    last_doc_id = excluded.last_doc_id,
-                    last_item_key = excluded.last_item_key,
-                    updated_at = CURRENT_TIMESTAMP
-                """,
-                (connector, shard_key, decision_date, doc_id, item_key),
-            )
-            conn.execute(
-                """
-                UPDATE ingest_runs
-                   SET processed_count = processed_count + ?,
-                       last_item_key = ?,
-                       last_heartbeat = CURRENT_TIMESTAMP,
-                       stage = 'processing'
-                 WHERE run_id = ?
-                """,
-                (inc_count, item_key, run_id),
-            )
-
-    def record_error(self, run_id: str, note: str | None = None) -> None:
-        with self._connect() as conn:
-            conn.execute(
-                """
-                UPDATE ingest_runs
-                   SET error_count = error_count + 1,
-                       last_heartbeat = CURRENT_TIMESTAMP
-                 WHERE run_id = ?
-                """,
-                (run_id,),
-            )
+        conn.execute(
+            """
+            INSERT INTO connector_progress
+                (connector, shard_key, last_decision_date, last_doc_id, last_item_key, updated_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(connector) DO UPDATE SET
+                shard_key = excluded.shard_key,
+                last_decision_date = excluded.last_decision_date,
+                last_doc_id = excluded.last_doc_id,
+                last_item_key = excluded.last_item_key,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (connector, shard_key, decision_date, doc_id, item_key),
+        )
 
     def finish_run(self, run_id: str, status: str = "completed") -> None:
+        self.flush()
         with self._connect() as conn:
             conn.execute(
                 """
@@ -207,6 +682,7 @@ class StateStore:
             )
 
     def load_progress(self, connector: str) -> dict[str, Any] | None:
+        self.flush()
         with self._connect() as conn:
             row = conn.execute(
                 """
@@ -220,6 +696,83 @@ class StateStore:
                 return None
             return dict(row)
 
+    def save_listing_checkpoint(self, connector: str, shard_key: str, listed_until: str, done: bool) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO listing_checkpoints (connector, shard_key, listed_until, done, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(connector, shard_key) DO UPDATE SET
+                    listed_until = excluded.listed_until,
+                    done = excluded.done,
+                    updated_at = CURRENT_TIMESTAMP
+                """,
+                (connector, shard_key, listed_until, int(done)),
+            )
+
+    def load_listing_checkpoint(self, connector: str, shard_key: str) -> dict[str, Any] | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT listed_until, done FROM listing_checkpoints WHERE connector = ? AND shard_key = ?",
+                (connector, shard_key),
+            ).fetchone()
+        return {"listed_until": row["listed_until"], "done": bool(row["done"])} if row else None
+
+    def record_listing_total(self, connector: str, window_start: str, window_end: str, records_total: int) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO listing_density (connector, window_start, window_end, records_total, observed_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(connector, window_start, window_end) DO UPDATE SET
+                    records_total = excluded.records_total,
+                    observed_at = CURRENT_TIMESTAMP
+                """,
+                (connector, window_start, window_end, records_total),
+            )
+
+    def load_listing_totals(self, connector: str, start: str, end: str) -> list[dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT window_start, window_end, records_total FROM listing_density
+                WHERE connector = ? AND window_end >= ? AND window_start <= ?
+                """,
+                (connector, start, end),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _write_fingerprints(self, conn: sqlite3.Connection, rows: list[tuple]) -> None:
+        conn.executemany(
+            """
+            INSERT INTO doc_fingerprints
+                (doc_id, connector, item_key, etag, last_modified, raw_hash, checksum, chunk_hashes, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(doc_id) DO UPDATE SET
+                connector = excluded.connector,
+                item_key = excluded.item_key,
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                raw_hash = excluded.raw_hash,
+                checksum = excluded.checksum,
+                chunk_hashes = excluded.chunk_hashes,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            rows,
+        )
+
+    def _read_fingerprint(self, connector: str, item_key: str) -> dict[str, Any] | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT doc_id, connector, item_key, etag, last_modified, raw_hash, checksum, chunk_hashes
+                FROM doc_fingerprints WHERE connector = ? AND item_key = ?
+                ORDER BY updated_at DESC LIMIT 1
+                """,
+                (connector, item_key),
+            ).fetchone()
+        return dict(row) if row else None
+
     def enqueue_items(self, connector: str, window_key: str, refs: list[dict[str, Any]]) -> None:
         rows = [
             (
@@ -242,80 +795,153 @@ class StateStore:
                 rows,
             )
 
-    def checkout_next_item(self, connector: str, window_key: str) -> dict[str, Any] | None:
+    def claim_batch(
+        self,
+        connector: str,
+        window_key: str,
+        n: int,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        worker_id: str | None = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> list[dict[str, Any]]:
+        # Tek UPDATE ... RETURNING, BEGIN IMMEDIATE altında: eşzamanlı süreçler aynı satırı alamaz
+        if n <= 0:
+            return []
+        params = {
+            "owner": worker_id or self.worker_id,
+            "lease": f"+{int(lease_seconds)} seconds",
+            "connector": connector,
+            "window_key": window_key,
+            "n": int(n),
+            "max_attempts": int(max_attempts),
+        }
         with self._connect() as conn:
-            row = conn.execute(
-                """
-                SELECT id, payload, attempts
-                  FROM ingest_queue
-                 WHERE connector = ?
-                   AND window_key = ?
-                   AND (
-                        status = 'PENDING'
-                        OR (status = 'RETRY' AND (next_attempt_at IS NULL OR datetime(next_attempt_at) <= CURRENT_TIMESTAMP))
-                   )
-                 ORDER BY created_at
-                 LIMIT 1
-                """,
-                (connector, window_key),
-            ).fetchone()
-            if not row:
-                return None
+            conn.execute("BEGIN IMMEDIATE")
+            # Lease'i dolan öğe deneme hakkını bitirdiyse tekrar alınmaz, FAILED olur
             conn.execute(
-                """
+                f"""
                 UPDATE ingest_queue
-                   SET status = 'IN_PROGRESS',
+                   SET status = 'FAILED',
+                       attempts = attempts + 1,
+                       last_error = 'lease expired: ' || COALESCE(lease_owner, ''),
+                       lease_owner = NULL,
+                       lease_expires_at = NULL,
                        updated_at = CURRENT_TIMESTAMP
-                 WHERE id = ?
+                 WHERE connector = :connector
+                   AND window_key = :window_key
+                   AND {_EXPIRED_CLAUSE}
+                   AND attempts + 1 >= :max_attempts
                 """,
-                (row["id"],),
+                params,
             )
+            rows = conn.execute(
+                f"""
+                UPDATE ingest_queue
+                   SET status = 'IN_PROGRESS',
+                       attempts = attempts + CASE WHEN status = 'IN_PROGRESS' THEN 1 ELSE 0 END,
+                       last_error = CASE
+                           WHEN status = 'IN_PROGRESS' THEN 'lease expired: ' || COALESCE(lease_owner, '')
+                           ELSE last_error
+                       END,
+                       lease_owner = :owner,
+                       lease_expires_at = datetime('now', :lease),
+                       updated_at = CURRENT_TIMESTAMP
+                 WHERE id IN (
+                        SELECT id
+                          FROM ingest_queue
+                         WHERE connector = :connector
+                           AND window_key = :window_key
+                           AND ({_DUE_CLAUSE})
+                         ORDER BY created_at, id
+                         LIMIT :n
+                 )
+                RETURNING id, payload, attempts
+                """,
+                params,
+            ).fetchall()
+        items = []
+        for row in sorted(rows, key=lambda r: r["id"]):
             payload = json.loads(row["payload"])
             payload["_attempts"] = row["attempts"]
             payload["_queue_id"] = row["id"]
-            return payload
+            items.append(payload)
+        return items
 
-    def mark_queue_done(self, item_id: int) -> None:
+    def extend_leases(
+        self,
+        item_ids: list[int],
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        worker_id: str | None = None,
+    ) -> int:
+        if not item_ids:
+            return 0
+        owner = worker_id or self.worker_id
         with self._connect() as conn:
-            conn.execute(
+            cur = conn.executemany(
                 """
                 UPDATE ingest_queue
-                   SET status = 'DONE',
-                       updated_at = CURRENT_TIMESTAMP
+                   SET lease_expires_at = datetime('now', ?)
                  WHERE id = ?
+                   AND status = 'IN_PROGRESS'
+                   AND lease_owner = ?
                 """,
-                (item_id,),
+                [(f"+{int(lease_seconds)} seconds", item_id, owner) for item_id in item_ids],
             )
+            return cur.rowcount
 
-    def mark_queue_retry(self, item_id: int, error: str, delay_seconds: int, max_attempts: int) -> None:
-        next_attempt = datetime.utcnow() + timedelta(seconds=delay_seconds)
+    def release_items(self, item_ids: list[int]) -> None:
+        if not item_ids:
+            return
+        self.flush()
         with self._connect() as conn:
-            row = conn.execute(
-                "SELECT attempts FROM ingest_queue WHERE id = ?",
-                (item_id,),
-            ).fetchone()
-            attempts = (row["attempts"] if row else 0) + 1
-            status = "FAILED" if attempts >= max_attempts else "RETRY"
-            conn.execute(
+            conn.executemany(
                 """
                 UPDATE ingest_queue
-                   SET attempts = ?,
-                       status = ?,
-                       next_attempt_at = ?,
-                       last_error = ?,
+                   SET status = 'PENDING',
+                       lease_owner = NULL,
+                       lease_expires_at = NULL,
                        updated_at = CURRENT_TIMESTAMP
                  WHERE id = ?
+                   AND status = 'IN_PROGRESS'
                 """,
-                (
-                    attempts,
-                    status,
-                    next_attempt.isoformat(),
-                    error[:500],
-                    item_id,
-                ),
+                [(item_id,) for item_id in item_ids],
             )
 
+    def _apply_ack(self, conn: sqlite3.Connection, item_ids: list[int]) -> None:
+        if not item_ids:
+            return
+        conn.executemany(
+            """
+            UPDATE ingest_queue
+               SET status = 'DONE',
+                   lease_owner = NULL,
+                   lease_expires_at = NULL,
+                   updated_at = CURRENT_TIMESTAMP
+             WHERE id = ?
+            """,
+            [(item_id,) for item_id in item_ids],
+        )
+
+    def _apply_retry(self, conn: sqlite3.Connection, rows: list[tuple]) -> None:
+        if not rows:
+            return
+        conn.executemany(
+            """
+            UPDATE ingest_queue
+               SET attempts = attempts + 1,
+                   status = CASE WHEN attempts + 1 >= ? THEN 'FAILED' ELSE 'RETRY' END,
+                   next_attempt_at = ?,
+                   last_error = ?,
+                   lease_owner = NULL,
+                   lease_expires_at = NULL,
+                   updated_at = CURRENT_TIMESTAMP
+             WHERE id = ?
+            """,
+            rows,
+        )
+
     def queue_counts(self, connector: str, window_key: str) -> dict[str, int]:
+        self.flush()
         with self._connect() as conn:
             rows = conn.execute(
                 """
@@ -326,11 +952,4 @@ class StateStore:
                 """,
                 (connector, window_key),
             ).fetchall()
-            stats = {row["status"]: row["cnt"] for row in rows}
-            return {
-                "PENDING": stats.get("PENDING", 0),
-                "IN_PROGRESS": stats.get("IN_PROGRESS", 0),
-                "RETRY": stats.get("RETRY", 0),
-                "DONE": stats.get("DONE", 0),
-                "FAILED": stats.get("FAILED", 0),
-            }
+            return self._count_map({row["status"]: row["cnt"] for row in rows})
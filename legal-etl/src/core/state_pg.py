@@ -0,0 +1,569 @@
+from __future__ import annotations
+
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import psycopg
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+
+from .state import DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, BaseStateStore
+
+NOTIFY_CHANNEL = "ingest_queue"
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS ingest_runs (
+        run_id TEXT PRIMARY KEY,
+        connector TEXT NOT NULL,
+        window_start DATE NOT NULL,
+        window_end DATE NOT NULL,
+        params JSONB NOT NULL,
+        stage TEXT NOT NULL DEFAULT 'init',
+        last_item_key TEXT,
+        processed_count INTEGER NOT NULL DEFAULT 0,
+        error_count INTEGER NOT NULL DEFAULT 0,
+        started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        last_heartbeat TIMESTAMPTZ,
+        finished_at TIMESTAMPTZ,
+        status TEXT NOT NULL DEFAULT 'in_progress'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS connector_progress (
+        connector TEXT PRIMARY KEY,
+        shard_key TEXT NOT NULL,
+        last_decision_date TEXT,
+        last_doc_id TEXT,
+        last_item_key TEXT,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingest_queue (
+        id BIGSERIAL PRIMARY KEY,
+        connector TEXT NOT NULL,
+        window_key TEXT NOT NULL,
+        item_key TEXT NOT NULL,
+        payload JSONB NOT NULL,
+        status TEXT NOT NULL DEFAULT 'PENDING',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMPTZ,
+        last_error TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        lease_owner TEXT,
+        lease_expires_at TIMESTAMPTZ,
+        UNIQUE (connector, window_key, item_key)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_ingest_queue_due
+        ON ingest_queue (connector, window_key, status, created_at)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS listing_checkpoints (
+        connector TEXT NOT NULL,
+        shard_key TEXT NOT NULL,
+        listed_until DATE NOT NULL,
+        done BOOLEAN NOT NULL DEFAULT false,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (connector, shard_key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS listing_density (
+        connector TEXT NOT NULL,
+        window_start DATE NOT NULL,
+        window_end DATE NOT NULL,
+        records_total INTEGER NOT NULL,
+        observed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (connector, window_start, window_end)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS doc_fingerprints (
+        doc_id TEXT PRIMARY KEY,
+        connector TEXT NOT NULL,
+        item_key TEXT NOT NULL,
+        etag TEXT,
+        last_modified TEXT,
+        raw_hash TEXT,
+        checksum TEXT NOT NULL,
+        chunk_hashes JSONB NOT NULL DEFAULT '{}'::jsonb,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_doc_fingerprints_item ON doc_fingerprints (connector, item_key)",
+]
+
+
+class PostgresStateStore(BaseStateStore):
+    """
+    Postgres implementation of ``ingest_runs`` / ``connector_progress`` /
+    ``ingest_queue`` so connectors on several machines can share one queue.
+
+    Claims use ``SELECT ... FOR UPDATE SKIP LOCKED`` (concurrent claimers skip
+    each other's rows instead of blocking), enqueue goes through ``COPY`` into
+    a temp staging table followed by one upsert, and every enqueue/release
+    sends ``NOTIFY ingest_queue, '<connector>:<window_key>'`` which
+    ``wait_for_work`` listens for.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        worker_id: str | None = None,
+        write_behind: bool = False,
+        flush_every: int = 50,
+        flush_interval: float = 2.0,
+    ) -> None:
+        self.dsn = dsn
+        self._listener: psycopg.Connection | None = None
+        super().__init__(
+            worker_id=worker_id,
+            write_behind=write_behind,
+            flush_every=flush_every,
+            flush_interval=flush_interval,
+        )
+
+    def _open_connection(self) -> psycopg.Connection:
+        conn = psycopg.connect(self.dsn, row_factory=dict_row)
+        if self.write_behind:
+            # Grup commit'leri WAL flush'ı beklemez (kayıp penceresi lease ile telafi edilir)
+            conn.execute("SET synchronous_commit = off")
+            conn.commit()
+        return conn
+
+    def _ensure_schema(self) -> None:
+        with self._connect() as conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+    def close(self) -> None:
+        super().close()
+        if self._listener is not None:
+            try:
+                self._listener.close()
+            except Exception:  # noqa: BLE001
+                pass
+            self._listener = None
+
+    @staticmethod
+    def _timestamp(value: datetime) -> datetime:
+        return value.replace(tzinfo=timezone.utc)
+
+    # ----------------------------------------------------------------- runs
+    def start_run(
+        self,
+        connector: str,
+        window_start: datetime,
+        window_end: datetime,
+        params: dict[str, Any],
+    ) -> str:
+        run_id = str(uuid.uuid4())
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO ingest_runs
+                    (run_id, connector, window_start, window_end, params, stage, last_heartbeat)
+                VALUES (%s, %s, %s, %s, %s, 'init', now())
+                """,
+                (run_id, connector, window_start.date(), window_end.date(), Jsonb(params)),
+            )
+        return run_id
+
+    def mark_stale_runs(self, connector: str, stale_after: int = 120) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE ingest_runs
+                   SET status = 'stalled'
+                 WHERE connector = %s
+                   AND status = 'in_progress'
+                   AND (last_heartbeat IS NULL OR last_heartbeat < now() - %s)
+                """,
+                (connector, timedelta(seconds=stale_after)),
+            )
+
+    def _write_run(
+        self,
+        conn: psycopg.Connection,
+        run_id: str,
+        processed: int = 0,
+        errors: int = 0,
+        stage: str | None = None,
+        last_item_key: str | None = None,
+    ) -> None:
+        conn.execute(
+            """
+            UPDATE ingest_runs
+               SET processed_count = processed_count + %s,
+                   error_count = error_count + %s,
+                   stage = COALESCE(%s, stage),
+                   last_item_key = COALESCE(%s, last_item_key),
+                   last_heartbeat = now()
+             WHERE run_id = %s
+            """,
+            (processed, errors, stage, last_item_key, run_id),
+        )
+
+    def _write_progress(
+        self,
+        conn: psycopg.Connection,
+        connector: str,
+        shard_key: str,
+        decision_date: str | None,
+        doc_id: str | None,
+        item_key: str,
+    ) -> None:
+        conn.execute(
+            """
+            INSERT INTO connector_progress
+                (connector, shard_key, last_decision_date, last_doc_id, last_item_key, updated_at)
+            VALUES (%s, %s, %s, %s, %s, now())
+            ON CONFLICT (connector) DO UPDATE SET
+                shard_key = EXCLUDED.shard_key,
+                last_decision_date = EXCLUDED.last_decision_date,
+                last_doc_id = EXCLUDED.last_doc_id,
+                last_item_key = EXCLUDED.last_item_key,
+                updated_at = now()
+            """,
+            (connector, shard_key, decision_date, doc_id, item_key),
+        )
+
+    def finish_run(self, run_id: str, status: str = "completed") -> None:
+        self.flush()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ingest_runs SET status = %s, finished_at = now() WHERE run_id = %s",
+                (status, run_id),
+            )
+
+    def load_progress(self, connector: str) -> dict[str, Any] | None:
+        self.flush()
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT shard_key, last_decision_date, last_doc_id, last_item_key, updated_at
+                  FROM connector_progress
+                 WHERE connector = %s
+                """,
+                (connector,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def save_listing_checkpoint(self, connector: str, shard_key: str, listed_until: str, done: bool) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO listing_checkpoints (connector, shard_key, listed_until, done, updated_at)
+                VALUES (%s, %s, %s, %s, now())
+                ON CONFLICT (connector, shard_key) DO UPDATE SET
+                    listed_until = EXCLUDED.listed_until,
+                    done = EXCLUDED.done,
+                    updated_at = now()
+                """,
+                (connector, shard_key, listed_until, done),
+            )
+
+    def load_listing_checkpoint(self, connector: str, shard_key: str) -> dict[str, Any] | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT listed_until, done FROM listing_checkpoints WHERE connector = %s AND shard_key = %s",
+                (connector, shard_key),
+            ).fetchone()
+        return {"listed_until": row["listed_until"].isoformat(), "done": row["done"]} if row else None
+
+    def record_listing_total(self, connector: str, window_start: str, window_end: str, records_total: int) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO listing_density (connector, window_start, window_end, records_total, observed_at)
+                VALUES (%s, %s, %s, %s, now())
+                ON CONFLICT (connector, window_start, window_end) DO UPDATE SET
+                    records_total = EXCLUDED.records_total,
+                    observed_at = now()
+                """,
+                (connector, window_start, window_end, records_total),
+            )
+
+    def load_listing_totals(self, connector: str, start: str, end: str) -> list[dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT window_start, window_end, records_total FROM listing_density
+                WHERE connector = %s AND window_end >= %s AND window_start <= %s
+                """,
+                (connector, start, end),
+            ).fetchall()
+        return [
+            {
+                "window_start": row["window_start"].isoformat(),
+                "window_end": row["window_end"].isoformat(),
+                "records_total": row["records_total"],
+            }
+            for row in rows
+        ]
+
+    def _write_fingerprints(self, conn: psycopg.Connection, rows: list[tuple]) -> None:
+        with conn.cursor() as cur:
+            cur.executemany(
+                """
+                INSERT INTO doc_fingerprints
+                    (doc_id, connector, item_key, etag, last_modified, raw_hash, checksum, chunk_hashes, updated_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s::jsonb, now())
+                ON CONFLICT (doc_id) DO UPDATE SET
+                    connector = EXCLUDED.connector,
+                    item_key = EXCLUDED.item_key,
+                    etag = EXCLUDED.etag,
+                    last_modified = EXCLUDED.last_modified,
+                    raw_hash = EXCLUDED.raw_hash,
+                    checksum = EXCLUDED.checksum,
+                    chunk_hashes = EXCLUDED.chunk_hashes,
+                    updated_at = now()
+                """,
+                rows,
+            )
+
+    def _read_fingerprint(self, connector: str, item_key: str) -> dict[str, Any] | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT doc_id, connector, item_key, etag, last_modified, raw_hash, checksum, chunk_hashes
+                FROM doc_fingerprints WHERE connector = %s AND item_key = %s
+                ORDER BY updated_at DESC LIMIT 1
+                """,
+                (connector, item_key),
+            ).fetchone()
+        return dict(row) if row else None
+
+    # ---------------------------------------------------------------- queue
+    def enqueue_items(self, connector: str, window_key: str, refs: list[dict[str, Any]]) -> None:
+        if not refs:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TEMP TABLE IF NOT EXISTS ingest_queue_stage (
+                    item_key TEXT NOT NULL,
+                    payload JSONB NOT NULL
+                ) ON COMMIT DELETE ROWS
+                """
+            )
+            with conn.cursor() as cur:
+                with cur.copy("COPY ingest_queue_stage (item_key, payload) FROM STDIN") as copy:
+                    for ref in refs:
+                        copy.write_row((ref["key"], json.dumps(ref)))
+            # Aynı anahtar iki kez gelirse ON CONFLICT aynı satırı iki kez güncelleyemez
+            conn.execute(
+                """
+                INSERT INTO ingest_queue (connector, window_key, item_key, payload)
+                SELECT DISTINCT ON (item_key) %s, %s, item_key, payload
+                  FROM ingest_queue_stage
+                 ORDER BY item_key
+                ON CONFLICT (connector, window_key, item_key) DO UPDATE SET
+                    payload = EXCLUDED.payload,
+                    updated_at = now()
+                """,
+                (connector, window_key),
+            )
+            self._notify(conn, connector, window_key)
+
+    @staticmethod
+    def _notify(conn: psycopg.Connection, connector: str, window_key: str) -> None:
+        # NOTIFY commit ile birlikte yayınlanır
+        conn.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, f"{connector}:{window_key}"))
+
+    def claim_batch(
+        self,
+        connector: str,
+        window_key: str,
+        n: int,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        worker_id: str | None = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> list[dict[str, Any]]:
+        if n <= 0:
+            return []
+        params = {
+            "owner": worker_id or self.worker_id,
+            "lease": timedelta(seconds=int(lease_seconds)),
+            "connector": connector,
+            "window_key": window_key,
+            "n": int(n),
+            "max_attempts": int(max_attempts),
+        }
+        with self._connect() as conn:
+            # Lease'i dolan öğe deneme hakkını bitirdiyse tekrar alınmaz, FAILED olur
+            conn.execute(
+                """
+                UPDATE ingest_queue
+                   SET status = 'FAILED',
+                       attempts = attempts + 1,
+                       last_error = 'lease expired: ' || COALESCE(lease_owner, ''),
+                       lease_owner = NULL,
+                       lease_expires_at = NULL,
+                       updated_at = now()
+                 WHERE id IN (
+                        SELECT id
+                          FROM ingest_queue
+                         WHERE connector = %(connector)s
+                           AND window_key = %(window_key)s
+                           AND status = 'IN_PROGRESS'
+                           AND COALESCE(lease_expires_at, updated_at + %(lease)s) <= now()
+                           AND attempts + 1 >= %(max_attempts)s
+                           FOR UPDATE SKIP LOCKED
+                 )
+                """,
+                params,
+            )
+            rows = conn.execute(
+                """
+                WITH due AS (
+                    SELECT id
+                      FROM ingest_queue
+                     WHERE connector = %(connector)s
+                       AND window_key = %(window_key)s
+                       AND (
+                            status = 'PENDING'
+                            OR (status = 'RETRY' AND (next_attempt_at IS NULL OR next_attempt_at <= now()))
+                            OR (status = 'IN_PROGRESS'
+                                AND COALESCE(lease_expires_at, updated_at + %(lease)s) <= now())
+                       )
+                     ORDER BY created_at, id
+                     LIMIT %(n)s
+                       FOR UPDATE SKIP LOCKED
+                )
+                UPDATE ingest_queue q
+                   SET status = 'IN_PROGRESS',
+                       attempts = q.attempts + CASE WHEN q.status = 'IN_PROGRESS' THEN 1 ELSE 0 END,
+                       last_error = CASE
+                           WHEN q.status = 'IN_PROGRESS' THEN 'lease expired: ' || COALESCE(q.lease_owner, '')
+                           ELSE q.last_error
+                       END,
+                       lease_owner = %(owner)s,
+                       lease_expires_at = now() + %(lease)s,
+                       updated_at = now()
+                  FROM due
+                 WHERE q.id = due.id
+                RETURNING q.id, q.payload, q.attempts
+                """,
+                params,
+            ).fetchall()
+        items = []
+        for row in sorted(rows, key=lambda r: r["id"]):
+            payload = dict(row["payload"])
+            payload["_attempts"] = row["attempts"]
+            payload["_queue_id"] = row["id"]
+            items.append(payload)
+        return items
+
+    def extend_leases(
+        self,
+        item_ids: list[int],
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        worker_id: str | None = None,
+    ) -> int:
+        if not item_ids:
+            return 0
+        with self._connect() as conn:
+            cur = conn.execute(
+                """
+                UPDATE ingest_queue
+                   SET lease_expires_at = now() + %s
+                 WHERE id = ANY(%s)
+                   AND status = 'IN_PROGRESS'
+                   AND lease_owner = %s
+                """,
+                (timedelta(seconds=int(lease_seconds)), list(item_ids), worker_id or self.worker_id),
+            )
+            return cur.rowcount
+
+    def release_items(self, item_ids: list[int]) -> None:
+        if not item_ids:
+            return
+        self.flush()
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                UPDATE ingest_queue
+                   SET status = 'PENDING',
+                       lease_owner = NULL,
+                       lease_expires_at = NULL,
+                       updated_at = now()
+                 WHERE id = ANY(%s)
+                   AND status = 'IN_PROGRESS'
+                RETURNING connector, window_key
+                """,
+                (list(item_ids),),
+            ).fetchall()
+            for shard in {(row["connector"], row["window_key"]) for row in rows}:
+                self._notify(conn, *shard)
+
+    def _apply_ack(self, conn: psycopg.Connection, item_ids: list[int]) -> None:
+        if not item_ids:
+            return
+        conn.execute(
+            """
+            UPDATE ingest_queue
+               SET status = 'DONE',
+                   lease_owner = NULL,
+                   lease_expires_at = NULL,
+                   updated_at = now()
+             WHERE id = ANY(%s)
+            """,
+            (list(item_ids),),
+        )
+
+    def _apply_retry(self, conn: psycopg.Connection, rows: list[tuple]) -> None:
+        if not rows:
+            return
+        with conn.cursor() as cur:
+            cur.executemany(
+                """
+                UPDATE ingest_queue
+                   SET attempts = attempts + 1,
+                       status = CASE WHEN attempts + 1 >= %s THEN 'FAILED' ELSE 'RETRY' END,
+                       next_attempt_at = %s,
+                       last_error = %s,
+                       lease_owner = NULL,
+                       lease_expires_at = NULL,
+                       updated_at = now()
+                 WHERE id = %s
+                """,
+                rows,
+            )
+
+    def queue_counts(self, connector: str, window_key: str) -> dict[str, int]:
+        self.flush()
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT status, COUNT(*) AS cnt
+                  FROM ingest_queue
+                 WHERE connector = %s AND window_key = %s
+                 GROUP BY status
+                """,
+                (connector, window_key),
+            ).fetchall()
+        return self._count_map({row["status"]: row["cnt"] for row in rows})
+
+    def wait_for_work(self, connector: str, window_key: str, timeout: float) -> bool:
+        """LISTEN on ``ingest_queue``; True when this shard was notified before ``timeout``."""
+        if self._listener is None:
+            self._listener = psycopg.connect(self.dsn, autocommit=True)
+            self._listener.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        wanted = f"{connector}:{window_key}"
+        deadline = time.monotonic() + max(0.0, timeout)
+        # Başka shard'ın NOTIFY'ı beklemeyi bitirmez; süre dolana kadar dinlemeye devam
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            for notify in self._listener.notifies(timeout=remaining, stop_after=1):
+                if notify.payload == wanted:
+                    return True
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+
+# yargitay_search._ascii_fold ile aynı eşleme (İ -> i dahil)
+_TR_FOLD = str.maketrans(
+    {
+        "ş": "s", "Ş": "S",
+        "ç": "c", "Ç": "C",
+        "ğ": "g", "Ğ": "G",
+        "ı": "i", "İ": "i",
+        "ö": "o", "Ö": "O",
+        "ü": "u", "Ü": "U",
+    }
+)
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Özel isim/sayı ekleri: "Yargıtay'ın", "344'üncü" -> ek atılır
+_APOSTROPHE_SUFFIX_RE = re.compile(r"[\'’]\w+", re.UNICODE)
+
+# BM25 için düşük bilgi taşıyan Türkçe bağlaç/edatlar (katlanmış biçimde)
+TR_STOPWORDS = frozenset(
+    """
+    acaba ama ancak bazi belki bile bir biri birkac bu buna bunda bundan bunu bunun cok cunku da daha de
+    defa diye en gibi hem hep her hic icin ile ise kez ki kim mi mu ne neden nerde nerede nereye
+    nicin niye o sanki sey siz su sunu tum ve veya ya yani
+    """.split()
+)
+
+
+def ascii_fold(text: str) -> str:
+    """Turkish-specific ASCII folding, identical to ``yargitay_search._ascii_fold``."""
+    return (text or "").translate(_TR_FOLD)
+
+
+def fold_lower(text: str) -> str:
+    """Fold Turkish letters, strip remaining diacritics (â, î, û) and lowercase."""
+    folded = unicodedata.normalize("NFKD", ascii_fold(text))
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return folded.lower()
+
+
+def tokenize(text: str, drop_stopwords: bool = False) -> list[str]:
+    tokens = _TOKEN_RE.findall(fold_lower(_APOSTROPHE_SUFFIX_RE.sub("", text or "")))
+    if drop_stopwords:
+        return [t for t in tokens if t not in TR_STOPWORDS]
+    return tokens
@@ -5,6 +5,10 @@ from typing import Iterable
 
 from .schema import CanonDoc, Chunk
 
+# Parse/chunk çıktısı değiştiğinde artırın: --incremental parmak izleri bu sürümle damgalanır,
+# eski sürümle kaydedilmiş belgeler ham içerik aynı olsa da yeniden işlenir.
+PIPELINE_VERSION = 1
+
 
 def doc_checksum(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
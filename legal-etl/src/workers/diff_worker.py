@@ -1,12 +1,19 @@
 from __future__ import annotations
 
+import hashlib
+from email.utils import parsedate_to_datetime
+from typing import Any
+
 import structlog
 
-from src.core.schema import Chunk
-from src.core.versioning import chunk_hash
+from src.core.schema import CanonDoc, Chunk, ItemRef, RawDoc
+from src.core.versioning import PIPELINE_VERSION, chunk_hash
 
 logger = structlog.get_logger()
 
+# Ön kontrol veya checksum ile atlanan durumlar; embedding'e hiçbir şey gitmez
+UNCHANGED = {"not_modified", "raw_unchanged", "unchanged"}
+
 
 def diff_chunks(existing_hashes: dict[str, str], new_chunks: list[Chunk]) -> list[Chunk]:
     changed: list[Chunk] = []
@@ -16,3 +23,61 @@ def diff_chunks(existing_hashes: dict[str, str], new_chunks: list[Chunk]) -> lis
         changed.append(chunk)
     logger.info("diff.changed", count=len(changed))
     return changed
+
+
+def _stamp(value: str) -> str:
+    return f"v{PIPELINE_VERSION}:{value}"
+
+
+def raw_content_hash(raw: RawDoc) -> str | None:
+    """Hash of the fetched payload, stamped with ``PIPELINE_VERSION``."""
+    if raw.content_html:
+        return _stamp(hashlib.sha256(raw.content_html.encode("utf-8")).hexdigest())
+    if raw.content_pdf:
+        return _stamp(hashlib.sha256(raw.content_pdf).hexdigest())
+    return None
+
+
+def fingerprint_checksum(doc: CanonDoc) -> str:
+    """``doc.checksum`` stamped with ``PIPELINE_VERSION``; stored and compared by the incremental run."""
+    return _stamp(doc.checksum)
+
+
+def is_current(fingerprint: dict[str, Any] | None) -> bool:
+    """True when ``fingerprint`` was written by the current parse/chunk pipeline."""
+    return bool(fingerprint) and str(fingerprint.get("checksum") or "").startswith(_stamp(""))
+
+
+def conditional_ref(ref: ItemRef, fingerprint: dict[str, Any] | None) -> ItemRef:
+    """Copy of ``ref`` carrying the stored validators so the fetch can be conditional."""
+    if not is_current(fingerprint) or not (fingerprint.get("etag") or fingerprint.get("last_modified")):
+        return ref
+    last_modified = None
+    if fingerprint.get("last_modified"):
+        try:
+            last_modified = parsedate_to_datetime(fingerprint["last_modified"])
+        except (TypeError, ValueError):
+            last_modified = None
+    return ref.model_copy(update={"etag": fingerprint.get("etag") or ref.etag, "last_modified": last_modified})
+
+
+def precheck(fingerprint: dict[str, Any] | None, raw: RawDoc) -> str | None:
+    """``not_modified`` / ``raw_unchanged`` when parse and chunk can be skipped, else None."""
+    if raw.not_modified:
+        return "not_modified"
+    # raw_hash sürüm damgalı: pipeline sürümü değiştiyse eşleşmez
+    if fingerprint and fingerprint.get("raw_hash") and fingerprint["raw_hash"] == raw_content_hash(raw):
+        return "raw_unchanged"
+    return None
+
+
+def diff_document(fingerprint: dict[str, Any] | None, doc: CanonDoc, chunks: list[Chunk]) -> tuple[str, list[Chunk]]:
+    """``(status, chunks to embed)``: ``new``, ``changed`` (only differing chunks) or ``unchanged``."""
+    for chunk in chunks:
+        if not chunk.content_hash:
+            chunk.content_hash = chunk_hash(chunk.content)
+    if not fingerprint:
+        return "new", chunks
+    if fingerprint.get("checksum") == fingerprint_checksum(doc):
+        return "unchanged", []
+    return "changed", diff_chunks(fingerprint.get("chunk_hashes") or {}, chunks)
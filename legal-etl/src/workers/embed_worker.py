@@ -2,7 +2,8 @@ from __future__ import annotations
 
 import structlog
 
-from src.core.embed import Embedder
+from src.core.embed import get_embedder
+from src.core.embed_remote import EmbedBatchError
 from src.core.index_qdrant import QdrantIndexer
 from src.core.schema import Chunk
 
@@ -13,8 +14,20 @@ def process_embed(chunks_data: list[dict]) -> None:
     chunks = [Chunk.model_validate(c) for c in chunks_data]
     if not chunks:
         return
-    embedder = Embedder()
+    embedder = get_embedder()  # EMBED_BACKEND / EMBED_MODEL; model süreç boyunca yüklü kalır
     indexer = QdrantIndexer()
-    chunk_vectors = embedder.embed_chunks(chunks)
-    indexer.upsert(chunk_vectors)
-    logger.info("embed.upserted", count=len(chunks))
+    upserted = 0
+
+    def upsert(chunk_vectors) -> None:
+        nonlocal upserted
+        indexer.upsert(chunk_vectors)
+        upserted += len(chunk_vectors)
+
+    # Biten her batch hemen yazılır; sonraki bir batch patlasa da ilerleme kaybolmaz
+    try:
+        embedder.embed_chunks(chunks, on_batch=upsert)
+    except EmbedBatchError as exc:
+        failed = [chunks[i].chunk_id for i in sorted(exc.failed)]
+        logger.error("embed.partial", upserted=upserted, failed=len(failed), chunk_ids=failed[:20], error=str(exc))
+        raise
+    logger.info("embed.upserted", count=upserted)
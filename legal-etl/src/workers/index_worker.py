@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import structlog
 
-from src.core.index_bm25 import OpenSearchIndexer
+from src.core.index_bm25 import BulkIndexError, OpenSearchIndexer
 from src.core.schema import Chunk
 
 logger = structlog.get_logger()
@@ -14,5 +14,13 @@ def process_index(chunks_data: list[dict]) -> None:
         return
     indexer = OpenSearchIndexer()
     indexer.ensure_index()
-    indexer.upsert(chunks)
-    logger.info("index.upserted", count=len(chunks))
+    metrics = indexer.upsert(chunks)
+    logger.info(
+        "index.upserted",
+        count=len(chunks),
+        failed=metrics.get("failed", 0),
+        docs_per_sec=metrics.get("docs_per_sec"),
+    )
+    if metrics.get("failed"):
+        # başarısız belge varsa iş yeniden denensin
+        raise BulkIndexError(metrics)
@@ -1,6 +1,27 @@
 import sys
 from pathlib import Path
 
+import pytest
+
 ROOT = Path(__file__).resolve().parent.parent
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+REPO_ROOT = ROOT.parent
+
+
+@pytest.fixture(scope="session")
+def ys(tmp_path_factory):
+    """Kök dizindeki yargitay_search modülü; cache'ler kapalı, log geçici dizine."""
+    pytest.importorskip("httpx")
+    patch = pytest.MonkeyPatch()
+    # modül import'ta log dosyasını çalışma dizinine açar
+    patch.chdir(tmp_path_factory.mktemp("yargitay_search"))
+    patch.setenv("SEARCH_CACHE_ENABLED", "false")
+    patch.setenv("DOC_CACHE_ENABLED", "false")
+    patch.setenv("RERANK_CACHE_ENABLED", "false")
+    patch.syspath_prepend(str(REPO_ROOT))
+    import yargitay_search
+
+    yield yargitay_search
+    patch.undo()
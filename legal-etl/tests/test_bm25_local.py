@@ -0,0 +1,72 @@
+import multiprocessing
+
+from src.core.bm25_local import LocalBM25Client, LocalBM25Index
+
+
+def test_bm25_segments_updates_and_merge(tmp_path):
+    index = LocalBM25Index(tmp_path / "idx", merge_factor=2, background_merge=False)
+    index.index("a", {"content": "Kira tespiti TÜFE oranında yapılır."})
+    index.index("b", {"content": "Nafaka artışı TÜFE ile sınırlı değildir."})
+    index.refresh()
+    index.index("c", {"content": "İşçilik alacakları ve kıdem tazminatı."})
+    index.refresh()
+
+    hits, total = index.search("tufe kira", size=5)
+    assert total == 2 and hits[0][0] == "a"
+    hits, total = index.search("tüfe kira", size=5, operator="and")
+    assert [h[0] for h in hits] == ["a"]
+
+    # güncelleme eski kopyayı gizler, üçüncü segment iki küçüğün birleşmesini tetikler
+    index.index("a", {"content": "Kıdem tazminatı hesabı."})
+    index.refresh()
+    assert index.stats()["segments"] == 2
+    index.merge()
+    assert index.stats() == {"segments": 1, "docs": 3, "deleted": 0, "buffered": 0}
+    assert index.count() == 3
+    assert index.search("kira", size=5)[1] == 0
+    assert {h[0] for h in index.search("kıdem", size=5)[0]} == {"a", "c"}
+
+    reopened = LocalBM25Index(tmp_path / "idx")
+    assert reopened.count() == 3
+
+
+def test_local_client_opensearch_surface(tmp_path):
+    client = LocalBM25Client.from_url(f"local://{tmp_path}")
+    assert not client.indices.exists(index="chunks")
+    client.index(index="chunks", id="x1", body={"doc_id": "d1", "content": "Yargıtay'ın kira kararı"})
+    client.indices.refresh(index="chunks")
+    res = client.search(index="chunks", body={"size": 3, "query": {"match": {"content": {"query": "yargitay kira", "operator": "and"}}}})
+    hit = res["hits"]["hits"][0]
+    assert hit["_id"] == "x1" and hit["_source"]["doc_id"] == "d1" and hit["_score"] > 0
+
+
+def _write_docs(path, prefix):
+    index = LocalBM25Index(path, merge_factor=2, background_merge=False)
+    for i in range(3):
+        index.index(f"{prefix}{i}", {"content": f"Kira tespiti davası {prefix}"})
+        index.refresh()
+
+
+def test_bm25_shared_directory_handles(tmp_path):
+    path = tmp_path / "idx"
+    first = LocalBM25Index(path, background_merge=False)
+    second = LocalBM25Index(path, background_merge=False)
+    first.index("a", {"content": "Kira tespiti TÜFE oranında yapılır."})
+    first.refresh()
+    second.index("b", {"content": "Kira artışı ve tahliye."})
+    second.refresh()
+    # ikinci tutamacın segmenti ilkinin üzerine yazılmaz, okuyucular manifesti yeniden okur
+    assert first.count() == 2 and {h[0] for h in first.search("kira", size=5)[0]} == {"a", "b"}
+    second.delete("a")
+    second.refresh()
+    assert first.search("tüfe", size=5)[1] == 0
+
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_write_docs, args=(path, p)) for p in ("x", "y")]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(30)
+        assert proc.exitcode == 0
+    assert first.count() == 7
+    assert LocalBM25Index(path).search("davası", size=10)[1] == 6
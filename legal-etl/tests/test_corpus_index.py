@@ -0,0 +1,55 @@
+import pytest
+
+from src.core.corpus_index import LocalCorpusIndex, phrase_to_fts
+
+
+def _rec(i, text, date, court="Yargıtay"):
+    return {
+        "doc_id": f"yargitay:x:{i}",
+        "decision_date": date,
+        "chamber": "3. Hukuk Dairesi",
+        "court": court,
+        "meta": {"bedesten_id": str(i)},
+        "text": text,
+    }
+
+
+def test_phrase_to_fts_folds_and_combines():
+    assert phrase_to_fts('+"TBK 344" +"TÜFE"') == '"tbk 344" AND "tufe"'
+    assert phrase_to_fts('kira "işçi"') == '"kira" OR "isci"'
+    assert phrase_to_fts('+"kira" -"nafaka"') == '("kira") NOT ("nafaka")'
+
+
+def test_local_corpus_search_semantics(tmp_path):
+    index = LocalCorpusIndex(tmp_path / "corpus.sqlite")
+    index.add_records(
+        [
+            _rec(1, "Kira tespiti TÜFE oranında yapılır.", "2021-03-01"),
+            _rec(2, "Kira tespitinde tüfe ortalaması esas alınır.", "2023-05-10"),
+            _rec(3, "Kira tespiti TÜFE istinaf.", "2022-01-01", court="Bölge Adliye Mahkemesi"),
+            _rec(4, "Nafaka artışı.", "2024-01-01"),
+        ]
+    )
+    rows, total = index.search('+"tufe"', item_types=["YARGITAYKARARI"])
+    assert total == 2
+    assert [r["documentId"] for r in rows] == ["2", "1"]
+    assert rows[0]["kararTarihiStr"] == "10.05.2023"
+
+    rows, total = index.search('+"tüfe"', date_start="2022-01-01T00:00:00.000Z", date_end="2022-12-31")
+    assert total == 1 and rows[0]["itemType"]["name"] == "ISTINAFHUKUK"
+
+    index.add_records([_rec(1, "Nafaka artışı yeniden.", "2021-03-01")])
+    assert index.search('+"tufe"', item_types=["YARGITAYKARARI"])[1] == 1
+    assert index.get_text("1") == "Nafaka artışı yeniden."
+
+
+def test_local_corpus_order_by_and_ozet(tmp_path):
+    index = LocalCorpusIndex(tmp_path / "corpus.sqlite")
+    index.add_records([_rec(i, f"Kira tespiti {i}. karar " + "x" * 600, f"202{i}-01-01") for i in (1, 2, 3)])
+    order = [{"field": "kararTarihi", "order": "ASC"}, {"field": "documentId", "order": "ASC"}]
+    rows, _ = index.search("kira", order_by=order)
+    assert [r["documentId"] for r in rows] == ["1", "2", "3"]
+    assert [r["documentId"] for r in index.search("kira")[0]] == ["3", "2", "1"]
+    assert rows[0]["ozet"].startswith("Kira tespiti 1. karar") and len(rows[0]["ozet"]) == 500
+    with pytest.raises(ValueError):
+        index.search("kira", order_by=[{"field": "esasNo", "order": "ASC"}])
@@ -0,0 +1,32 @@
+import os
+
+from src.core.doc_cache import DocumentCache
+
+
+def test_doc_cache_roundtrip_and_dedup(tmp_path):
+    cache = DocumentCache(tmp_path / "docs.sqlite")
+    assert cache.get("1") is None
+    cache.put("1", "<p>karar</p>", "karar")
+    cache.put("2", "<p>karar</p>", "karar")
+    hit = cache.get("1")
+    assert hit is not None and hit.html == "<p>karar</p>" and hit.text == "karar"
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    # aynı içerik tek blob olarak saklanır
+    blobs = cache._connect().execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+    assert blobs == 2
+
+
+def test_doc_cache_ttl_and_lru_eviction(tmp_path):
+    cache = DocumentCache(tmp_path / "docs.sqlite", ttl_seconds=60)
+    cache.put("old", "<p>x</p>", "x")
+    cache._connect().execute("UPDATE docs SET fetched_at = fetched_at - 120")
+    assert cache.get("old") is None
+    assert cache.stats()["expired"] == 1
+
+    small = DocumentCache(tmp_path / "small.sqlite", max_bytes=1)  # taban 1 MB
+    for i in range(6):
+        small.put(str(i), os.urandom(300_000).hex())
+    assert small.stats()["evictions"] > 0
+    assert small.get("0") is None
+    assert small.get("5") is not None
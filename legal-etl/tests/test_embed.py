@@ -0,0 +1,141 @@
+import pytest
+
+from src.core.embed import EmbeddingBackend, Embedder
+from src.core.embed_cache import EmbeddingCache
+from src.core.embed_remote import EmbedBatchError, RemoteEmbedExecutor, classify
+from src.core.schema import Chunk
+
+
+class _FakeBackend(EmbeddingBackend):
+    name = "fake"
+
+    def __init__(self) -> None:
+        super().__init__("fake-model")
+        self.batches: list[list[str]] = []
+
+    def count_tokens(self, text: str) -> int:
+        return len(text.split())
+
+    def encode(self, texts, kind):
+        self.batches.append(list(texts))
+        return [[float(len(t.split())), 1.0 if kind == "query" else 0.0] for t in texts]
+
+
+def test_embedder_batches_by_token_length_and_keeps_order(tmp_path):
+    backend = _FakeBackend()
+    embedder = Embedder(backend=backend, max_batch_size=3, max_batch_tokens=12, cache=False)
+    texts = ["a " * 10, "b", "c c", "d " * 6, "e", "f f f"]
+    vectors = embedder.embed_documents(texts)
+
+    assert [v[0] for v in vectors] == [10.0, 1.0, 2.0, 6.0, 1.0, 3.0]
+    # uzun metin tek başına; kısalar birlikte paketlenir
+    assert [len(b) for b in backend.batches] == [1, 2, 3]
+    assert embedder.embed_query("x y") == [2.0, 1.0]
+    assert embedder.info() == {"backend": "fake", "model": "fake-model", "dim": 2, "normalized": True}
+    assert embedder.stats()["texts"] == 7
+
+    cached = Embedder(backend=_FakeBackend(), cache=EmbeddingCache(tmp_path, model="fake-model"))
+    chunks = [
+        Chunk(chunk_id=str(i), doc_id="d", version=1, content=t, content_hash=str(i), token_count=1, payload={"embed_version": 2})
+        for i, t in enumerate(["x", "y y"])
+    ]
+    cached.embed_chunks(chunks)
+    cached.embed_chunks(chunks)
+    assert cached.stats()["texts"] == 2 and cached.cache.stats()["hits"] == 2
+
+
+class _FlakyApi(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.headers = {"retry-after": "0"}
+
+
+def test_remote_executor_retries_splits_and_keeps_partial_progress():
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        if len(calls) == 1:
+            raise _FlakyApi(429)
+        if "bad" in texts:
+            raise _FlakyApi(413)
+        return [[float(len(t))] for t in texts]
+
+    executor = RemoteEmbedExecutor(lambda t: 1, max_batch_size=4, concurrency=2, base_delay=0.0)
+    delivered = {}
+    texts = ["a", "bb", "bad", "dddd", "eeeee", "f"]
+    try:
+        executor.run(texts, encode, on_batch=lambda idxs, vecs: delivered.update(zip(idxs, vecs)))
+    except EmbedBatchError as exc:
+        assert list(exc.failed) == [2]
+    else:
+        raise AssertionError("bad text must fail")
+    assert delivered == {i: [float(len(t))] for i, t in enumerate(texts) if t != "bad"}
+    stats = executor.stats()
+    assert stats["retries"] == 1 and stats["splits"] >= 1 and stats["failed"] == 1
+    # küçülen token tavanı yalnız o çağrıya ait
+    assert stats["max_batch_tokens"] == 100_000
+    assert classify(_FlakyApi(400)) == "fail" and classify(ValueError("parse")) == "fail"
+
+
+def test_embed_chunks_reports_failures_by_chunk_index(tmp_path):
+    class _Remote(_FakeBackend):
+        remote = True
+
+        def encode(self, texts, kind):
+            if any("bad" in t for t in texts):
+                raise _FlakyApi(413)
+            return super().encode(texts, kind)
+
+    cache = EmbeddingCache(tmp_path, model="fake-model")
+    embedder = Embedder(backend=_Remote(), cache=cache)
+    chunks = [
+        Chunk(chunk_id=f"c{i}", doc_id="d", version=1, content=t, content_hash=t, token_count=1)
+        for i, t in enumerate(["hit", "new", "bad", "hit2"])
+    ]
+    embedder.embed_chunks([chunks[0], chunks[3]])
+    delivered = []
+    with pytest.raises(EmbedBatchError) as info:
+        embedder.embed_chunks(chunks, on_batch=delivered.extend)
+    assert list(info.value.failed) == [2]
+    assert [v is not None for v in info.value.vectors] == [True, True, False, True]
+    assert sorted(c.chunk_id for c, _ in delivered) == ["c0", "c1", "c3"]
+
+
+def test_embed_hybrid_requires_hybrid_backend_and_keeps_order():
+    class _Hybrid(_FakeBackend):
+        hybrid = True
+
+        def encode_hybrid(self, texts, kind, sparse=True, colbert=False):
+            return [
+                {"dense": [float(len(t))], "sparse": {"indices": [len(t)], "values": [1.0]} if sparse else None}
+                for t in texts
+            ]
+
+    items = Embedder(backend=_Hybrid(), max_batch_size=1, cache=False).embed_hybrid(["tbk 344", "e"], kind="query")
+    assert [i["sparse"]["indices"] for i in items] == [[7], [1]]
+    with pytest.raises(ValueError):
+        Embedder(backend=_FakeBackend(), cache=False).embed_hybrid(["x"])
+
+
+def test_embed_cache_is_separated_by_backend_settings(tmp_path, monkeypatch):
+    class _Truncating(_FakeBackend):
+        def __init__(self, max_length):
+            super().__init__()
+            self.max_length = max_length
+
+        @property
+        def cache_namespace(self):
+            return f"{super().cache_namespace}:len{self.max_length}"
+
+    monkeypatch.setenv("EMBED_CACHE_DIR", str(tmp_path))
+    chunks = [Chunk(chunk_id="c", doc_id="d", version=1, content="x y", content_hash="h", token_count=2)]
+    short, long = Embedder(backend=_Truncating(512)), Embedder(backend=_Truncating(8192))
+    short.embed_chunks(chunks)
+    long.embed_chunks(chunks)
+    assert short.cache.model == "fake:fake-model:len512"
+    assert long.cache.stats()["hits"] == 0 and long.stats()["texts"] == 1
+    again = Embedder(backend=_Truncating(512))
+    again.embed_chunks(chunks)
+    assert again.cache.stats()["hits"] == 1 and again.stats()["texts"] == 0
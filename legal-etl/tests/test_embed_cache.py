@@ -0,0 +1,35 @@
+from src.core.embed_cache import EmbeddingCache, encode_with_cache
+
+
+def test_embed_cache_skips_known_hashes_and_survives_reopen(tmp_path):
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 0.5, -0.25] for t in texts]
+
+    cache = EmbeddingCache(tmp_path, model="bge-m3")
+    keys = [cache.key(h, 2) for h in ("a", "b", "a")]
+    first = encode_with_cache(cache, keys, ["xx", "yyy", "xx"], encode, tokens=[1, 1, 1])
+    assert calls == [["xx", "yyy"]]  # tekrar eden metin bir kez encode edilir
+    assert first[0] == first[2] == [2.0, 0.5, -0.25]
+    cache.close()
+
+    reopened = EmbeddingCache(tmp_path, model="bge-m3")
+    again = encode_with_cache(reopened, [reopened.key("a", 2), reopened.key("a", 3)], ["xx", "xx"], encode, tokens=[7, 7])
+    assert again[0] == [2.0, 0.5, -0.25] and len(calls) == 2  # yeni embed_version yeniden encode edilir
+    stats = reopened.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["tokens_saved"] == 7 and stats["entries"] == 3
+
+
+def test_embed_cache_int8_roundtrip_and_torn_append(tmp_path):
+    cache = EmbeddingCache(tmp_path, model="m", dtype="int8")
+    cache.put_many([cache.key("h")], [[0.1, -0.8, 0.4]])
+    with cache.vec_path.open("ab") as fh:  # anahtarı yazılmamış yarım kayıt
+        fh.write(b"\x00" * 5)
+    other = EmbeddingCache(tmp_path, model="m", dtype="int8")
+    other.put_many([other.key("g")], [[1.0, 0.0, 0.0]])
+    vec, fresh = other.get_many([other.key("h"), other.key("g")])
+    assert all(abs(a - b) < 0.01 for a, b in zip(vec, [0.1, -0.8, 0.4]))
+    assert abs(fresh[0] - 1.0) < 1e-6 and fresh[1:] == [0.0, 0.0]
+    assert other.vec_path.stat().st_size == 2 * other.record_size
@@ -0,0 +1,88 @@
+from datetime import date, timedelta
+
+from src.connectors.yargitay import Yargitay2Connector
+from src.core.listing_plan import WindowPlanner
+from src.core.state import StateStore
+
+
+def test_planner_sizes_windows_from_stored_density(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    planner = WindowPlanner(store, target_rows=1000, default_days=7)
+    assert planner.plan(date(2018, 1, 1), date(2018, 12, 31)) == date(2018, 1, 7)
+
+    planner.observe(date(2018, 1, 1), date(2018, 1, 10), 5000)  # 500/gün
+    planner.observe(date(2018, 2, 1), date(2018, 2, 28), 280)  # 10/gün
+
+    fresh = WindowPlanner(store, target_rows=1000, default_days=7)
+    fresh.load(date(2018, 1, 1), date(2018, 12, 31))
+    assert fresh.plan(date(2018, 1, 1), date(2018, 12, 31)) == date(2018, 1, 2)
+    assert fresh.plan(date(2018, 2, 1), date(2018, 2, 28)) == date(2018, 2, 28)
+
+
+def test_oversized_window_reuses_first_page_when_splitting(monkeypatch):
+    monkeypatch.setenv("DOC_CACHE_ENABLED", "false")
+    connector = Yargitay2Connector(use_live=False, page_size=3, window_planner=WindowPlanner(target_rows=4))
+    connector.MAX_ROWS_PER_WINDOW = 5
+    # günde 2 karar, 6 gün
+    day0 = date(2018, 3, 1)
+    rows = [
+        {"documentId": f"{d}-{i}", "kararTarihiStr": (day0 + timedelta(days=d)).isoformat(), "esasNo": f"2018/{d}{i}"}
+        for d in range(6)
+        for i in range(2)
+    ]
+    requests = []
+
+    def fake_post(payload, client=None, attempts=3):
+        data = payload["data"]
+        start = date.fromisoformat(data["kararTarihiStart"][:10])
+        end = date.fromisoformat(data["kararTarihiEnd"][:10])
+        window = [r for r in rows if start <= date.fromisoformat(r["kararTarihiStr"]) <= end]
+        page = data["pageNumber"]
+        requests.append((start, end, page))
+        chunk = window[(page - 1) * data["pageSize"] : page * data["pageSize"]]
+
+        class _Resp:
+            def json(self):
+                return {"data": {"emsalKararList": chunk, "recordsTotal": len(window)}}
+
+        return _Resp()
+
+    monkeypatch.setattr(connector, "_post_with_retry", fake_post)
+    keys = [ref.metadata["doc_id"] for ref in connector._list_window(day0, day0 + timedelta(days=5), set())]
+    connector.close()
+
+    assert sorted(keys) == sorted(r["documentId"] for r in rows) and len(keys) == len(rows)
+    # sayfa 1'in tamamlanmış günü (1 Mart) yeniden istenmez
+    assert all(start > day0 for start, _, _ in requests[1:])
+
+
+def test_pages_fetched_in_parallel_keep_order_and_refetch_only_short_pages(monkeypatch):
+    monkeypatch.setenv("DOC_CACHE_ENABLED", "false")
+    connector = Yargitay2Connector(use_live=False, page_size=10, list_page_workers=4)
+    rows = [{"documentId": f"{i:03d}", "kararTarihiStr": "2019-05-02", "esasNo": f"2019/{i}"} for i in range(95)]
+    calls: dict[int, int] = {}
+
+    def fake_post(payload, client=None, attempts=3):
+        page = payload["data"]["pageNumber"]
+        calls[page] = calls.get(page, 0) + 1
+        if page == 3 and calls[page] == 1:
+            raise RuntimeError("timeout")
+        chunk = rows[(page - 1) * 10 : page * 10]
+        if page == 6 and calls[page] == 1:
+            chunk = chunk[:4]  # ilk denemede eksik sayfa
+
+        class _Resp:
+            def json(self):
+                return {"data": {"emsalKararList": chunk, "recordsTotal": len(rows)}}
+
+        return _Resp()
+
+    monkeypatch.setattr(connector, "_post_with_retry", fake_post)
+    day = date(2019, 5, 2)
+    keys = [ref.metadata["doc_id"] for ref in connector._list_window(day, day, set())]
+    connector.close()
+
+    assert sorted(keys) == [r["documentId"] for r in rows] and len(keys) == 95
+    assert keys[:54] == [r["documentId"] for r in rows[:54]]
+    assert calls[3] == 2 and calls[6] == 2
+    assert all(calls[p] == 1 for p in calls if p not in (3, 6))
@@ -0,0 +1,45 @@
+import httpx
+
+from src.core.proxy_pool import ProxyPool, proxy_label
+
+
+def _pool(statuses):
+    def factory(proxy):
+        def handler(request):
+            return httpx.Response(statuses[proxy], headers={"Retry-After": "120"} if statuses[proxy] == 429 else {})
+
+        return httpx.Client(transport=httpx.MockTransport(handler))
+
+    return ProxyPool(list(statuses), factory, cooldown=60)
+
+
+def test_throttled_proxy_cools_down_and_traffic_moves():
+    pool = _pool({"http://u:p@good:8080": 200, "http://u:p@slow:8080": 429})
+    for _ in range(30):
+        pool.request("GET", "https://bedesten.adalet.gov.tr/x")
+    stats = {row["proxy"]: row for row in pool.stats()}
+    assert set(stats) == {"good:8080", "slow:8080"}
+    # 429 alan proxy Retry-After kadar soğur, kalan istekler sağlam proxy'ye gider
+    assert stats["slow:8080"]["requests"] <= 1 and stats["slow:8080"]["cooldown_left"] > 100
+    assert stats["good:8080"]["successes"] >= 29
+    pool.close()
+
+
+def test_probe_reports_every_proxy_and_hides_credentials():
+    pool = _pool({None: 200, "http://user:secret@p1:3128": 503})
+    results = pool.probe("https://httpbin.org/ip")
+    assert [(r["proxy"], r["ok"]) for r in results] == [("direct", True), ("p1:3128", False)]
+    assert "secret" not in str(pool.stats()) and proxy_label("http://a:b@h:1") == "h:1"
+    pool.close()
+
+
+def test_blocked_proxy_is_a_failure_not_a_success():
+    pool = _pool({"http://u:p@good:8080": 200, "http://u:p@banned:8080": 403, "http://u:p@auth:8080": 407})
+    for _ in range(30):
+        pool.request("GET", "https://bedesten.adalet.gov.tr/x")
+    stats = {row["proxy"]: row for row in pool.stats()}
+    for name in ("banned:8080", "auth:8080"):
+        assert stats[name]["successes"] == 0 and stats[name]["latency_ewma"] is None
+        assert stats[name]["requests"] == stats[name]["blocked"] <= 1 and stats[name]["cooldown_left"] > 0
+    assert stats["good:8080"]["successes"] >= 28
+    pool.close()
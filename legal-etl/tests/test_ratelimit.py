@@ -0,0 +1,27 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.core.http import HostRateLimiter, RateLimiter
+from src.core.ratelimit import SqliteBucketBackend, open_rate_backend, parse_retry_after
+
+
+def test_sqlite_backend_shares_one_budget_between_limiters(tmp_path):
+    # iki ayrı süreci taklit eder: her biri kendi backend bağlantısıyla aynı dosyayı kullanır
+    limiters = [HostRateLimiter(rate=40.0, capacity=1, backend=SqliteBucketBackend(tmp_path / "rl.db")) for _ in range(2)]
+    t0 = time.monotonic()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda i: limiters[i % 2].acquire("bedesten.adalet.gov.tr"), range(9)))
+    # 1 jeton hazır, kalan 8 istek 40/s ile ~0.2 sn (bağımsız kovalar olsaydı ~0.1 sn)
+    assert time.monotonic() - t0 >= 0.18
+
+
+def test_throttle_pauses_and_slows_bucket_then_async_acquire_waits():
+    limiter = RateLimiter(rate=100.0, capacity=5, recovery=0.0)
+    limiter.observe(429, "0.2")
+    assert limiter.penalize() == 0.25
+    t0 = time.monotonic()
+    asyncio.run(limiter.acquire_async())
+    assert time.monotonic() - t0 >= 0.18
+    assert parse_retry_after("12") == 12.0 and parse_retry_after("soon") is None
+    assert type(open_rate_backend(None)).__name__ == "LocalBucketBackend"
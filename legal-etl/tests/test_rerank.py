@@ -0,0 +1,71 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.core.rerank import BaseReranker, RerankerRegistry
+
+
+class _Stub(BaseReranker):
+    def __init__(self, available):
+        self.available = available
+
+    def rerank(self, query, docs, top_n):
+        return list(range(min(top_n, len(docs))))
+
+
+class _Registry(RerankerRegistry):
+    def __init__(self, outcomes, **kwargs):
+        super().__init__(**kwargs)
+        self.outcomes = list(outcomes)
+
+    def _build(self, key):
+        return _Stub(self.outcomes.pop(0))
+
+
+def test_registry_does_not_keep_failed_local_models():
+    registry = _Registry([False, True], retry_after=0)
+    assert registry.get("local", model="m", device="cpu").available is False
+    # başarısız yükleme havuza girmez; sonraki istekte yeniden denenir
+    loaded = registry.get("local", model="m", device="cpu")
+    assert loaded.available is True and registry.get("local", model="m", device="cpu") is loaded
+    stats = registry.stats()
+    assert stats["loads"] == 2 and stats["failed_loads"] == 1
+    assert stats["resident"] == ["local/m/cpu"]
+
+    cooling = _Registry([False, True], retry_after=60)
+    first = cooling.get("local", model="m", device="cpu")
+    assert cooling.get("local", model="m", device="cpu") is first and cooling.stats()["loads"] == 1
+
+
+def test_registry_auto_skips_unavailable_local():
+    registry = _Registry([False, True], retry_after=60)
+    assert registry.pick("auto").available is True
+    assert registry.pick("none") is None
+
+
+class _SlowRegistry(RerankerRegistry):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.release = threading.Event()
+        self.builds = []
+
+    def _build(self, key):
+        self.builds.append(key[1])
+        if key[1] == "cold":
+            self.release.wait(5)
+        return _Stub(True)
+
+
+def test_registry_loads_models_outside_the_lock():
+    registry = _SlowRegistry(max_resident=2)
+    warm = registry.get("local", model="warm", device="cpu")
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        cold = [pool.submit(registry.get, "local", model="cold", device="cpu") for _ in range(2)]
+        time.sleep(0.1)
+        # soğuk yükleme sürerken yüklü modelin cache hit'i beklemez
+        t0 = time.monotonic()
+        assert registry.get("local", model="warm", device="cpu") is warm
+        assert time.monotonic() - t0 < 1
+        registry.release.set()
+        first, second = (f.result(5) for f in cold)
+    assert first is second and registry.builds == ["warm", "cold"]
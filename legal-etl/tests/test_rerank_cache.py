@@ -0,0 +1,48 @@
+from src.core.rerank_cache import RerankScoreCache, rerank_with_cache
+
+
+def test_rerank_with_cache_scores_only_misses_in_input_order(tmp_path):
+    cache = RerankScoreCache(tmp_path / "rr.sqlite")
+    cache.put_many("local:m:512", "Kira  TESPİTİ", [("b", 0.9), ("d", 0.1)])
+    calls = []
+
+    def score(query, docs):
+        calls.append(list(docs))
+        return [{"a": 0.5, "c": 0.7}[d] for d in docs]
+
+    # sorgu normalize edilir: boşluk/büyük harf/Türkçe harf farkı aynı anahtara düşer
+    ranked = rerank_with_cache(cache, "local:m:512", score, "kira tespiti", ["a", "b", "c", "d"], 3)
+    assert calls == [["a", "c"]]
+    assert ranked == [(1, 0.9), (2, 0.7), (0, 0.5)]
+
+    # ikinci koşu tamamen cache'ten; model çağrılmaz
+    assert rerank_with_cache(cache, "local:m:512", score, "kira tespiti", ["d", "c"], 5) == [
+        (1, 0.7),
+        (0, 0.1),
+    ]
+    assert len(calls) == 1
+    # model başarısızsa (boş skor) çağıran fallback'e düşebilsin diye boş döner
+    assert rerank_with_cache(cache, "other", lambda q, d: [], "kira", ["a"], 1) == []
+
+    before = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+    stats = cache.stats_since(before)
+    assert stats["hits"] == 4 and stats["misses"] == 3 and stats["hit_rate"] == round(4 / 7, 4)
+
+
+def test_rerank_cache_evicts_least_recently_used(tmp_path):
+    cache = RerankScoreCache(tmp_path / "rr.sqlite", max_rows=1000)
+    cache.put_many("m", "q", [(f"old{i}", 0.0) for i in range(500)])
+    cache.put_many("m", "q", [(f"new{i}", 1.0) for i in range(500)])
+    # eski kayıtların bir kısmı yeniden okununca son kullanılan olur
+    assert len(cache.get_many("m", "q", [f"old{i}" for i in range(100)])) == 100
+    # yerinde güncelleme satır sayısını artırmaz, taşma tetiklemez
+    cache.put_many("m", "q", [("new0", 2.0)])
+    assert cache.stats()["rows"] == 1000 and cache.stats()["evictions"] == 0
+
+    cache.put_many("m", "q", [("extra", 1.0)])
+    stats = cache.stats()
+    assert stats["rows"] == 900 and stats["evictions"] == 101
+    # silinenler hiç okunmamış eski kayıtlardan; yeniden okunanlar ve yeniler kalır
+    kept = cache.get_many("m", "q", [f"old{i}" for i in range(500)])
+    assert set(range(100)) <= set(kept) and len(kept) == 399
+    assert len(cache.get_many("m", "q", [f"new{i}" for i in range(500)] + ["extra"])) == 501
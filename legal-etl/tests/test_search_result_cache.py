@@ -0,0 +1,90 @@
+import pytest
+
+BLOCK = {"arananKelime": "kira", "pageSize": 10, "pageNumber": 1}
+
+
+@pytest.fixture
+def cache(ys, tmp_path):
+    return ys.SearchResultCache(str(tmp_path / "search.sqlite"), fresh_sec=3600, max_queries=100)
+
+
+def _age(cache, qkey):
+    # Taze pencerenin dışına itilir
+    cache._connect().execute(
+        "UPDATE search_queries SET validated_at = validated_at - 7200 WHERE qkey = ?", (qkey,)
+    )
+
+
+def test_fresh_hit_ignores_page_number_in_key(cache):
+    qkey = cache.make_key(BLOCK)
+    assert qkey == cache.make_key({**BLOCK, "pageNumber": 7})
+    assert cache.lookup(qkey, 1) == ("miss", None)
+
+    cache.store(qkey, 1, [{"documentId": "1"}], 42)
+    cache.store(qkey, 2, [], 42)  # boş sayfa cache'lenmez
+
+    assert cache.lookup(qkey, 1) == ("fresh", ([{"documentId": "1"}], 42))
+    assert cache.lookup(qkey, 2) == ("miss", None)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["queries"]) == (1, 2, 1)
+
+
+def test_stale_query_is_revalidated_when_total_matches(cache):
+    qkey = cache.make_key(BLOCK)
+    cache.store(qkey, 1, [{"documentId": "1"}], 42)
+    cache.store(qkey, 2, [{"documentId": "2"}], 42)
+    _age(cache, qkey)
+
+    assert cache.lookup(qkey, 1) == ("stale", ([{"documentId": "1"}], 42))
+    assert cache.revalidate(qkey, 42) is True
+
+    # Doğrulama sorgunun tüm sayfalarını tazeler
+    assert cache.lookup(qkey, 2) == ("fresh", ([{"documentId": "2"}], 42))
+    assert cache.stats()["revalidated"] == 1
+
+
+def test_stale_query_is_invalidated_when_total_changes(cache):
+    qkey = cache.make_key(BLOCK)
+    cache.store(qkey, 1, [{"documentId": "1"}], 42)
+    cache.store(qkey, 2, [{"documentId": "2"}], 42)
+    _age(cache, qkey)
+
+    assert cache.lookup(qkey, 1)[0] == "stale"
+    assert cache.revalidate(qkey, 43) is False
+
+    assert cache.lookup(qkey, 1) == ("miss", None)
+    assert cache.lookup(qkey, 2) == ("miss", None)
+    stats = cache.stats()
+    assert (stats["invalidated"], stats["revalidated"], stats["queries"]) == (1, 0, 0)
+
+
+def test_stale_served_is_counted(cache):
+    before = cache.stats()
+    cache.mark_stale_served()
+    assert cache.stats_since(before)["stale_served"] == 1
+
+
+def test_eviction_drops_least_recently_used_queries(cache):
+    keys = [cache.make_key({**BLOCK, "arananKelime": f"q{i}"}) for i in range(101)]
+    for qkey in keys[:100]:
+        cache.store(qkey, 1, [{"documentId": qkey}], 1)
+    conn = cache._connect()
+    # Sıra belirleyici olsun: q0 en eski, q99 en yeni; q0..q4 sonradan kullanılır
+    conn.executemany(
+        "UPDATE search_queries SET last_used = ? WHERE qkey = ?",
+        [(1000 + i, qkey) for i, qkey in enumerate(keys[:100])],
+    )
+    conn.executemany(
+        "UPDATE search_queries SET last_used = ? WHERE qkey = ?",
+        [(5000 + i, qkey) for i, qkey in enumerate(keys[:5])],
+    )
+    conn.commit()
+
+    cache.store(keys[100], 1, [{"documentId": "new"}], 1)
+
+    # 101 > 100: %90'a (90 sorgu) inilir, en eski 11 kullanım (q5..q15) silinir
+    assert cache.stats()["evictions"] == 11
+    assert cache.stats()["queries"] == 90
+    remaining = {row[0] for row in conn.execute("SELECT qkey FROM search_queries")}
+    assert remaining == set(keys[:5]) | set(keys[16:])
+    assert conn.execute("SELECT COUNT(*) FROM search_pages").fetchone()[0] == 90
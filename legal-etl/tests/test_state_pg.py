@@ -0,0 +1,95 @@
+import os
+import time
+import uuid
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+DSN = os.environ.get("POSTGRES_TEST_DSN")
+pytestmark = pytest.mark.skipif(not DSN, reason="POSTGRES_TEST_DSN is not set")
+
+
+@pytest.fixture
+def pg():
+    from src.core.state_pg import PostgresStateStore
+
+    # Her test kendi connector adıyla çalışır, paylaşılan veritabanında çakışmaz
+    connector = f"test-{uuid.uuid4().hex[:8]}"
+    stores = []
+
+    def make(worker_id):
+        store = PostgresStateStore(DSN, worker_id=worker_id)
+        stores.append(store)
+        return store
+
+    yield connector, make
+    for store in stores:
+        store.close()
+    with psycopg.connect(DSN) as conn:
+        conn.execute("DELETE FROM ingest_queue WHERE connector = %s", (connector,))
+
+
+def _refs(keys, **extra):
+    return [{"key": key, "url": f"u/{key}", "metadata": {}, **extra} for key in keys]
+
+
+def test_pg_enqueue_copies_and_upserts(pg):
+    connector, make = pg
+    store = make("w1")
+    # Aynı partide tekrar eden anahtar tek satır olur, ikinci enqueue payload'ı günceller
+    store.enqueue_items(connector, "w", _refs(["a", "b", "a"]))
+    store.enqueue_items(connector, "w", _refs(["b", "c"], rev=2))
+    assert store.queue_counts(connector, "w")["PENDING"] == 3
+    items = {item["key"]: item for item in store.claim_batch(connector, "w", 10)}
+    assert sorted(items) == ["a", "b", "c"]
+    assert "rev" not in items["a"] and items["b"]["rev"] == 2 and items["c"]["rev"] == 2
+
+
+def test_pg_claim_batch_skips_locked_rows(pg):
+    connector, make = pg
+    first, second = make("w1"), make("w2")
+    first.enqueue_items(connector, "w", _refs([f"k{i}" for i in range(6)]))
+
+    # Başka bir bağlantı ilk iki satırı kilitli tutarken claim beklemez, onları atlar
+    with psycopg.connect(DSN) as locker:
+        locked = locker.execute(
+            "SELECT id FROM ingest_queue WHERE connector = %s ORDER BY id LIMIT 2 FOR UPDATE",
+            (connector,),
+        ).fetchall()
+        t0 = time.monotonic()
+        claimed = first.claim_batch(connector, "w", 3)
+        assert time.monotonic() - t0 < 5
+        assert not {item["_queue_id"] for item in claimed} & {row[0] for row in locked}
+        assert len(claimed) == 3 and len(second.claim_batch(connector, "w", 10)) == 1
+    assert len(second.claim_batch(connector, "w", 10)) == 2
+
+
+def test_pg_expired_lease_is_reclaimed(pg):
+    connector, make = pg
+    first, second = make("w1"), make("w2")
+    first.enqueue_items(connector, "w", _refs(["a"]))
+    (item,) = first.claim_batch(connector, "w", 1, lease_seconds=1)
+    assert second.claim_batch(connector, "w", 1) == []
+    time.sleep(1.5)
+    (again,) = second.claim_batch(connector, "w", 1, lease_seconds=1)
+    assert again["_queue_id"] == item["_queue_id"] and again["_attempts"] == 1
+    # Lease artık ikinci worker'da; ilki uzatamaz
+    assert first.extend_leases([item["_queue_id"]]) == 0
+    assert second.extend_leases([item["_queue_id"]]) == 1
+    # ikinci worker da çöktü; deneme hakkı biten öğe yeniden verilmez
+    time.sleep(1.5)
+    assert first.claim_batch(connector, "w", 1, max_attempts=2) == []
+    assert first.queue_counts(connector, "w")["FAILED"] == 1
+
+
+def test_pg_wait_for_work_ignores_other_shards(pg):
+    connector, make = pg
+    store = make("w1")
+    assert store.wait_for_work(connector, "w", 0) is False  # LISTEN açılır
+    store.enqueue_items(connector, "other", _refs(["x"]))
+    t0 = time.monotonic()
+    assert store.wait_for_work(connector, "w", 1.0) is False
+    assert time.monotonic() - t0 >= 0.9
+    store.enqueue_items(connector, "w", _refs(["y"]))
+    assert store.wait_for_work(connector, "w", 5.0) is True
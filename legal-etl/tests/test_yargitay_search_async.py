@@ -0,0 +1,47 @@
+import asyncio
+
+
+def _search(ys, monkeypatch, limit, docs):
+    import httpx
+
+    items = [
+        {"documentId": str(i), "esasNo": f"2024/{i}", "itemType": {"name": "YARGITAYKARARI"}}
+        for i in range(1, 6)
+    ]
+    fetched = []
+
+    async def fake_fetch(client, doc_id):
+        fetched.append(doc_id)
+        result = docs.get(doc_id, f"metin {doc_id}")
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def handler(request):
+        return httpx.Response(200, json={"data": {"emsalKararList": items, "total": len(items)}})
+
+    monkeypatch.setattr(ys, "SEARCH_BACKEND", None)
+    monkeypatch.setattr(ys, "SEARCH_CACHE", None)
+    monkeypatch.setattr(ys, "_async_fetch_normalized", fake_fetch)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await ys.async_search_yargitay(
+                client, "kira tespiti", limit=limit, years_back=None, item_types=[],
+                source_label="Yargıtay", bucket="b", query_signature="", fetch_content=True,
+            )
+
+    return asyncio.run(run()), fetched
+
+
+def test_async_search_skips_failed_documents_and_fills_the_limit(ys, monkeypatch):
+    # 2: metadata hatası (None), 3: ağ hatası; yerleri sayfanın kalanından dolar
+    rows, fetched = _search(ys, monkeypatch, 3, {"2": None, "3": RuntimeError("timeout")})
+    assert [r["document_id"] for r in rows] == ["1", "4", "5"]
+    assert rows[0]["tam_metin"] == "metin 1"
+
+
+def test_async_search_fetches_only_what_the_limit_needs(ys, monkeypatch):
+    rows, fetched = _search(ys, monkeypatch, 2, {"2": None, "3": RuntimeError("timeout")})
+    assert [r["document_id"] for r in rows] == ["1", "4"]
+    assert fetched == ["1", "2", "3", "4"]
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+
+
+def _docs(*ids):
+    return [{"document_id": did, "esas_no": f"2024/{did}"} for did in ids]
+
+
+RESULTS = [_docs("1", "2"), _docs("2", "3"), _docs("3", "4")]
+
+
+def _task(bucket, fn=None, afn=None, rank=True):
+    return {
+        "bucket": bucket, "query": bucket, "source": "yargitay", "rank": rank, "fn": fn, "afn": afn,
+    }
+
+
+def _assert_priority_merge(docs, ranklists, stats):
+    # Sonuçlar ters sırada bitse de sorgular sırayla koşulmuş gibi birleşir
+    assert [d["document_id"] for d in docs] == ["1", "2", "3", "4"]
+    assert ranklists == [["1", "2"], ["3"], ["4"]]
+    assert stats["new_by_bucket"] == {"strict": 2, "focus": 1, "broad": 1}
+    assert (stats["merged"], stats["cancelled"], stats["errors"]) == (3, 0, 0)
+
+
+def test_fan_out_merges_in_priority_order_when_tasks_finish_in_reverse(ys):
+    done = [threading.Event() for _ in RESULTS]
+    finished = []
+
+    def make_fn(i):
+        def fn():
+            # i. görev ancak kendinden sonrakiler bitince döner
+            if i + 1 < len(done):
+                assert done[i + 1].wait(5)
+            finished.append(i)
+            done[i].set()
+            return RESULTS[i]
+
+        return fn
+
+    tasks = [_task(b, fn=make_fn(i)) for i, b in enumerate(("strict", "focus", "broad"))]
+    docs, ranklists, stats = ys.fan_out_search(tasks, max_workers=len(tasks))
+
+    assert finished == [2, 1, 0]
+    _assert_priority_merge(docs, ranklists, stats)
+
+
+def test_async_fan_out_merges_in_priority_order_when_tasks_finish_in_reverse(ys):
+    finished = []
+
+    async def main():
+        done = [asyncio.Event() for _ in RESULTS]
+
+        def make_afn(i):
+            async def afn(client):
+                if i + 1 < len(done):
+                    await done[i + 1].wait()
+                finished.append(i)
+                done[i].set()
+                return RESULTS[i]
+
+            return afn
+
+        tasks = [_task(b, afn=make_afn(i)) for i, b in enumerate(("strict", "focus", "broad"))]
+        return await ys.async_fan_out_search(None, tasks, max_concurrency=len(tasks))
+
+    docs, ranklists, stats = asyncio.run(main())
+
+    assert finished == [2, 1, 0]
+    _assert_priority_merge(docs, ranklists, stats)
+
+
+def test_async_fan_out_cancels_pending_tasks_once_the_limit_is_reached(ys):
+    cancelled = []
+
+    async def main():
+        never = asyncio.Event()
+
+        async def first(client):
+            return _docs("1", "2")
+
+        def make_blocked(i):
+            async def afn(client):
+                try:
+                    await never.wait()
+                except asyncio.CancelledError:
+                    cancelled.append(i)
+                    raise
+                return _docs(f"late-{i}")
+
+            return afn
+
+        tasks = [
+            _task("strict", afn=first),
+            _task("focus", afn=make_blocked(1)),
+            _task("broad", afn=make_blocked(2)),
+        ]
+        return await ys.async_fan_out_search(None, tasks, metadata_limit=2, max_concurrency=3)
+
+    docs, ranklists, stats = asyncio.run(main())
+
+    assert [d["document_id"] for d in docs] == ["1", "2"]
+    assert ranklists == [["1", "2"]]
+    assert sorted(cancelled) == [1, 2]
+    assert (stats["merged"], stats["cancelled"]) == (1, 2)
+
+
+def test_fan_out_ignores_results_after_the_limit_is_reached(ys):
+    release = threading.Event()
+
+    def first():
+        return _docs("1", "2")
+
+    def blocked():
+        release.wait(5)
+        return _docs("late")
+
+    tasks = [_task("strict", fn=first), _task("focus", fn=blocked), _task("broad", fn=blocked)]
+    try:
+        docs, ranklists, stats = ys.fan_out_search(tasks, metadata_limit=2, max_workers=2)
+    finally:
+        release.set()
+
+    assert [d["document_id"] for d in docs] == ["1", "2"]
+    assert ranklists == [["1", "2"]]
+    assert stats["merged"] == 1
+    # Kuyrukta bekleyen görev başlamadıysa iptal edilir; başladıysa sonucu birleştirilmez
+    assert stats["cancelled"] in (0, 1)
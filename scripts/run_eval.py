@@ -62,6 +62,9 @@ def main() -> None:
                 "verdict": verdict,
                 "cases_used": used_ids,
                 "expected_tags": expected_tags,
+                "rerank_cache": res.get("rerank_cache"),
+                "doc_cache": res.get("doc_cache"),
+                "search_cache": res.get("search_cache"),
                 "status": "ok",
             }
         )